@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from .models import Course, Enrollment
+
+# Rosters only change through Enrollment and Course.faculty writes, which
+# invalidate the keys below; the timeout is a safety net for writes that
+# bypass signals (queryset.update(), bulk_create()).
+ROSTER_CACHE_TIMEOUT = 60 * 60
+
+def _course_roster_key(course_id):
+    return f'course-roster:{course_id}'
+
+def _faculty_courses_key(faculty_id):
+    return f'faculty-courses:{faculty_id}'
+
+def get_course_student_ids(course_id):
+    """Return the set of student ids enrolled in a course."""
+    key = _course_roster_key(int(course_id))
+    student_ids = cache.get(key)
+    if student_ids is None:
+        student_ids = frozenset(
+            Enrollment.objects.filter(course_id=course_id).values_list('student_id', flat=True)
+        )
+        cache.set(key, student_ids, ROSTER_CACHE_TIMEOUT)
+    return student_ids
+
+def get_faculty_course_ids(faculty_id):
+    """Return the set of course ids taught by a faculty member."""
+    key = _faculty_courses_key(int(faculty_id))
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = frozenset(
+            Course.objects.filter(faculty_id=faculty_id).values_list('id', flat=True)
+        )
+        cache.set(key, course_ids, ROSTER_CACHE_TIMEOUT)
+    return course_ids
+
+def is_student_enrolled(student_id, course_id):
+    """Check whether a student is enrolled in a course."""
+    return int(student_id) in get_course_student_ids(course_id)
+
+def faculty_teaches(faculty_id, course_id):
+    """Check whether a faculty member is assigned to a course."""
+    return int(course_id) in get_faculty_course_ids(faculty_id)
+
+def invalidate_course_roster(*course_ids):
+    cache.delete_many([_course_roster_key(course_id) for course_id in course_ids if course_id is not None])
+
+def invalidate_faculty_courses(*faculty_ids):
+    cache.delete_many([_faculty_courses_key(faculty_id) for faculty_id in faculty_ids if faculty_id is not None])
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import Department, Course, Enrollment, Module, Topic, AcademicYear, Semester
-from users.serializers import FacultySerializer, StudentSerializer
+from users.serializers import FacultySummarySerializer, StudentSummarySerializer
 
 class TopicSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,8 +14,15 @@ class ModuleSerializer(serializers.ModelSerializer):
         model = Module
         fields = ['id', 'title', 'description', 'order', 'topics']
 
+class CourseSummarySerializer(serializers.ModelSerializer):
+    """Compact course for nested objects: no module tree, no counts, no extra queries."""
+    
+    class Meta:
+        model = Course
+        fields = ['id', 'code', 'name', 'department', 'credits', 'faculty', 'semester', 'is_active']
+
 class CourseSerializer(serializers.ModelSerializer):
-    faculty_details = FacultySerializer(source='faculty', read_only=True)
+    faculty_details = FacultySummarySerializer(source='faculty', read_only=True)
     modules = ModuleSerializer(many=True, read_only=True)
     department_name = serializers.CharField(source='department.name', read_only=True)
     student_count = serializers.SerializerMethodField()
@@ -27,11 +34,21 @@ class CourseSerializer(serializers.ModelSerializer):
                   'created_at', 'updated_at', 'modules', 'student_count']
     
     def get_student_count(self, obj):
+        # Annotated by CourseViewSet; counted per course otherwise
+        if hasattr(obj, 'student_count'):
+            return obj.student_count
         return obj.students.count()
 
+class CourseListSerializer(CourseSerializer):
+    """Course without its module tree, for course lists; ``?expand=modules`` adds it back."""
+    
+    class Meta(CourseSerializer.Meta):
+        fields = [field for field in CourseSerializer.Meta.fields if field != 'modules']
+        expandable_fields = {'modules': (ModuleSerializer, {'many': True, 'read_only': True})}
+
 class EnrollmentSerializer(serializers.ModelSerializer):
-    student_details = StudentSerializer(source='student', read_only=True)
-    course_details = CourseSerializer(source='course', read_only=True)
+    student_details = StudentSummarySerializer(source='student', read_only=True)
+    course_details = CourseSummarySerializer(source='course', read_only=True)
     
     class Meta:
         model = Enrollment
@@ -39,7 +56,7 @@ class EnrollmentSerializer(serializers.ModelSerializer):
                   'enrollment_date', 'is_active']
 
 class DepartmentSerializer(serializers.ModelSerializer):
-    head_details = FacultySerializer(source='head', read_only=True)
+    head_details = FacultySummarySerializer(source='head', read_only=True)
     course_count = serializers.SerializerMethodField()
     
     class Meta:
@@ -47,6 +64,9 @@ class DepartmentSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'code', 'description', 'head', 'head_details', 'course_count']
     
     def get_course_count(self, obj):
+        # Annotated by DepartmentViewSet; counted per department otherwise
+        if hasattr(obj, 'course_count'):
+            return obj.course_count
         return obj.courses.count()
 
 class SemesterSerializer(serializers.ModelSerializer):
@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Course, Enrollment
+from .cache import invalidate_course_roster, invalidate_faculty_courses
+
+# Cached entries are dropped once the change commits: dropping them earlier
+# lets a concurrent read cache the old roster again until it expires
+
+@receiver(pre_save, sender=Enrollment)
+def remember_enrollment_course(sender, instance, **kwargs):
+    """
+    Remember the course an existing enrollment pointed to before it changes.
+    """
+    instance._previous_course_id = None
+    if instance.pk:
+        instance._previous_course_id = (
+            Enrollment.objects.filter(pk=instance.pk).values_list('course_id', flat=True).first()
+        )
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_enrollment_roster(sender, instance, **kwargs):
+    """
+    Drop the cached roster of the courses affected by an enrollment change.
+    """
+    course_ids = (instance.course_id, getattr(instance, '_previous_course_id', None))
+    transaction.on_commit(lambda: invalidate_course_roster(*course_ids))
+
+@receiver(m2m_changed, sender=Course.students.through)
+def invalidate_m2m_roster(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop cached rosters changed through course.students / student.courses.
+    """
+    if reverse and action == 'pre_clear':
+        # student.courses.clear() does not say which courses it affects
+        instance._cleared_course_ids = list(instance.courses.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            course_ids = [instance.pk]
+        elif action == 'post_clear':
+            course_ids = getattr(instance, '_cleared_course_ids', [])
+        else:
+            course_ids = list(pk_set)
+        transaction.on_commit(lambda: invalidate_course_roster(*course_ids))
+
+@receiver(pre_save, sender=Course)
+def remember_course_faculty(sender, instance, **kwargs):
+    """
+    Remember the faculty an existing course was assigned to before it changes.
+    """
+    instance._previous_faculty_id = None
+    if instance.pk:
+        instance._previous_faculty_id = (
+            Course.objects.filter(pk=instance.pk).values_list('faculty_id', flat=True).first()
+        )
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_faculty(sender, instance, **kwargs):
+    """
+    Drop the cached course sets of the faculty members a course moved between.
+    """
+    faculty_ids = (instance.faculty_id, getattr(instance, '_previous_faculty_id', None))
+    transaction.on_commit(lambda: invalidate_faculty_courses(*faculty_ids))
+    if kwargs.get('signal') is post_delete:
+        course_id = instance.pk
+        transaction.on_commit(lambda: invalidate_course_roster(course_id))
@@ -1,17 +1,21 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Department, Course, Enrollment, Module, Topic, AcademicYear, Semester
 from .serializers import (
-    DepartmentSerializer, CourseSerializer, EnrollmentSerializer,
+    DepartmentSerializer, CourseSerializer, CourseListSerializer, EnrollmentSerializer,
     ModuleSerializer, TopicSerializer, AcademicYearSerializer, SemesterSerializer
 )
 from users.permissions import IsAdminUser, IsFacultyUser, IsStudentUser
+from nexalink.fieldsets import FieldsetMixin
+from nexalink.pagination import KeysetPagination
 
-class DepartmentViewSet(viewsets.ModelViewSet):
+class DepartmentViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing department instances."""
-    queryset = Department.objects.all()
+    queryset = Department.objects.select_related('head__user').annotate(course_count=Count('courses'))
     serializer_class = DepartmentSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['code', 'head']
@@ -28,15 +32,31 @@ class DepartmentViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing course instances."""
-    queryset = Course.objects.all()
+    queryset = Course.objects.select_related('department', 'faculty__user')
     serializer_class = CourseSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['code', 'department', 'faculty', 'semester', 'is_active']
     search_fields = ['name', 'code', 'description']
     ordering_fields = ['name', 'code', 'created_at']
     
+    def get_queryset(self):
+        return super().get_queryset().annotate(
+            # A subquery, so that filters joining the enrollments cannot inflate it
+            student_count=Coalesce(Subquery(
+                Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course').annotate(
+                    count=Count('id')
+                ).values('count')
+            ), 0)
+        )
+    
+    def get_serializer_class(self):
+        # Lists leave out the module tree unless it is expanded (?expand=modules)
+        if self.action in ['list', 'my_courses']:
+            return CourseListSerializer
+        return CourseSerializer
+    
     def get_permissions(self):
         """
         Instantiates and returns the list of permissions that this view requires.
@@ -47,7 +67,7 @@ class CourseViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_courses(self, request):
         """Get courses for the current user based on role."""
         user = request.user
@@ -55,21 +75,22 @@ class CourseViewSet(viewsets.ModelViewSet):
         if user.role == 'student':
             # Get courses for student
             student = user.student_profile
-            courses = Course.objects.filter(enrollment__student=student, enrollment__is_active=True)
+            courses = self.get_queryset().filter(enrollment__student=student, enrollment__is_active=True)
         elif user.role == 'faculty':
             # Get courses for faculty
             faculty = user.faculty_profile
-            courses = Course.objects.filter(faculty=faculty)
+            courses = self.get_queryset().filter(faculty=faculty)
         else:
             # Admin can see all courses
-            courses = Course.objects.all()
+            courses = self.get_queryset()
         
-        serializer = self.get_serializer(courses, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(courses.order_by('code'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+class EnrollmentViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing enrollment instances."""
-    queryset = Enrollment.objects.all()
+    queryset = Enrollment.objects.select_related('student__user', 'course')
     serializer_class = EnrollmentSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['student', 'course', 'is_active']
@@ -85,7 +106,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_enrollments(self, request):
         """Get enrollments for the current student."""
         if request.user.role != 'student':
@@ -95,13 +116,14 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             )
         
         student = request.user.student_profile
-        enrollments = Enrollment.objects.filter(student=student)
-        serializer = self.get_serializer(enrollments, many=True)
-        return Response(serializer.data)
+        enrollments = self.get_queryset().filter(student=student)
+        page = self.paginate_queryset(enrollments.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class ModuleViewSet(viewsets.ModelViewSet):
+class ModuleViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing module instances."""
-    queryset = Module.objects.all()
+    queryset = Module.objects.prefetch_related('topics')
     serializer_class = ModuleSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['course']
@@ -118,7 +140,7 @@ class ModuleViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-class TopicViewSet(viewsets.ModelViewSet):
+class TopicViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing topic instances."""
     queryset = Topic.objects.all()
     serializer_class = TopicSerializer
@@ -137,9 +159,9 @@ class TopicViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-class AcademicYearViewSet(viewsets.ModelViewSet):
+class AcademicYearViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing academic year instances."""
-    queryset = AcademicYear.objects.all()
+    queryset = AcademicYear.objects.prefetch_related('semesters')
     serializer_class = AcademicYearSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['is_current']
@@ -168,7 +190,7 @@ class AcademicYearViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class SemesterViewSet(viewsets.ModelViewSet):
+class SemesterViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing semester instances."""
     queryset = Semester.objects.all()
     serializer_class = SemesterSerializer
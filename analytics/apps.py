@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analytics'
+    
+    def ready(self):
+        import analytics.signals
@@ -0,0 +1,310 @@
+"""
+Write buffer for engagement events.
+
+Activity pings are appended to a list and inserted in large ``bulk_create``
+chunks by :func:`flush_engagement_buffer` instead of one INSERT per request.
+Records created one at a time through the API are stored right away; only
+their update of the shared daily user sketches is deferred to the flush, as
+an event carrying the ``record_id``.
+
+Delivery is at-least-once. A flush moves a chunk onto a processing list,
+inserts it and only then drops the processing list. If the worker dies in
+between, the next flush inserts the same chunk again, so after a crash a
+few events can be stored twice. Events are never lost once ``push`` has
+returned, as long as the Redis data survives (enable AOF persistence if a
+Redis restart must not drop buffered events).
+
+A chunk that is claimed ``ENGAGEMENT_FLUSH_MAX_ATTEMPTS`` times without
+being stored (its insert keeps failing) is moved to a dead-letter list
+(``engagement:buffer:dead``) so that it no longer blocks the buffer.
+
+Only one flush runs at a time, since flushes share the processing list. The
+flush lock holds a token unique to its owner: it is extended before every
+chunk and only released by its owner, so a flush that outlives the lock
+timeout stops instead of inserting a chunk that another flush has claimed.
+
+Back-pressure: ``push`` refuses a batch once the buffer holds
+``ENGAGEMENT_BUFFER_MAX_LENGTH`` events, and the ingest endpoint answers 503
+with ``Retry-After`` so clients back off while the flusher catches up. The
+check and the append are not atomic, so the limit is a soft one.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import EngagementRecord
+from .rollups import add_engagement_users, increment_engagement_rollups, rollup_counts
+from users.models import User
+
+FLUSH_LOCK_TIMEOUT = 300
+
+# Compare-and-set scripts, so a lock is only extended or released by its owner
+EXTEND_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class BufferFull(Exception):
+    """Raised when the buffer is at capacity and rejects new events."""
+    pass
+
+class RedisEngagementBuffer:
+    """Buffer kept in a Redis list, shared by every web and worker process."""
+    
+    def __init__(self, url, key='engagement:buffer', max_length=None, max_attempts=None):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.processing_key = f'{key}:processing'
+        self.attempts_key = f'{key}:attempts'
+        self.dead_letter_key = f'{key}:dead'
+        self.lock_key = f'{key}:flush-lock'
+        self.max_length = max_length
+        self.max_attempts = max_attempts
+        self.extend_lock_script = self.client.register_script(EXTEND_LOCK_SCRIPT)
+        self.release_lock_script = self.client.register_script(RELEASE_LOCK_SCRIPT)
+    
+    def __len__(self):
+        return self.client.llen(self.key)
+    
+    def push(self, events):
+        if self.max_length and len(self) + len(events) > self.max_length:
+            raise BufferFull
+        self.client.rpush(self.key, *[json.dumps(event) for event in events])
+    
+    def claim(self, count):
+        """
+        Move up to ``count`` events onto the processing list and return them.
+
+        A processing list left behind by a failed flush is returned first,
+        unless it was already claimed ``max_attempts`` times: it is then moved
+        to the dead-letter list.
+        """
+        pending = self.client.lrange(self.processing_key, 0, -1)
+        if pending:
+            attempts = self.client.incr(self.attempts_key)
+            if not self.max_attempts or attempts <= self.max_attempts:
+                return [json.loads(item) for item in pending]
+            pipe = self.client.pipeline()
+            pipe.rpush(self.dead_letter_key, *pending)
+            pipe.delete(self.processing_key, self.attempts_key)
+            pipe.execute()
+        
+        pipe = self.client.pipeline()
+        for _ in range(count):
+            pipe.lmove(self.key, self.processing_key, 'LEFT', 'RIGHT')
+        pipe.set(self.attempts_key, 1)
+        pending = [item for item in pipe.execute()[:count] if item is not None]
+        return [json.loads(item) for item in pending]
+    
+    def ack(self):
+        """Drop the processing list once its events are stored."""
+        self.client.delete(self.processing_key, self.attempts_key)
+    
+    def dead_letters(self):
+        return [json.loads(item) for item in self.client.lrange(self.dead_letter_key, 0, -1)]
+    
+    def acquire_lock(self, token, timeout):
+        return bool(self.client.set(self.lock_key, token, nx=True, ex=timeout))
+    
+    def extend_lock(self, token, timeout):
+        return bool(self.extend_lock_script(keys=[self.lock_key], args=[token, timeout]))
+    
+    def release_lock(self, token):
+        self.release_lock_script(keys=[self.lock_key], args=[token])
+
+class LocalEngagementBuffer:
+    """
+    In-process buffer with the same interface, for development and tests.
+
+    Events live in the memory of one process, so they are lost on restart and
+    are only flushed by that same process.
+    """
+    
+    def __init__(self, max_length=None, max_attempts=None):
+        self.events = deque()
+        self.processing = []
+        self.attempts = 0
+        self.dead = []
+        self.max_length = max_length
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # (token, monotonic expiry) of the flush lock
+        self.flush_lock = None
+    
+    def __len__(self):
+        return len(self.events)
+    
+    def push(self, events):
+        with self.lock:
+            if self.max_length and len(self.events) + len(events) > self.max_length:
+                raise BufferFull
+            self.events.extend(events)
+    
+    def claim(self, count):
+        with self.lock:
+            if self.processing:
+                self.attempts += 1
+                if not self.max_attempts or self.attempts <= self.max_attempts:
+                    return list(self.processing)
+                self.dead.extend(self.processing)
+                self.processing = []
+            
+            while self.events and len(self.processing) < count:
+                self.processing.append(self.events.popleft())
+            self.attempts = 1
+            return list(self.processing)
+    
+    def ack(self):
+        with self.lock:
+            self.processing = []
+            self.attempts = 0
+    
+    def dead_letters(self):
+        with self.lock:
+            return list(self.dead)
+    
+    def acquire_lock(self, token, timeout):
+        with self.lock:
+            if self.flush_lock and self.flush_lock[1] > time.monotonic():
+                return False
+            self.flush_lock = (token, time.monotonic() + timeout)
+            return True
+    
+    def extend_lock(self, token, timeout):
+        with self.lock:
+            if not self.flush_lock or self.flush_lock[0] != token or self.flush_lock[1] <= time.monotonic():
+                return False
+            self.flush_lock = (token, time.monotonic() + timeout)
+            return True
+    
+    def release_lock(self, token):
+        with self.lock:
+            if self.flush_lock and self.flush_lock[0] == token:
+                self.flush_lock = None
+
+_buffer = None
+
+def get_engagement_buffer():
+    """Return the configured buffer (Redis when ``ENGAGEMENT_BUFFER_URL`` is set)."""
+    global _buffer
+    if _buffer is None:
+        if settings.ENGAGEMENT_BUFFER_URL:
+            _buffer = RedisEngagementBuffer(
+                settings.ENGAGEMENT_BUFFER_URL,
+                max_length=settings.ENGAGEMENT_BUFFER_MAX_LENGTH,
+                max_attempts=settings.ENGAGEMENT_FLUSH_MAX_ATTEMPTS
+            )
+        else:
+            _buffer = LocalEngagementBuffer(
+                max_length=settings.ENGAGEMENT_BUFFER_MAX_LENGTH,
+                max_attempts=settings.ENGAGEMENT_FLUSH_MAX_ATTEMPTS
+            )
+    return _buffer
+
+def engagement_event(user, user_type, action, resource='', metadata=None, timestamp=None):
+    """Serialize one event for the buffer; the timestamp is taken on receipt."""
+    return {
+        'user_id': user.id,
+        'user_type': user_type,
+        'action': action,
+        'resource': resource,
+        'metadata': metadata or {},
+        'timestamp': (timestamp or timezone.now()).isoformat(),
+    }
+
+def defer_engagement_users(record):
+    """
+    Queue a stored record for the next flush, which adds it to the user
+    sketches. When the buffer is full they are updated right away instead.
+    """
+    event = engagement_event(
+        record.user, record.user_type, record.action, record.resource, record.metadata, record.timestamp
+    )
+    event['record_id'] = record.id
+    try:
+        get_engagement_buffer().push([event])
+    except BufferFull:
+        add_engagement_users([record])
+
+def flush_engagement_buffer(buffer=None, batch_size=None, lock_token=None):
+    """
+    Insert buffered events with ``bulk_create`` in chunks of ``batch_size``.
+
+    Only the events that were buffered when the flush started are drained, so
+    a flush ends even under sustained load. Events of users deleted in the
+    meantime are dropped. With the ``lock_token`` of the flush lock, the lock
+    is extended before each chunk and the flush stops if it was lost. A chunk
+    that fails to insert stays on the processing list and the error is raised;
+    later flushes retry it. Returns the number of rows inserted.
+    """
+    if buffer is None:
+        buffer = get_engagement_buffer()
+    batch_size = batch_size or settings.ENGAGEMENT_FLUSH_BATCH_SIZE
+    remaining = len(buffer) + batch_size
+    inserted = 0
+    
+    while remaining > 0:
+        if lock_token is not None and not buffer.extend_lock(lock_token, FLUSH_LOCK_TIMEOUT):
+            break
+        events = buffer.claim(batch_size)
+        if not events:
+            break
+        
+        user_ids = set(
+            User.objects.filter(id__in={event['user_id'] for event in events}).values_list('id', flat=True)
+        )
+        records = []
+        stored = []
+        for event in events:
+            if event['user_id'] not in user_ids:
+                continue
+            record = EngagementRecord(
+                id=event.get('record_id'),
+                user_id=event['user_id'],
+                user_type=event['user_type'],
+                action=event['action'],
+                resource=event['resource'],
+                metadata=event['metadata'],
+                timestamp=datetime.fromisoformat(event['timestamp'])
+            )
+            (stored if record.id else records).append(record)
+        with transaction.atomic():
+            EngagementRecord.objects.bulk_create(records, batch_size=batch_size)
+            increment_engagement_rollups(rollup_counts(records))
+            add_engagement_users(records + stored)
+        buffer.ack()
+        
+        inserted += len(records)
+        remaining -= len(events)
+    
+    return inserted
+
+def acquire_flush_lock(buffer=None):
+    """
+    Take the flush lock of the buffer. Returns the owner's token, or ``None``
+    when another flush holds it.
+    """
+    if buffer is None:
+        buffer = get_engagement_buffer()
+    token = uuid.uuid4().hex
+    return token if buffer.acquire_lock(token, FLUSH_LOCK_TIMEOUT) else None
+
+def release_flush_lock(token, buffer=None):
+    """Release the flush lock, unless it expired and another flush took it since."""
+    if buffer is None:
+        buffer = get_engagement_buffer()
+    buffer.release_lock(token)
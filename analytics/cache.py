@@ -0,0 +1,89 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from .models import AnalyticsReport
+from academics.models import Course
+from users.models import Student
+
+def _normalize(value):
+    """Round-trip through DRF's JSON encoder so stored and fresh payloads match."""
+    return json.loads(json.dumps(value, cls=JSONEncoder))
+
+def report_cache_key(report_type, params, scope):
+    """
+    Key an analytics result by report type, validated params and visibility.
+
+    ``params`` are the serializer's validated data; dates and numbers are
+    normalized and keys are sorted, so equivalent query strings (different
+    parameter order, ``course_id=07`` vs ``7``) share one entry. ``scope`` is
+    what decides which parts of the payload the caller may see, see
+    :func:`report_scope`.
+    """
+    payload = json.dumps(
+        {'type': report_type, 'params': _normalize(params), 'scope': scope},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def report_scope(user):
+    """
+    Visibility scope of a caller for :func:`report_cache_key`.
+
+    Admins see everything and share one scope. Faculty members and students
+    each get their own, so a result computed for one of them is never served
+    to another, even for the same parameters.
+    """
+    if user.role == 'admin':
+        return {'role': 'admin'}
+    return {'role': user.role, 'user': user.id}
+
+def get_cached_report(cache_key):
+    """Return the unexpired report stored under ``cache_key``, if any."""
+    return AnalyticsReport.objects.filter(cache_key=cache_key, expires_at__gt=timezone.now()).first()
+
+def store_report(cache_key, report_type, params, data, course_id=None, student_id=None):
+    """Store an analytics payload with the TTL configured for its report type."""
+    # Filters on unknown ids are still cached, just not linked to a row
+    if course_id is not None and not Course.objects.filter(id=course_id).exists():
+        course_id = None
+    if student_id is not None and not Student.objects.filter(id=student_id).exists():
+        student_id = None
+    
+    now = timezone.now()
+    report, _ = AnalyticsReport.objects.update_or_create(
+        cache_key=cache_key,
+        defaults={
+            'report_type': report_type,
+            'course_id': course_id,
+            'student_id': student_id,
+            'params': _normalize(params),
+            'data': _normalize(data),
+            'expires_at': now + timedelta(seconds=settings.ANALYTICS_CACHE_TTLS[report_type])
+        }
+    )
+    return report
+
+def invalidate_reports(report_type, course_ids=None):
+    """
+    Drop the cached results of a report type that may include changed rows.
+
+    With ``course_ids`` only the results scoped to those courses and the
+    results not scoped to any course are dropped; results for other courses
+    stay valid.
+    """
+    reports = AnalyticsReport.objects.filter(report_type=report_type, cache_key__isnull=False)
+    if course_ids is not None:
+        reports = reports.filter(Q(course_id__in=course_ids) | Q(course__isnull=True))
+    reports.delete()
+
+def purge_expired_reports():
+    """Delete expired cached results."""
+    return AnalyticsReport.objects.filter(cache_key__isnull=False, expires_at__lte=timezone.now()).delete()[0]
+
+def report_response_data(report, cached):
+    """Response payload of a stored report, flagged with its cache metadata."""
+    return dict(report.data, cached=cached, generated_at=report.generated_at)
@@ -0,0 +1,194 @@
+"""
+Cohort cube of the attendance and performance measures.
+
+``CohortCell`` pre-aggregates every (course, batch, department) cell:
+enrollments, attendance status counts and the count, sum and sum of squares
+of the normalized performance scores (``score / max_score * 100``). Each cell
+also carries the semester of its course. Every measure is additive, so a
+slice or roll-up along course, batch, department or semester is a sum of
+cells, done in memory by ``cohort_rollup`` without reading the fact tables.
+
+Attendance, enrollment and student changes recompute the affected cells
+from their sources in the same transaction. Attendance is read from the
+``AttendancePercentage`` counters, so a refresh reads one row per student of
+the cell instead of their attendance history. Performance records are
+written one at a time, so like the performance digests their changes
+schedule a debounced rebuild of the cells of the course instead (see
+``nexalink.recompute``).
+"""
+import math
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast
+from .models import CohortCell, PerformanceRecord
+from academics.models import Course, Enrollment
+from attendance.models import AttendancePercentage
+from users.models import Student
+
+COHORT_DIMENSIONS = ('course', 'batch', 'department', 'semester')
+
+MEASURE_FIELDS = (
+    'enrollment_count', 'present_count', 'late_count', 'absent_count',
+    'performance_count', 'performance_total', 'performance_squares',
+)
+
+KEY_FIELDS = ('course_id', 'student__batch', 'student__department')
+
+def _cell_lookup(keys, prefix='student__'):
+    """``Q`` matching the ``(course_id, batch, department)`` keys, through ``prefix`` for fact rows."""
+    lookup = Q()
+    for course_id, batch, department in keys:
+        lookup |= Q(course_id=course_id, **{f'{prefix}batch': batch, f'{prefix}department': department})
+    return lookup
+
+def _cell_measures(lookup):
+    """Measures per ``(course_id, batch, department)`` of the source rows matched by ``lookup``."""
+    cells = defaultdict(Counter)
+
+    enrollments = Enrollment.objects.filter(lookup).values(*KEY_FIELDS).annotate(count=Count('id'))
+    for row in enrollments.order_by():
+        cells[tuple(row[field] for field in KEY_FIELDS)]['enrollment_count'] += row['count']
+
+    attendance = AttendancePercentage.objects.filter(lookup).values(*KEY_FIELDS).annotate(
+        present=Sum('present_count'), late=Sum('late_count'), absent=Sum('absent_count')
+    )
+    for row in attendance.order_by():
+        cell = cells[tuple(row[field] for field in KEY_FIELDS)]
+        cell['present_count'] += row['present']
+        cell['late_count'] += row['late']
+        cell['absent_count'] += row['absent']
+
+    normalized = Cast('score', FloatField()) * 100 / Cast('max_score', FloatField())
+    performance = PerformanceRecord.objects.filter(lookup, max_score__gt=0).annotate(
+        normalized=normalized
+    ).values(*KEY_FIELDS).annotate(
+        count=Count('id'), total=Sum('normalized'), squares=Sum(F('normalized') * F('normalized'))
+    )
+    for row in performance.order_by():
+        cell = cells[tuple(row[field] for field in KEY_FIELDS)]
+        cell['performance_count'] += row['count']
+        cell['performance_total'] += row['total']
+        cell['performance_squares'] += row['squares']
+
+    return cells
+
+def _write_cells(cells, stale):
+    """Upsert ``cells`` and delete the rows of ``stale`` that are no longer a cell."""
+    semesters = dict(Course.objects.filter(
+        id__in={course_id for course_id, _, _ in cells}
+    ).values_list('id', 'semester'))
+    rows = [
+        CohortCell(
+            course_id=course_id, batch=batch, department=department, semester=semesters[course_id],
+            **{field: measures[field] for field in MEASURE_FIELDS}
+        )
+        for (course_id, batch, department), measures in cells.items()
+    ]
+
+    with transaction.atomic():
+        CohortCell.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['course', 'batch', 'department'],
+            update_fields=['semester', *MEASURE_FIELDS, 'updated_at'],
+            batch_size=500
+        )
+        stale_ids = [
+            pk for pk, *key in stale.values_list('pk', 'course_id', 'batch', 'department')
+            if tuple(key) not in cells
+        ]
+        CohortCell.objects.filter(pk__in=stale_ids).delete()
+
+    return len(rows)
+
+def refresh_cohort_cells(keys):
+    """Recompute the cells of the given ``(course_id, batch, department)`` keys."""
+    keys = set(keys)
+    if not keys:
+        return 0
+    return _write_cells(_cell_measures(_cell_lookup(keys)), CohortCell.objects.filter(_cell_lookup(keys, prefix='')))
+
+def student_cell_keys(pairs):
+    """The cell keys of some ``(student_id, course_id)`` pairs."""
+    pairs = set(pairs)
+    cohorts = {
+        student_id: (batch, department)
+        for student_id, batch, department in Student.objects.filter(
+            id__in={student_id for student_id, _ in pairs}
+        ).values_list('id', 'batch', 'department')
+    }
+    return {
+        (course_id, *cohorts[student_id])
+        for student_id, course_id in pairs if student_id in cohorts
+    }
+
+def student_course_ids(student_id):
+    """Every course a student has an enrollment, attendance or performance in."""
+    return (
+        set(Enrollment.objects.filter(student_id=student_id).values_list('course_id', flat=True))
+        | set(AttendancePercentage.objects.filter(student_id=student_id).values_list('course_id', flat=True))
+        | set(PerformanceRecord.objects.filter(student_id=student_id).values_list('course_id', flat=True))
+    )
+
+def rebuild_cohort_cube(course_ids=None):
+    """Recompute every cell, or those of some courses, from the sources."""
+    lookup = Q()
+    stale = CohortCell.objects.all()
+    if course_ids is not None:
+        lookup = Q(course_id__in=course_ids)
+        stale = stale.filter(course_id__in=course_ids)
+    return _write_cells(_cell_measures(lookup), stale)
+
+def _summary(measures):
+    total = measures['present_count'] + measures['late_count'] + measures['absent_count']
+    count = measures['performance_count']
+    average = measures['performance_total'] / count if count else None
+    stddev = None
+    if count:
+        # Population standard deviation; clamped against rounding below zero
+        stddev = math.sqrt(max(measures['performance_squares'] / count - average ** 2, 0))
+    return {
+        'enrollments': measures['enrollment_count'],
+        'total': total,
+        'present': measures['present_count'],
+        'late': measures['late_count'],
+        'absent': measures['absent_count'],
+        'attendance_percentage': round((measures['present_count'] + measures['late_count']) / total * 100, 2) if total else 0,
+        'performance_count': count,
+        'performance_average': round(average, 2) if average is not None else None,
+        'performance_stddev': round(stddev, 2) if stddev is not None else None,
+    }
+
+def cohort_rollup(group_by, course_ids=None, batch=None, department=None, semester=None):
+    """
+    Slice the cube and roll it up along ``group_by``.
+
+    ``group_by`` is a list of ``COHORT_DIMENSIONS``; ``course`` groups by
+    course id. ``course_ids`` limits the cube to some courses and the other
+    arguments slice it on one value. Returns ``(overall, groups)``: the
+    summary of the whole slice and one summary per group, sorted by the
+    group values.
+    """
+    cells = CohortCell.objects.all()
+    if course_ids is not None:
+        cells = cells.filter(course_id__in=course_ids)
+    if batch is not None:
+        cells = cells.filter(batch=batch)
+    if department is not None:
+        cells = cells.filter(department=department)
+    if semester is not None:
+        cells = cells.filter(semester=semester)
+
+    columns = {'course': 'course_id', 'batch': 'batch', 'department': 'department', 'semester': 'semester'}
+    overall = Counter()
+    groups = defaultdict(Counter)
+    for row in cells.order_by().values(*columns.values(), *MEASURE_FIELDS):
+        measures = {field: row[field] for field in MEASURE_FIELDS}
+        overall.update(measures)
+        groups[tuple(row[columns[dimension]] for dimension in group_by)].update(measures)
+
+    return _summary(overall), [
+        {**dict(zip(group_by, key)), **_summary(measures)}
+        for key, measures in sorted(groups.items())
+    ]
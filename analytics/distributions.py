@@ -0,0 +1,179 @@
+"""
+Score distributions of performance records.
+
+``PerformanceDigest`` summarizes the normalized scores (``score / max_score *
+100``) of one (course, score_type, date): exact count, sum, minimum, maximum
+and a 10-point histogram, plus a t-digest for the percentiles. When records
+change, the digests of their course are rebuilt from the raw records by a
+debounced job (see ``nexalink.recompute``), which keeps deletes and edits
+exact and turns a burst of writes into a single rebuild; until it has run,
+the distributions of the course miss those writes. Requests merge the
+digests of the filtered keys, so no request sorts the raw scores.
+"""
+from collections import defaultdict
+import numpy as np
+from django.db import transaction
+from .models import PerformanceRecord, PerformanceDigest
+from .sketches import TDigest
+
+# Histogram bands [0, 10), [10, 20), ... [90, 100]; scores outside 0-100
+# (bonus marks) are counted in the first or last band
+HISTOGRAM_BINS = np.linspace(0, 100, 11)
+PERCENTILES = (('p10', 0.1), ('p25', 0.25), ('median', 0.5), ('p75', 0.75), ('p90', 0.9))
+# Documented accuracy of the digest percentiles, as a fraction of the rank
+# (see analytics.sketches.TDigest); checked by verify_performance_digests
+PERCENTILE_RANK_TOLERANCE = 0.01
+
+def normalized_scores(records):
+    """Map ``(score, max_score)`` pairs to 0-100 floats, skipping zero max scores."""
+    return np.array([
+        float(score) / float(max_score) * 100
+        for score, max_score in records
+        if max_score
+    ], dtype=np.float64)
+
+def histogram(scores):
+    counts, _ = np.histogram(np.clip(scores, 0, 100), bins=HISTOGRAM_BINS)
+    return [int(count) for count in counts]
+
+def _digest(course_id, score_type, date, scores):
+    digest = TDigest()
+    digest.add(scores)
+    return PerformanceDigest(
+        course_id=course_id,
+        score_type=score_type,
+        date=date,
+        count=len(scores),
+        total=float(scores.sum()),
+        minimum=digest.minimum,
+        maximum=digest.maximum,
+        histogram=histogram(scores),
+        centroids=digest.to_bytes()
+    )
+
+def _write_digests(records, delete_query):
+    """Replace the digests matched by ``delete_query`` with digests of ``records``."""
+    scores = defaultdict(list)
+    for course_id, score_type, date, score, max_score in records:
+        scores[(course_id, score_type, date)].append((score, max_score))
+
+    digests = []
+    for (course_id, score_type, date), pairs in scores.items():
+        values = normalized_scores(pairs)
+        if values.size:
+            digests.append(_digest(course_id, score_type, date, values))
+
+    with transaction.atomic():
+        delete_query.delete()
+        PerformanceDigest.objects.bulk_create(digests, batch_size=500)
+
+    return len(digests)
+
+def rebuild_performance_digests(course_ids=None):
+    """Rebuild every digest, or those of some courses, from the raw records."""
+    records = PerformanceRecord.objects.all()
+    digests = PerformanceDigest.objects.all()
+    if course_ids is not None:
+        records = records.filter(course_id__in=course_ids)
+        digests = digests.filter(course_id__in=course_ids)
+
+    return _write_digests(
+        records.values_list('course_id', 'score_type', 'date', 'score', 'max_score').iterator(),
+        digests
+    )
+
+def _summary(count, total, minimum, maximum, quantile, bins):
+    summary = {
+        'total': count,
+        'avg_score': total / count if count else None,
+        'min_score': minimum,
+        'max_score': maximum,
+    }
+    for name, q in PERCENTILES:
+        summary[name] = quantile(q) if count else None
+    summary['histogram'] = [
+        {'from': int(low), 'to': int(high), 'count': int(bin_count)}
+        for low, high, bin_count in zip(HISTOGRAM_BINS[:-1], HISTOGRAM_BINS[1:], bins)
+    ]
+    return summary
+
+def merge_digests(rows):
+    """
+    Summarize the merge of several digests.
+
+    ``rows`` yields ``(count, total, minimum, maximum, histogram, centroids)``
+    tuples as stored on ``PerformanceDigest``.
+    """
+    count = 0
+    total = 0.0
+    bins = np.zeros(len(HISTOGRAM_BINS) - 1, dtype=np.int64)
+    merged = TDigest()
+    for row_count, row_total, minimum, maximum, row_histogram, centroids in rows:
+        count += row_count
+        total += row_total
+        bins += np.asarray(row_histogram, dtype=np.int64)
+        merged.merge(TDigest.from_bytes(centroids, minimum, maximum))
+    return _summary(count, total, merged.minimum, merged.maximum, merged.quantile, bins)
+
+def exact_distribution(scores):
+    """The same summary computed exactly from the scores with NumPy."""
+    if not scores.size:
+        return _summary(0, 0.0, None, None, None, histogram(scores))
+    return _summary(
+        len(scores), float(scores.sum()), float(scores.min()), float(scores.max()),
+        lambda q: float(np.percentile(scores, q * 100)), histogram(scores)
+    )
+
+def performance_distributions(course_id=None, student_id=None, score_type=None, start_date=None, end_date=None):
+    """
+    Score distributions overall and per score type, date and course.
+
+    Returns a dict with an ``overall`` summary and ``by_type``, ``by_date``
+    and ``by_course`` dicts of summaries. Without a student filter the
+    summaries are merged from the stored digests; one student's records are
+    few, so they are summarized exactly.
+    """
+    groups = {
+        'overall': defaultdict(list),
+        'by_type': defaultdict(list),
+        'by_date': defaultdict(list),
+        'by_course': defaultdict(list),
+    }
+
+    def add(row_course_id, row_score_type, row_date, item):
+        groups['overall'][None].append(item)
+        groups['by_type'][row_score_type].append(item)
+        groups['by_date'][row_date].append(item)
+        groups['by_course'][row_course_id].append(item)
+
+    filters = {}
+    if course_id:
+        filters['course_id'] = course_id
+    if score_type:
+        filters['score_type'] = score_type
+    if start_date:
+        filters['date__gte'] = start_date
+    if end_date:
+        filters['date__lte'] = end_date
+
+    if student_id:
+        records = PerformanceRecord.objects.filter(student_id=student_id, **filters).values_list(
+            'course_id', 'score_type', 'date', 'score', 'max_score'
+        )
+        for row_course_id, row_score_type, row_date, score, max_score in records:
+            add(row_course_id, row_score_type, row_date, (score, max_score))
+        summarize = lambda pairs: exact_distribution(normalized_scores(pairs))
+    else:
+        digests = PerformanceDigest.objects.filter(**filters).values_list(
+            'course_id', 'score_type', 'date', 'count', 'total', 'minimum', 'maximum', 'histogram', 'centroids'
+        )
+        for row in digests:
+            add(row[0], row[1], row[2], row[3:])
+        summarize = merge_digests
+
+    result = {
+        name: {key: summarize(items) for key, items in grouped.items()}
+        for name, grouped in groups.items()
+    }
+    result['overall'] = result['overall'].get(None) or summarize([])
+    return result
@@ -0,0 +1,98 @@
+"""
+Status counts of several groupings computed in one pass.
+
+``grouped_status_counts`` returns the total and per-status record counts of a
+filtered queryset overall and grouped by each of a few columns. On Postgres
+this is a single ``GROUP BY GROUPING SETS`` query; on other backends the
+rows are read once and counted in Python.
+"""
+from collections import Counter, defaultdict
+from itertools import islice
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+SCAN_CHUNK_SIZE = 10000
+
+def _empty_counts(statuses):
+    return dict.fromkeys(['total', *statuses], 0)
+
+def grouped_status_counts(query, dimensions, statuses):
+    """
+    Count the records of ``query`` per status, overall and per dimension.
+
+    ``dimensions`` are column names of the queried model (e.g. ``'date'``,
+    ``'course_id'``) and ``statuses`` the values of its ``status`` field to
+    count. Returns ``(overall, groups)`` where ``overall`` is a dict with
+    ``total`` and one count per status, and ``groups`` maps each dimension to
+    ``{value: counts}``.
+    """
+    connection = connections[query.db]
+    if connection.vendor == 'postgresql':
+        return _grouping_sets(query, dimensions, statuses, connection)
+    return _single_scan(query, dimensions, statuses)
+
+def _grouping_sets(query, dimensions, statuses, connection):
+    quote = connection.ops.quote_name
+    try:
+        inner_sql, inner_params = query.order_by().values(*dimensions, 'status').query.sql_with_params()
+    except EmptyResultSet:
+        return _empty_counts(statuses), {dimension: {} for dimension in dimensions}
+
+    columns = [quote(dimension) for dimension in dimensions]
+    flags = [f'GROUPING({column})' for column in columns]
+    counts = ['COUNT(*)'] + [f'COUNT(*) FILTER (WHERE {quote("status")} = %s)' for _ in statuses]
+    grouping_sets = ', '.join(['()'] + [f'({column})' for column in columns])
+
+    sql = (
+        f"SELECT {', '.join(flags + columns + counts)} "
+        f"FROM ({inner_sql}) AS records "
+        f"GROUP BY GROUPING SETS ({grouping_sets})"
+    )
+
+    overall = _empty_counts(statuses)
+    groups = {dimension: {} for dimension in dimensions}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*statuses, *inner_params])
+        for row in cursor.fetchall():
+            row_flags = row[:len(dimensions)]
+            values = row[len(dimensions):2 * len(dimensions)]
+            row_counts = dict(zip(['total', *statuses], row[2 * len(dimensions):]))
+            # GROUPING(column) is 0 for the column the row is grouped by
+            for dimension, flag, value in zip(dimensions, row_flags, values):
+                if not flag:
+                    groups[dimension][value] = row_counts
+                    break
+            else:
+                overall = row_counts
+
+    return overall, groups
+
+def _single_scan(query, dimensions, statuses):
+    overall = Counter()
+    pairs = {dimension: Counter() for dimension in dimensions}
+    rows = query.order_by().values_list(*dimensions, 'status').iterator(chunk_size=SCAN_CHUNK_SIZE)
+    while True:
+        chunk = list(islice(rows, SCAN_CHUNK_SIZE))
+        if not chunk:
+            break
+        # Count (value, status) pairs column by column, which runs in C
+        columns = list(zip(*chunk))
+        overall.update(columns[-1])
+        for dimension, column in zip(dimensions, columns):
+            pairs[dimension].update(zip(column, columns[-1]))
+
+    def as_counts(counter):
+        counts = _empty_counts(statuses)
+        for status in statuses:
+            counts[status] = counter[status]
+        counts['total'] = sum(counter.values())
+        return counts
+
+    groups = {}
+    for dimension, counter in pairs.items():
+        grouped = defaultdict(Counter)
+        for (value, status), count in counter.items():
+            grouped[value][status] += count
+        groups[dimension] = {value: as_counts(by_status) for value, by_status in grouped.items()}
+
+    return as_counts(overall), groups
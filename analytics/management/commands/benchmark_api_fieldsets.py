@@ -0,0 +1,130 @@
+import datetime
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from academics.models import Department, Course, Module, Topic
+from attendance.models import AttendanceRecord
+from feedback.models import Feedback, FeedbackReply
+from materials.models import Material, MaterialVersion
+from users.models import User, Student
+
+# Endpoint, default shape and a minimal shape of the same rows
+SHAPES = [
+    ('/api/v1/materials/', '', 'fields=id,title,file_type,course_details.code'),
+    ('/api/v1/attendance/records/', '', 'fields=id,student,date,status'),
+    ('/api/v1/feedback/feedbacks/', '', 'fields=id,subject,rating,status'),
+    ('/api/v1/academics/courses/', '', 'fields=id,code,name'),
+    ('/api/v1/academics/courses/', 'expand=modules', 'expand=modules&fields=id,code,modules.title'),
+]
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Measure payload bytes and queries of the list endpoints, default shape vs a ?fields= shape.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=20)
+        parser.add_argument('--students', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+    
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction that is rolled back at the end
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                admin = self._create_data(options['courses'], options['students'])
+                client = APIClient()
+                client.force_authenticate(admin)
+                
+                for path, default, minimal in SHAPES:
+                    self.stdout.write(path)
+                    for name, query in (('default', default), ('minimal', minimal)):
+                        url = f'{path}?{query}' if query else path
+                        size, queries, timing = self._measure(client, url, options['repeat'])
+                        self.stdout.write(
+                            f"  {name:>7}: {size:8d} bytes {queries:3d} queries "
+                            f"best {timing * 1000:7.1f} ms  ?{query}"
+                        )
+                self.stdout.write(f'(one page per request, {connection.vendor})')
+                
+                raise Rollback
+        except Rollback:
+            pass
+    
+    def _measure(self, client, url, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: HTTP {response.status_code}')
+        return len(response.content), len(queries.captured_queries), min(timings)
+    
+    def _create_data(self, course_count, student_count):
+        tag = f'BENCH{random.randint(0, 99999):05d}'
+        admin = User.objects.create(email=f'{tag.lower()}-admin@bench.invalid', role='admin')
+        # The profile of a faculty user is created on save
+        faculty = User.objects.create(
+            email=f'{tag.lower()}-faculty@bench.invalid', role='faculty', first_name='Bench', last_name='Faculty'
+        ).faculty_profile
+        department = Department.objects.create(name='Benchmark', code=tag[:10])
+        courses = Course.objects.bulk_create([
+            Course(code=f'{tag[:7]}{i:03d}', name=f'Fieldset benchmark {i}', description='Course description ' * 10,
+                   department=department, faculty=faculty, credits=4, semester=1)
+            for i in range(course_count)
+        ])
+        modules = Module.objects.bulk_create([
+            Module(course=course, title=f'Module {i}', description='Module description ' * 5, order=i)
+            for course in courses
+            for i in range(4)
+        ])
+        Topic.objects.bulk_create([
+            Topic(module=module, title=f'Topic {i}', content='Topic content ' * 20, order=i)
+            for module in modules
+            for i in range(4)
+        ])
+        
+        users = User.objects.bulk_create([
+            User(email=f'{tag.lower()}-{i}@bench.invalid', first_name='Bench', last_name=str(i))
+            for i in range(student_count)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=user, enrollment_number=f'{tag}{i:05d}', batch='2025', department='Benchmark', semester=1)
+            for i, user in enumerate(users)
+        ])
+        
+        first_day = datetime.date(2025, 1, 1)
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(student=student, course=course, date=first_day, status='present', marked_by=faculty)
+            for course in courses
+            for student in students
+        ], batch_size=5000)
+        
+        materials = Material.objects.bulk_create([
+            Material(title=f'Material {i}', description='Material description ' * 10, file=f'materials/{tag}-{i}.pdf',
+                     file_type='pdf', course=module.course, module=module, uploaded_by=faculty)
+            for i, module in enumerate(modules)
+        ])
+        MaterialVersion.objects.bulk_create([
+            MaterialVersion(material=material, file=f'materials/versions/{tag}-{material.pk}.pdf', version=1,
+                            uploaded_by=faculty)
+            for material in materials
+        ])
+        
+        feedback = Feedback.objects.bulk_create([
+            Feedback(student=random.choice(students), course=course, faculty=faculty, subject='Feedback',
+                     content='Feedback content ' * 10, rating=random.randint(1, 5))
+            for course in courses
+            for _ in range(5)
+        ])
+        FeedbackReply.objects.bulk_create([
+            FeedbackReply(feedback=item, content='Reply content ' * 5, author_type='faculty', author_id=faculty.pk)
+            for item in feedback
+        ])
+        
+        return admin
@@ -0,0 +1,101 @@
+import datetime
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Case, When, IntegerField
+from academics.models import Department, Course
+from analytics.grouping import grouped_status_counts
+from attendance.models import AttendanceRecord
+from users.models import User, Student
+
+STATUSES = ['present', 'absent', 'late']
+
+class Rollback(Exception):
+    pass
+
+def _status_counts():
+    return {
+        'total': Count('id'),
+        **{
+            status: Count(Case(When(status=status, then=1), output_field=IntegerField()))
+            for status in STATUSES
+        }
+    }
+
+def legacy_attendance_groupings(query):
+    """The four separate scans ``attendance_analytics`` used to run, kept as the baseline."""
+    overall = query.aggregate(**_status_counts())
+    by_date = list(query.values('date').annotate(**_status_counts()).order_by('date'))
+    by_course = list(query.values('course__code', 'course__name').annotate(**_status_counts()).order_by('course__code'))
+    by_student = list(query.values(
+        'student__user__first_name', 'student__user__last_name', 'student__enrollment_number'
+    ).annotate(**_status_counts()).order_by('student__user__first_name'))
+    return overall, by_date, by_course, by_student
+
+def grouped_attendance_groupings(query):
+    return grouped_status_counts(query, ['date', 'course_id', 'student_id'], STATUSES)
+
+class Command(BaseCommand):
+    help = 'Time the attendance analytics groupings, four scans vs one grouping-sets pass.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=300)
+        parser.add_argument('--courses', type=int, default=6)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--repeat', type=int, default=3)
+    
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                courses = self._create_attendance(options['students'], options['courses'], options['days'])
+                query = AttendanceRecord.objects.filter(course__in=courses)
+                records = query.count()
+                
+                for name, groupings in (('before', legacy_attendance_groupings),
+                                        ('after', grouped_attendance_groupings)):
+                    timings = []
+                    for _ in range(options['repeat']):
+                        start = time.perf_counter()
+                        groupings(query)
+                        timings.append(time.perf_counter() - start)
+                    self.stdout.write(
+                        f"{name:>6}: best {min(timings) * 1000:9.1f} ms over {options['repeat']} runs "
+                        f"({records} records, {connection.vendor})"
+                    )
+                
+                raise Rollback
+        except Rollback:
+            pass
+    
+    def _create_attendance(self, student_count, course_count, day_count):
+        tag = f'BENCH{random.randint(0, 99999):05d}'
+        department = Department.objects.create(name='Benchmark', code=tag[:10])
+        courses = Course.objects.bulk_create([
+            Course(code=f'{tag[:7]}{i:03d}', name=f'Attendance benchmark {i}', department=department,
+                   credits=4, semester=1)
+            for i in range(course_count)
+        ])
+        
+        users = User.objects.bulk_create([
+            User(email=f'{tag.lower()}-{i}@bench.invalid', first_name='Bench', last_name=str(i))
+            for i in range(student_count)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=user, enrollment_number=f'{tag}{i:05d}', batch='2025', department='Benchmark', semester=1)
+            for i, user in enumerate(users)
+        ])
+        
+        first_day = datetime.date(2025, 1, 1)
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(
+                student=student, course=course, date=first_day + datetime.timedelta(days=day),
+                status=random.choice(STATUSES)
+            )
+            for course in courses
+            for student in students
+            for day in range(day_count)
+        ], batch_size=5000)
+        
+        return courses
@@ -0,0 +1,85 @@
+import random
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from analytics import buffer as engagement_buffer
+from analytics.buffer import LocalEngagementBuffer, RedisEngagementBuffer, flush_engagement_buffer
+from analytics.views import EngagementRecordViewSet
+from users.models import User
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Compare engagement events/sec of the per-row create with the buffered ingest endpoint.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000)
+        parser.add_argument('--batch', type=int, default=settings.ENGAGEMENT_INGEST_MAX_EVENTS,
+                            help='Events per ingest request.')
+        parser.add_argument('--redis', default='',
+                            help='Buffer in this Redis instead of in-process (uses a separate key).')
+    
+    def handle(self, *args, **options):
+        count = options['events']
+        batch = options['batch']
+        if options['redis']:
+            buffer = RedisEngagementBuffer(options['redis'], key='engagement:benchmark')
+        else:
+            buffer = LocalEngagementBuffer()
+        
+        factory = APIRequestFactory()
+        create = EngagementRecordViewSet.as_view({'post': 'create'})
+        ingest = EngagementRecordViewSet.as_view({'post': 'ingest'})
+        events = [
+            {'action': 'view', 'resource': f'material-{random.randint(1, 200)}', 'metadata': {'page': i}}
+            for i in range(count)
+        ]
+        
+        # Everything is created inside a transaction that is rolled back at the end
+        previous_buffer = engagement_buffer._buffer
+        engagement_buffer._buffer = buffer
+        try:
+            with transaction.atomic():
+                user = User.objects.create(
+                    email=f'bench{random.randint(0, 99999):05d}@bench.invalid',
+                    first_name='Bench', last_name='Engagement', role='student'
+                )
+                
+                start = time.perf_counter()
+                for event in events:
+                    request = factory.post('/', {**event, 'user': user.id, 'user_type': user.role}, format='json')
+                    force_authenticate(request, user=user)
+                    response = create(request)
+                    assert response.status_code == 201, response.data
+                self._report('per-row create', count, time.perf_counter() - start)
+                
+                # Keep the early flush out of the ingest timing; it is measured below
+                with override_settings(ENGAGEMENT_FLUSH_BATCH_SIZE=count + 1):
+                    start = time.perf_counter()
+                    for offset in range(0, count, batch):
+                        request = factory.post('/', {'events': events[offset:offset + batch]}, format='json')
+                        force_authenticate(request, user=user)
+                        ingest(request)
+                    accepted = time.perf_counter() - start
+                self._report('ingest (buffer only)', count, accepted)
+                
+                start = time.perf_counter()
+                inserted = flush_engagement_buffer(buffer)
+                flushed = time.perf_counter() - start
+                self._report('flush', inserted, flushed)
+                self._report('ingest + flush', count, accepted + flushed)
+                
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            engagement_buffer._buffer = previous_buffer
+    
+    def _report(self, name, count, elapsed):
+        self.stdout.write(
+            f"{name:>22}: {count / elapsed:10.0f} events/s ({count} events in {elapsed * 1000:.1f} ms)"
+        )
@@ -0,0 +1,144 @@
+import datetime
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+from academics.models import Department, Course
+from attendance.models import AttendanceRecord
+from attendance.serializers import AttendanceRecordSerializer
+from attendance.views import AttendanceRecordViewSet
+from feedback.models import Feedback, FeedbackReply, FeedbackQuestion, QuestionResponse
+from feedback.serializers import FeedbackSerializer
+from feedback.views import FeedbackViewSet
+from ia_marks.models import IAComponent, IAMark
+from ia_marks.serializers import IAMarkSerializer
+from ia_marks.views import IAMarkViewSet
+from nexalink.encoders import compile_encoder
+from users.models import User, Student
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Measure rows/sec of the hot list endpoints, serializer vs compiled row encoder, and check the output is identical.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=3)
+    
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                courses = self._create_data(options['rows'])
+                endpoints = [
+                    ('attendance records', AttendanceRecordSerializer,
+                     AttendanceRecordViewSet.queryset.filter(course__in=courses)),
+                    ('ia marks', IAMarkSerializer,
+                     IAMarkViewSet.queryset.filter(component__course__in=courses).order_by('id')),
+                    ('feedback', FeedbackSerializer,
+                     FeedbackViewSet.queryset.filter(course__in=courses).order_by('-timestamp', 'id')),
+                ]
+                
+                for name, serializer_class, queryset in endpoints:
+                    encoder = compile_encoder(serializer_class())
+                    if encoder is None:
+                        self.stdout.write(f'{name}: serializer does not compile')
+                        continue
+                    
+                    serializer_data, serializer_time = self._measure(
+                        lambda: serializer_class(list(queryset), many=True).data, options['repeat']
+                    )
+                    encoder_data, encoder_time = self._measure(
+                        lambda: encoder.encode(list(encoder.values(queryset))), options['repeat']
+                    )
+                    _, compile_time = self._measure(lambda: compile_encoder(serializer_class()), options['repeat'])
+                    identical = JSONRenderer().render(serializer_data) == JSONRenderer().render(encoder_data)
+                    rows = len(encoder_data)
+                    
+                    self.stdout.write(name)
+                    self.stdout.write(f'  serializer: {rows / serializer_time:9.0f} rows/s  ({serializer_time * 1000:7.1f} ms)')
+                    self.stdout.write(f'  encoder:    {rows / encoder_time:9.0f} rows/s  ({encoder_time * 1000:7.1f} ms)')
+                    self.stdout.write(
+                        f'  {serializer_time / encoder_time:.1f}x, compile {compile_time * 1000:.2f} ms, '
+                        f'{rows} rows, output {"identical" if identical else "DIFFERENT"}'
+                    )
+                self.stdout.write(f'(fetch and encode, best of {options["repeat"]}, {connection.vendor})')
+                
+                raise Rollback
+        except Rollback:
+            pass
+    
+    def _measure(self, function, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+        return result, min(timings)
+    
+    def _create_data(self, row_count):
+        tag = f'BENCH{random.randint(0, 99999):05d}'
+        # The profile of a faculty user is created on save
+        faculty = User.objects.create(
+            email=f'{tag.lower()}-faculty@bench.invalid', role='faculty', first_name='Bench', last_name='Faculty'
+        ).faculty_profile
+        department = Department.objects.create(name='Benchmark', code=tag[:10])
+        courses = Course.objects.bulk_create([
+            Course(code=f'{tag[:7]}{i:03d}', name=f'Encoder benchmark {i}', department=department, faculty=faculty,
+                   credits=4, semester=1)
+            for i in range(10)
+        ])
+        
+        student_count = max(row_count // 100, 1)
+        users = User.objects.bulk_create([
+            User(email=f'{tag.lower()}-{i}@bench.invalid', first_name='Bench', last_name=str(i))
+            for i in range(student_count)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=user, enrollment_number=f'{tag}{i:05d}', batch='2025', department='Benchmark', semester=1)
+            for i, user in enumerate(users)
+        ])
+        
+        first_day = datetime.date(2025, 1, 1)
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(student=students[i % student_count], course=courses[i // student_count % 10],
+                             date=first_day + datetime.timedelta(days=i // (student_count * 10)),
+                             status=random.choice(['present', 'absent', 'late']), marked_by=faculty)
+            for i in range(row_count)
+        ], batch_size=5000)
+        
+        components = IAComponent.objects.bulk_create([
+            IAComponent(course=course, name=f'Component {i}', max_marks=20, weightage=10, order=i)
+            for course in courses
+            for i in range(max(row_count // (student_count * 10), 1))
+        ])
+        IAMark.objects.bulk_create([
+            IAMark(student=student, component=component, marks=random.randint(0, 2000) / 100, marked_by=faculty)
+            for component in components
+            for student in students
+        ][:row_count], batch_size=5000)
+        
+        questions = FeedbackQuestion.objects.bulk_create([
+            FeedbackQuestion(course=course, question=f'Question {i}', order=i)
+            for course in courses
+            for i in range(2)
+        ])
+        feedback = Feedback.objects.bulk_create([
+            Feedback(student=students[i % student_count], course=courses[i % 10], faculty=faculty, subject='Feedback',
+                     content='Feedback content ' * 10, rating=random.randint(1, 5))
+            for i in range(row_count)
+        ], batch_size=5000)
+        FeedbackReply.objects.bulk_create([
+            FeedbackReply(feedback=item, content='Reply content ' * 5, author_type='faculty', author_id=faculty.pk)
+            for item in feedback
+        ], batch_size=5000)
+        QuestionResponse.objects.bulk_create([
+            QuestionResponse(feedback=item, question=question, rating=random.randint(1, 5))
+            for item in feedback
+            for question in questions
+            if question.course_id == item.course_id
+        ], batch_size=5000)
+        
+        return courses
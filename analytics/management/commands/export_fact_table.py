@@ -0,0 +1,38 @@
+import shutil
+from django.core.management.base import BaseCommand, CommandError
+from analytics.export import EXPORT_TABLES, incremental_start, run_export_job
+from analytics.models import ExportJob
+
+class Command(BaseCommand):
+    help = 'Export a fact table to a Parquet or Arrow file, in full or since the last export.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(EXPORT_TABLES))
+        parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+        since = parser.add_mutually_exclusive_group()
+        since.add_argument('--since', type=int, help='Only export rows with a larger id.')
+        since.add_argument(
+            '--incremental', action='store_true',
+            help='Only export rows added since the last completed export of the table.'
+        )
+        parser.add_argument('--output', help='Also copy the file to this path.')
+    
+    def handle(self, *args, **options):
+        since_id = options['since']
+        recheck_ids = []
+        if options['incremental']:
+            since_id, recheck_ids = incremental_start(options['table'])
+        
+        job = run_export_job(ExportJob.objects.create(
+            table=options['table'], format=options['format'], since_id=since_id, recheck_ids=recheck_ids
+        ))
+        if job.status != 'completed':
+            raise CommandError(f'Export failed: {job.error}')
+        
+        if options['output']:
+            with job.artifact.open('rb') as source, open(options['output'], 'wb') as target:
+                shutil.copyfileobj(source, target)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {job.row_count} rows of {job.table} to {job.artifact.name} (watermark {job.watermark}).'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from analytics.cohorts import rebuild_cohort_cube
+
+class Command(BaseCommand):
+    help = 'Rebuild the cohort cube from the enrollments, attendance counters and performance records.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='course_ids',
+            help='Only rebuild this course (can be given several times).'
+        )
+    
+    def handle(self, *args, **options):
+        count = rebuild_cohort_cube(options['course_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} cohort cells.'))
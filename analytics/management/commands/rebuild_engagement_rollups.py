@@ -0,0 +1,23 @@
+from datetime import datetime, time, timedelta, timezone
+from django.core.management.base import BaseCommand
+from analytics.rollups import rebuild_engagement_rollups, rebuild_engagement_user_sketches
+
+def _day(value):
+    return datetime.combine(datetime.strptime(value, '%Y-%m-%d').date(), time.min, tzinfo=timezone.utc)
+
+class Command(BaseCommand):
+    help = 'Recount the hourly engagement rollups and daily user sketches from the engagement records.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=_day, help='First day to rebuild (YYYY-MM-DD, UTC).')
+        parser.add_argument('--end', type=_day, help='Last day to rebuild (YYYY-MM-DD, UTC).')
+    
+    def handle(self, *args, **options):
+        end = options['end']
+        if end is not None:
+            end += timedelta(days=1, microseconds=-1)
+        count = rebuild_engagement_rollups(options['start'], end)
+        sketches = rebuild_engagement_user_sketches(options['start'], end)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {count} engagement rollup rows and {sketches} user sketches.'
+        ))
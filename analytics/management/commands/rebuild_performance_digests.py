@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from analytics.distributions import rebuild_performance_digests
+
+class Command(BaseCommand):
+    help = 'Rebuild the performance score digests from the performance records.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='course_ids',
+            help='Only rebuild this course (can be given several times).'
+        )
+    
+    def handle(self, *args, **options):
+        count = rebuild_performance_digests(options['course_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} performance digests.'))
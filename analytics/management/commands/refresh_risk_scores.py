@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from analytics.risk import refresh_risk_scores
+
+class Command(BaseCommand):
+    help = 'Recompute the student at-risk scores (normally run nightly by celery-beat).'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='course_ids',
+            help='Only score this course (can be given several times).'
+        )
+    
+    def handle(self, *args, **options):
+        count = refresh_risk_scores(options['course_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} risk scores.'))
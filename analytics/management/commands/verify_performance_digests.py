@@ -0,0 +1,55 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from analytics.distributions import (
+    PERCENTILES, PERCENTILE_RANK_TOLERANCE, normalized_scores, performance_distributions
+)
+from analytics.models import PerformanceRecord
+
+class Command(BaseCommand):
+    help = 'Compare the digest score distributions of each course with an exact NumPy computation.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='course_ids',
+            help='Only verify this course (can be given several times).'
+        )
+    
+    def handle(self, *args, **options):
+        course_ids = options['course_ids'] or (
+            PerformanceRecord.objects.order_by().values_list('course_id', flat=True).distinct()
+        )
+        failures = 0
+        for course_id in course_ids:
+            scores = normalized_scores(
+                PerformanceRecord.objects.filter(course_id=course_id).values_list('score', 'max_score')
+            )
+            summary = performance_distributions(course_id=course_id)['overall']
+            problems = self._compare(scores, summary)
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"course {course_id}: {'; '.join(problems)}"))
+            else:
+                self.stdout.write(f"course {course_id}: ok ({len(scores)} scores)")
+        
+        if failures:
+            raise CommandError(f'{failures} course(s) outside the documented tolerance.')
+    
+    def _compare(self, scores, summary):
+        """Check exact fields exactly and percentiles within the rank tolerance."""
+        problems = []
+        if summary['total'] != len(scores):
+            problems.append(f"total {summary['total']} != {len(scores)}")
+        if not len(scores):
+            return problems
+        
+        for field, expected in (('min_score', scores.min()), ('max_score', scores.max()),
+                                ('avg_score', scores.mean())):
+            if not np.isclose(summary[field], expected):
+                problems.append(f"{field} {summary[field]} != {expected}")
+        
+        for name, q in PERCENTILES:
+            low = np.percentile(scores, max(q - PERCENTILE_RANK_TOLERANCE, 0) * 100)
+            high = np.percentile(scores, min(q + PERCENTILE_RANK_TOLERANCE, 1) * 100)
+            if not low - 1e-9 <= summary[name] <= high + 1e-9:
+                problems.append(f"{name} {summary[name]:.3f} outside [{low:.3f}, {high:.3f}]")
+        return problems
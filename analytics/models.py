@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from academics.models import Course
 from users.models import Student, User
 
@@ -15,7 +16,8 @@ class EngagementRecord(models.Model):
     user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES)
     action = models.CharField(max_length=100)
     resource = models.CharField(max_length=100, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set on receipt rather than on insert, since events may be written in batches later
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     metadata = models.JSONField(default=dict, blank=True)
     
     class Meta:
@@ -24,6 +26,42 @@ class EngagementRecord(models.Model):
     def __str__(self):
         return f"{self.user} - {self.action} - {self.timestamp}"
 
+class EngagementRollup(models.Model):
+    """Hourly event counts per user type and action, maintained as events arrive."""
+    
+    bucket = models.DateTimeField()
+    user_type = models.CharField(max_length=10, choices=EngagementRecord.USER_TYPE_CHOICES)
+    action = models.CharField(max_length=100)
+    event_count = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('bucket', 'user_type', 'action')
+        ordering = ['-bucket']
+    
+    def __str__(self):
+        return f"{self.bucket} - {self.user_type} - {self.action}: {self.event_count}"
+
+class EngagementUserSketch(models.Model):
+    """Daily summaries of the users per user type and action: distinct count and top users."""
+    
+    # Sketch of a user type over all actions
+    ALL_ACTIONS = ''
+    
+    day = models.DateField()
+    user_type = models.CharField(max_length=10, choices=EngagementRecord.USER_TYPE_CHOICES)
+    action = models.CharField(max_length=100, blank=True)
+    # HyperLogLog registers of the distinct users
+    registers = models.BinaryField(default=bytes)
+    # Space-Saving counters of the most active users
+    top_users = models.JSONField(default=dict)
+    
+    class Meta:
+        unique_together = ('day', 'user_type', 'action')
+        ordering = ['-day']
+    
+    def __str__(self):
+        return f"{self.day} - {self.user_type} - {self.action or 'all actions'}"
+
 class PerformanceRecord(models.Model):
     """Performance record model for tracking student performance."""
     
@@ -43,10 +81,142 @@ class PerformanceRecord(models.Model):
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['student', '-date', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.course} - {self.score_type} - {self.score}/{self.max_score}"
 
+class PerformanceDigest(models.Model):
+    """Distribution of the normalized scores (0-100) of one course, score type and date."""
+    
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='performance_digests')
+    score_type = models.CharField(max_length=20, choices=PerformanceRecord.SCORE_TYPE_CHOICES)
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    minimum = models.FloatField(null=True)
+    maximum = models.FloatField(null=True)
+    # Counts per 10-point band, see analytics.distributions.HISTOGRAM_BINS
+    histogram = models.JSONField(default=list)
+    # t-digest centroids as float64 (mean, weight) pairs
+    centroids = models.BinaryField(default=bytes)
+    
+    class Meta:
+        unique_together = ('course', 'score_type', 'date')
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.course} - {self.score_type} - {self.date}"
+
+class StudentRiskScore(models.Model):
+    """Nightly at-risk score of a student in a course, see analytics.risk."""
+    
+    RISK_LEVEL_CHOICES = (
+        ('low', 'Low'),
+        ('medium', 'Medium'),
+        ('high', 'High'),
+    )
+    
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='risk_scores')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='risk_scores')
+    # 0 (no risk) to 100
+    score = models.DecimalField(max_digits=5, decimal_places=2)
+    risk_level = models.CharField(max_length=10, choices=RISK_LEVEL_CHOICES)
+    # The features behind the score; null when the source has no data
+    attendance_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    ia_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    performance_average = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    # Change of the normalized performance score in points per 30 days
+    performance_trend = models.DecimalField(max_digits=7, decimal_places=2, null=True)
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('student', 'course')
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['course', '-score']),
+            models.Index(fields=['-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student} - {self.course} - {self.score} ({self.risk_level})"
+
+class CohortCell(models.Model):
+    """Attendance and performance measures of one course, batch and department, see analytics.cohorts."""
+    
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='cohort_cells')
+    batch = models.CharField(max_length=10)
+    department = models.CharField(max_length=100)
+    # Copy of course.semester, so the cube can be sliced without a join
+    semester = models.PositiveSmallIntegerField()
+    enrollment_count = models.PositiveIntegerField(default=0)
+    present_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    # Count, sum and sum of squares of the normalized scores (0-100)
+    performance_count = models.PositiveIntegerField(default=0)
+    performance_total = models.FloatField(default=0)
+    performance_squares = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('course', 'batch', 'department')
+        ordering = ['course', 'batch', 'department']
+    
+    def __str__(self):
+        return f"{self.course} - {self.batch} - {self.department}"
+
+class ExportJob(models.Model):
+    """Export of one fact table to a columnar file, see analytics.export."""
+    
+    TABLE_CHOICES = (
+        ('attendance', 'Attendance records'),
+        ('performance', 'Performance records'),
+        ('engagement', 'Engagement records'),
+        ('feedback', 'Feedback'),
+    )
+    
+    FORMAT_CHOICES = (
+        ('parquet', 'Parquet'),
+        ('arrow', 'Arrow IPC'),
+    )
+    
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    
+    table = models.CharField(max_length=20, choices=TABLE_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='parquet')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Only rows with a larger id are exported; null exports the whole table
+    since_id = models.BigIntegerField(null=True, blank=True)
+    # Ids at or below since_id that are exported too if they exist by now: the
+    # missing_ids of the export an incremental export continues from
+    recheck_ids = models.JSONField(default=list, blank=True)
+    # Largest id exported, the since_id of the next incremental export
+    watermark = models.BigIntegerField(null=True, blank=True)
+    # Ids just below the watermark that were missing from the export, possibly
+    # rows of transactions that had not committed yet
+    missing_ids = models.JSONField(default=list, blank=True)
+    row_count = models.BigIntegerField(default=0)
+    artifact = models.FileField(upload_to='exports/', blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.table} export ({self.format}) - {self.status}"
+
 class AnalyticsReport(models.Model):
     """Analytics report model for caching aggregated data."""
     
@@ -55,12 +225,16 @@ class AnalyticsReport(models.Model):
         ('performance', 'Performance'),
         ('engagement', 'Engagement'),
         ('feedback', 'Feedback'),
+        ('dashboard', 'Dashboard'),
     )
     
     report_type = models.CharField(max_length=20, choices=REPORT_TYPE_CHOICES)
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='analytics_reports', null=True, blank=True)
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='analytics_reports', null=True, blank=True)
     data = models.JSONField()
+    cache_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     generated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -0,0 +1,102 @@
+"""
+Run the independent queries of one analytics request side by side.
+
+``run_parallel`` hands each query to a small process-wide thread pool.
+Every pool thread has its own database connection, reused like a request
+thread's (``CONN_MAX_AGE``), so a request takes about as long as its slowest
+query instead of the sum of all of them. A request that runs past its
+timeout gets ``QueryTimeout``. Queries that have not started yet are dropped
+and running ones are cancelled on the server where the driver supports it
+(psycopg2).
+"""
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+class QueryTimeout(Exception):
+    """The queries of a request did not finish within the timeout."""
+
+def get_executor():
+    """The shared pool, created on first use with ``ANALYTICS_QUERY_WORKERS`` threads."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ANALYTICS_QUERY_WORKERS,
+                thread_name_prefix='analytics-query'
+            )
+        return _executor
+
+def fetch(query):
+    """Wrap a queryset so that it is evaluated in the pool thread."""
+    return lambda: list(query)
+
+class _Task:
+    def __init__(self, func):
+        self.func = func
+        self.connection = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            if self.cancelled:
+                return None
+            self.connection = connections[DEFAULT_DB_ALIAS]
+        # Same connection housekeeping as around a request
+        close_old_connections()
+        try:
+            return self.func()
+        finally:
+            with self.lock:
+                self.connection = None
+            close_old_connections()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            raw = self.connection.connection if self.connection is not None else None
+        cancel = getattr(raw, 'cancel', None)
+        if cancel is not None:
+            try:
+                cancel()
+            except Exception:
+                pass
+
+def run_parallel(tasks, timeout=None):
+    """
+    Call every function of the ``tasks`` dict and return their results by key.
+
+    Functions must be independent of each other and may only read from the
+    database. Inside a transaction, or with ``ANALYTICS_QUERY_WORKERS`` below
+    2, they run one after another on the current connection, because the
+    pool's connections would not see uncommitted rows. When a function
+    raises, the others are stopped and the exception is re-raised.
+    ``timeout`` defaults to ``ANALYTICS_QUERY_TIMEOUT`` seconds.
+    """
+    if timeout is None:
+        timeout = settings.ANALYTICS_QUERY_TIMEOUT
+
+    if settings.ANALYTICS_QUERY_WORKERS < 2 or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return {key: func() for key, func in tasks.items()}
+
+    executor = get_executor()
+    wrapped = {key: _Task(func) for key, func in tasks.items()}
+    futures = {key: executor.submit(task) for key, task in wrapped.items()}
+
+    done, pending = wait(futures.values(), timeout=timeout, return_when=FIRST_EXCEPTION)
+    if pending:
+        # Stop the rest of the request's queries after a timeout or a failure
+        for key, future in futures.items():
+            if not future.cancel():
+                wrapped[key].cancel()
+        for future in done:
+            if future.exception() is not None:
+                raise future.exception()
+        raise QueryTimeout(f'Analytics queries did not finish within {timeout} seconds.')
+
+    return {key: future.result() for key, future in futures.items()}
@@ -0,0 +1,187 @@
+"""
+Nightly at-risk scores per enrolled (student, course).
+
+The batch job walks the courses in chunks. For each chunk the enrollments,
+attendance percentages, IA totals and performance records are read once.
+They are placed into feature arrays keyed by (student, course), and every
+pair of the chunk is scored with a few vectorized NumPy operations. The
+results are upserted into ``StudentRiskScore``, which the risk API serves
+ranked.
+
+Every feature becomes a risk between 0 and 1 (see ``RISK_COMPONENTS``). The
+score is their weighted mean over the features a pair has data for, scaled
+to 0-100. Pairs without any data are not scored.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from .models import PerformanceRecord, StudentRiskScore
+from academics.models import Course, Enrollment
+from attendance.models import AttendancePercentage
+from ia_marks.models import IATotal
+
+COURSE_CHUNK_SIZE = 50
+
+# A feature at or above ``safe`` is no risk, at or below ``critical`` full
+# risk, linear in between
+RISK_COMPONENTS = {
+    'attendance': {'weight': 0.35, 'safe': 85, 'critical': 50},
+    'ia': {'weight': 0.25, 'safe': 60, 'critical': 20},
+    'performance': {'weight': 0.25, 'safe': 60, 'critical': 20},
+    # Points per TREND_DAYS; a falling score is a risk
+    'trend': {'weight': 0.15, 'safe': 0, 'critical': -20},
+}
+
+# Lowest score of each level, highest first
+RISK_LEVELS = [(60, 'high'), (30, 'medium'), (0, 'low')]
+
+TREND_DAYS = 30
+
+TWO_PLACES = Decimal('0.01')
+
+def _to_decimal(value):
+    if np.isnan(value):
+        return None
+    return Decimal(f'{value:.6f}').quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+def _keys(student_ids, course_ids):
+    """One int64 key per (student, course): course id in the high 32 bits."""
+    return (np.asarray(course_ids, dtype=np.int64) << 32) | np.asarray(student_ids, dtype=np.int64)
+
+def _lookup(keys, student_ids, course_ids):
+    """Positions of the given pairs in the sorted ``keys`` and a mask of the pairs found."""
+    wanted = _keys(student_ids, course_ids)
+    positions = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+    return positions, keys[positions] == wanted
+
+def risk_features(course_ids):
+    """
+    Feature arrays of every enrolled (student, course) of some courses.
+
+    Returns ``(keys, features)``: the sorted pair keys and a dict of float
+    arrays aligned with them (``attendance``, ``ia``, ``performance`` and
+    ``trend``), NaN where a source has no data for the pair. Takes four
+    queries whatever the number of courses.
+    """
+    enrollments = np.array(
+        list(Enrollment.objects.filter(course_id__in=course_ids).values_list('student_id', 'course_id')),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    keys = np.unique(_keys(enrollments[:, 0], enrollments[:, 1]))
+    features = {name: np.full(len(keys), np.nan) for name in RISK_COMPONENTS}
+    if not len(keys):
+        return keys, features
+
+    def place(name, rows):
+        data = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+        positions, found = _lookup(keys, data[:, 0].astype(np.int64), data[:, 1].astype(np.int64))
+        features[name][positions[found]] = data[found, 2]
+
+    place('attendance', AttendancePercentage.objects.filter(
+        course_id__in=course_ids, total_count__gt=0
+    ).values_list('student_id', 'course_id', 'percentage'))
+    place('ia', IATotal.objects.filter(
+        course_id__in=course_ids
+    ).values_list('student_id', 'course_id', 'percentage'))
+
+    records = list(PerformanceRecord.objects.filter(
+        course_id__in=course_ids, max_score__gt=0
+    ).values_list('student_id', 'course_id', 'date', 'score', 'max_score'))
+    if records:
+        positions, found = _lookup(
+            keys,
+            np.array([record[0] for record in records], dtype=np.int64),
+            np.array([record[1] for record in records], dtype=np.int64)
+        )
+        days = np.array([record[2].toordinal() for record in records], dtype=np.float64)
+        scores = np.array([float(record[3]) / float(record[4]) * 100 for record in records])
+        group, x, y = positions[found], days[found] - days.min(), scores[found]
+
+        # Mean score and least-squares slope of score over time, per pair
+        sums = {
+            name: np.bincount(group, weights=values, minlength=len(keys))
+            for name, values in (('n', np.ones_like(x)), ('x', x), ('y', y), ('xx', x * x), ('xy', x * y))
+        }
+        n = sums['n']
+        features['performance'] = np.divide(sums['y'], n, out=np.full(len(keys), np.nan), where=n > 0)
+        # Only defined for pairs with records on at least two dates
+        denominator = n * sums['xx'] - sums['x'] ** 2
+        slope = np.divide(
+            n * sums['xy'] - sums['x'] * sums['y'], denominator,
+            out=np.full(len(keys), np.nan), where=denominator > 1e-9
+        )
+        features['trend'] = slope * TREND_DAYS
+
+    return keys, features
+
+def risk_scores(features):
+    """Scores (0-100, NaN when a pair has no feature) and risk levels of the feature arrays."""
+    weighted = 0
+    weights = 0
+    for name, component in RISK_COMPONENTS.items():
+        values = features[name]
+        available = ~np.isnan(values)
+        risk = np.clip((component['safe'] - values) / (component['safe'] - component['critical']), 0, 1)
+        weighted = weighted + np.where(available, risk * component['weight'], 0)
+        weights = weights + np.where(available, component['weight'], 0)
+
+    scores = np.divide(weighted * 100, weights, out=np.full(len(weights), np.nan), where=weights > 0)
+    levels = np.select(
+        [scores >= minimum for minimum, _ in RISK_LEVELS],
+        [level for _, level in RISK_LEVELS],
+        default=RISK_LEVELS[-1][1]
+    )
+    return scores, levels
+
+def refresh_risk_scores(course_ids=None, chunk_size=COURSE_CHUNK_SIZE):
+    """
+    Recompute and store the risk scores of every course (or of ``course_ids``).
+
+    Each chunk of courses is scored and written in its own transaction with
+    one upsert; rows of pairs that were not scored in this run (no longer
+    enrolled, or without data) are deleted. Returns the number of scores
+    written.
+    """
+    courses = Course.objects.order_by('id')
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+    course_ids = list(courses.values_list('id', flat=True))
+
+    computed_at = timezone.now()
+    written = 0
+    for start in range(0, len(course_ids), chunk_size):
+        chunk = course_ids[start:start + chunk_size]
+        keys, features = risk_features(chunk)
+        scores, levels = risk_scores(features)
+
+        rows = [
+            StudentRiskScore(
+                student_id=int(keys[i] & 0xFFFFFFFF),
+                course_id=int(keys[i] >> 32),
+                score=_to_decimal(scores[i]),
+                risk_level=str(levels[i]),
+                attendance_percentage=_to_decimal(features['attendance'][i]),
+                ia_percentage=_to_decimal(features['ia'][i]),
+                performance_average=_to_decimal(features['performance'][i]),
+                performance_trend=_to_decimal(features['trend'][i]),
+                computed_at=computed_at
+            )
+            for i in np.flatnonzero(~np.isnan(scores))
+        ]
+
+        with transaction.atomic():
+            StudentRiskScore.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['student', 'course'],
+                update_fields=[
+                    'score', 'risk_level', 'attendance_percentage', 'ia_percentage',
+                    'performance_average', 'performance_trend', 'computed_at'
+                ],
+                batch_size=1000
+            )
+            StudentRiskScore.objects.filter(course_id__in=chunk, computed_at__lt=computed_at).delete()
+        written += len(rows)
+
+    return written
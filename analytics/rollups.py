@@ -0,0 +1,349 @@
+"""
+Hourly engagement rollups and daily user sketches.
+
+``EngagementRollup`` holds one counter per (hour, user_type, action) and
+``EngagementUserSketch`` one HyperLogLog of the distinct users and one
+Space-Saving summary of the most active users per (day, user_type, action).
+Both
+are updated in the same transaction as the events are written (buffer flush,
+single create, update and delete), except the sketches of single creates,
+which the next buffer flush updates. Engagement analytics can then be answered
+from tables whose size depends on the number of hours and distinct actions
+instead of the number of events.
+
+Writes that bypass those paths (cascading user deletes, imports) let the
+rollups drift; ``rebuild_engagement_rollups`` and
+``rebuild_engagement_user_sketches`` recount a range from the raw events.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncDate, TruncHour
+from .models import EngagementRecord, EngagementRollup, EngagementUserSketch
+from .sketches import HyperLogLog, SpaceSaving
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+UPSERT_BATCH_SIZE = 200
+# Users tracked per daily top-users summary; far more than the top 10 shown,
+# so the reported counts are exact unless activity is very evenly spread
+TOP_USERS_CAPACITY = 100
+
+def floor_hour(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def ceil_hour(value):
+    floored = floor_hour(value)
+    return floored if floored == value else floored + HOUR
+
+def floor_day(value):
+    return floor_hour(value).replace(hour=0)
+
+def ceil_day(value):
+    floored = floor_day(value)
+    return floored if floored == value else floored + DAY
+
+def _filtered_events(user_type=None, action=None, start_date=None, end_date=None):
+    events = EngagementRecord.objects.all()
+    if user_type:
+        events = events.filter(user_type=user_type)
+    if action:
+        events = events.filter(action=action)
+    if start_date:
+        events = events.filter(timestamp__gte=start_date)
+    if end_date:
+        events = events.filter(timestamp__lte=end_date)
+    return events
+
+def rollup_counts(records, sign=1):
+    """Count events per (bucket, user_type, action); ``sign=-1`` for removals."""
+    counts = Counter()
+    for record in records:
+        counts[(floor_hour(record.timestamp), record.user_type, record.action)] += sign
+    return counts
+
+def increment_engagement_rollups(counts):
+    """
+    Add ``counts`` (as built by :func:`rollup_counts`) to the rollup table.
+
+    Each batch is one ``INSERT ... ON CONFLICT DO UPDATE`` that adds to the
+    existing counters, which Postgres and SQLite both support. Rows are
+    written in key order so concurrent flushes lock them in the same order.
+    """
+    rows = sorted((key, delta) for key, delta in counts.items() if delta)
+    if not rows:
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(EngagementRollup._meta.db_table)
+    count_column = quote('event_count')
+
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[offset:offset + UPSERT_BATCH_SIZE]
+            params = []
+            for (bucket, user_type, action), delta in batch:
+                params.extend([connection.ops.adapt_datetimefield_value(bucket), user_type, action, delta])
+            values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f"INSERT INTO {table} ({quote('bucket')}, {quote('user_type')}, {quote('action')}, {count_column}) "
+                f"VALUES {values} "
+                f"ON CONFLICT ({quote('bucket')}, {quote('user_type')}, {quote('action')}) "
+                f"DO UPDATE SET {count_column} = {table}.{count_column} + EXCLUDED.{count_column}",
+                params
+            )
+
+def _breakdown(query, field, count):
+    """Group a query by hour of day, weekday, user type and action."""
+    rows = query.order_by().annotate(
+        hour=ExtractHour(field),
+        weekday=ExtractWeekDay(field)
+    ).values('hour', 'weekday', 'user_type', 'action').annotate(count=count)
+
+    return Counter({
+        (row['hour'], row['weekday'], row['user_type'], row['action']): row['count']
+        for row in rows
+        if row['count']
+    })
+
+def raw_engagement_breakdown(query):
+    """Breakdown of a filtered ``EngagementRecord`` query, read from the events."""
+    return _breakdown(query, 'timestamp', Count('id'))
+
+def engagement_breakdown(user_type=None, action=None, start_date=None, end_date=None):
+    """
+    Event counts keyed by ``(hour, weekday, user_type, action)``.
+
+    Whole hours inside ``[start_date, end_date]`` are read from the rollups;
+    the partial hours at either end are read from the raw events, which is a
+    small index range scan. The result has at most 24 x 7 x user types x
+    actions entries however many events the range holds. ``weekday`` follows
+    Django's ``ExtractWeekDay`` (1 = Sunday).
+    """
+    rollup_start = ceil_hour(start_date) if start_date else None
+    # end_date is inclusive, so the hour ending exactly at it is still whole
+    rollup_end = floor_hour(end_date + timedelta(microseconds=1)) if end_date else None
+
+    events = _filtered_events(user_type, action, start_date, end_date)
+    if rollup_start and rollup_end and rollup_start >= rollup_end:
+        # Less than a whole hour in range
+        return raw_engagement_breakdown(events)
+
+    rollups = EngagementRollup.objects.all()
+    if user_type:
+        rollups = rollups.filter(user_type=user_type)
+    if action:
+        rollups = rollups.filter(action=action)
+    if rollup_start:
+        rollups = rollups.filter(bucket__gte=rollup_start)
+    if rollup_end:
+        rollups = rollups.filter(bucket__lt=rollup_end)
+    counts = _breakdown(rollups, 'bucket', Sum('event_count'))
+
+    if rollup_start and rollup_start != start_date:
+        counts.update(raw_engagement_breakdown(events.filter(timestamp__lt=rollup_start)))
+    if rollup_end:
+        counts.update(raw_engagement_breakdown(events.filter(timestamp__gte=rollup_end)))
+
+    return counts
+
+def add_engagement_users(records):
+    """
+    Add the users of new events to the daily user sketches.
+
+    Every event updates the sketches of its (day, user_type, action) and of
+    its (day, user_type) over all actions. Sketches cannot forget a user, so
+    updated and deleted events stay counted until a rebuild.
+    """
+    user_counts = defaultdict(Counter)
+    for record in records:
+        day = floor_day(record.timestamp).date()
+        for action in (record.action, EngagementUserSketch.ALL_ACTIONS):
+            user_counts[(day, record.user_type, action)][record.user_id] += 1
+
+    if not user_counts:
+        return
+
+    keys = sorted(user_counts)
+    lookup = Q()
+    for day, user_type, action in keys:
+        lookup |= Q(day=day, user_type=user_type, action=action)
+
+    with transaction.atomic():
+        EngagementUserSketch.objects.bulk_create(
+            [EngagementUserSketch(day=day, user_type=user_type, action=action) for day, user_type, action in keys],
+            ignore_conflicts=True
+        )
+        sketches = list(
+            EngagementUserSketch.objects.select_for_update().filter(lookup).order_by('day', 'user_type', 'action')
+        )
+        for sketch in sketches:
+            counts = user_counts[(sketch.day, sketch.user_type, sketch.action)]
+            registers = HyperLogLog.from_bytes(sketch.registers)
+            registers.add(list(counts))
+            sketch.registers = registers.to_bytes()
+            top_users = SpaceSaving.from_dict(sketch.top_users, TOP_USERS_CAPACITY)
+            top_users.add(counts)
+            sketch.top_users = top_users.to_dict()
+        EngagementUserSketch.objects.bulk_update(sketches, ['registers', 'top_users'])
+
+def engagement_user_summary(user_type=None, action=None, start_date=None, end_date=None, top=10):
+    """
+    Estimate the distinct users and the most active users for the filters.
+
+    Whole days inside ``[start_date, end_date]`` are merged from the daily
+    sketches (at most one per user type and day); the per-user counts of the
+    partial days at either end are read from the raw events and merged in.
+    Ranges shorter than a whole day are counted exactly.
+
+    Returns ``(unique_users, top_users)``. ``unique_users`` has the error
+    bound of :class:`HyperLogLog`, about 0.8% relative standard error.
+    ``top_users`` lists the ``top`` most active users as ``(user_id,
+    user_type, count)``; each count is within the summed Space-Saving errors
+    of the exact one, which is zero unless the daily summaries overflowed.
+    """
+    sketch_start = ceil_day(start_date) if start_date else None
+    sketch_end = floor_day(end_date + timedelta(microseconds=1)) if end_date else None
+
+    events = _filtered_events(user_type, action, start_date, end_date)
+    if sketch_start and sketch_end and sketch_start >= sketch_end:
+        edges = [events]
+        sketches = EngagementUserSketch.objects.none()
+    else:
+        edges = []
+        if sketch_start and sketch_start != start_date:
+            edges.append(events.filter(timestamp__lt=sketch_start))
+        if sketch_end:
+            edges.append(events.filter(timestamp__gte=sketch_end))
+
+        sketches = EngagementUserSketch.objects.filter(action=action or EngagementUserSketch.ALL_ACTIONS)
+        if user_type:
+            sketches = sketches.filter(user_type=user_type)
+        if sketch_start:
+            sketches = sketches.filter(day__gte=sketch_start.date())
+        if sketch_end:
+            sketches = sketches.filter(day__lt=sketch_end.date())
+
+    users = HyperLogLog()
+    # Merged per user type: a user's events all carry the same type, so the
+    # summaries of different types never share an item
+    top_users = defaultdict(lambda: SpaceSaving(TOP_USERS_CAPACITY))
+    for row_user_type, registers, counters in sketches.values_list('user_type', 'registers', 'top_users'):
+        users.merge(HyperLogLog.from_bytes(registers))
+        top_users[row_user_type].merge(SpaceSaving.from_dict(counters, TOP_USERS_CAPACITY))
+
+    exact_ids = set()
+    for edge in edges:
+        edge_counts = defaultdict(Counter)
+        for row in edge.order_by().values('user_id', 'user_type').annotate(count=Count('id')):
+            edge_counts[row['user_type']][row['user_id']] = row['count']
+            exact_ids.add(row['user_id'])
+        for row_user_type, counts in edge_counts.items():
+            top_users[row_user_type].merge(SpaceSaving(counters={
+                user_id: [count, 0] for user_id, count in counts.items()
+            }))
+
+    if edges == [events]:
+        unique_users = len(exact_ids)
+    else:
+        users.add(list(exact_ids))
+        unique_users = users.count()
+
+    ranked = sorted(
+        (
+            (user_id, row_user_type, count)
+            for row_user_type, summary in top_users.items()
+            for user_id, count, error in summary.top(top)
+        ),
+        key=lambda entry: (-entry[2], entry[0])
+    )
+    return unique_users, ranked[:top]
+
+def rebuild_engagement_rollups(start_date=None, end_date=None):
+    """
+    Recount the rollups of the hours overlapping ``[start_date, end_date]``.
+
+    Runs one grouped scan over the raw events of the range and replaces the
+    rollup rows of those hours. Returns the number of rows written. Events
+    that arrive in the range while it runs may be counted twice or not at all,
+    so rebuild ranges that are not being written to.
+    """
+    events = EngagementRecord.objects.all()
+    rollups = EngagementRollup.objects.all()
+    if start_date:
+        events = events.filter(timestamp__gte=floor_hour(start_date))
+        rollups = rollups.filter(bucket__gte=floor_hour(start_date))
+    if end_date:
+        events = events.filter(timestamp__lt=floor_hour(end_date) + HOUR)
+        rollups = rollups.filter(bucket__lt=floor_hour(end_date) + HOUR)
+
+    counts = events.order_by().annotate(
+        bucket=TruncHour('timestamp')
+    ).values('bucket', 'user_type', 'action').annotate(event_count=Count('id'))
+
+    with transaction.atomic():
+        rollups.delete()
+        written = 0
+        batch = []
+        for row in counts.iterator():
+            batch.append(EngagementRollup(**row))
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                EngagementRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        EngagementRollup.objects.bulk_create(batch)
+        written += len(batch)
+
+    return written
+
+def rebuild_engagement_user_sketches(start_date=None, end_date=None):
+    """
+    Rebuild the user sketches of the days overlapping the range.
+
+    Reads the event counts per (day, user type, action, user) of the range
+    from the raw events, one day at a time. Returns the number of sketches
+    written.
+    """
+    events = EngagementRecord.objects.all()
+    sketches = EngagementUserSketch.objects.all()
+    if start_date:
+        events = events.filter(timestamp__gte=floor_day(start_date))
+        sketches = sketches.filter(day__gte=floor_day(start_date).date())
+    if end_date:
+        events = events.filter(timestamp__lt=floor_day(end_date) + DAY)
+        sketches = sketches.filter(day__lt=(floor_day(end_date) + DAY).date())
+
+    rows = events.order_by().annotate(
+        day=TruncDate('timestamp', tzinfo=dt_timezone.utc)
+    ).values_list('day', 'user_type', 'action', 'user_id').annotate(count=Count('id')).order_by('day')
+
+    def write(day, user_counts):
+        new_sketches = []
+        for (user_type, action), counts in user_counts.items():
+            registers = HyperLogLog()
+            registers.add(list(counts))
+            top_users = SpaceSaving(TOP_USERS_CAPACITY)
+            top_users.add(counts)
+            new_sketches.append(EngagementUserSketch(
+                day=day, user_type=user_type, action=action,
+                registers=registers.to_bytes(), top_users=top_users.to_dict()
+            ))
+        EngagementUserSketch.objects.bulk_create(new_sketches)
+        return len(new_sketches)
+
+    with transaction.atomic():
+        sketches.delete()
+        written = 0
+        current_day = None
+        user_counts = defaultdict(Counter)
+        for day, user_type, action, user_id, count in rows.iterator():
+            if day != current_day:
+                written += write(current_day, user_counts)
+                current_day = day
+                user_counts = defaultdict(Counter)
+            user_counts[(user_type, action)][user_id] += count
+            user_counts[(user_type, EngagementUserSketch.ALL_ACTIONS)][user_id] += count
+        written += write(current_day, user_counts)
+
+    return written
@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import EngagementRecord, PerformanceRecord, AnalyticsReport
+from .models import EngagementRecord, PerformanceRecord, AnalyticsReport, StudentRiskScore, ExportJob
+from .cohorts import COHORT_DIMENSIONS
+from .export import incremental_start
 
 class EngagementRecordSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,6 +10,21 @@ class EngagementRecordSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_type', 'action', 'resource', 'timestamp', 'metadata']
         read_only_fields = ['timestamp']
 
+class EngagementEventSerializer(serializers.Serializer):
+    action = serializers.CharField(max_length=100)
+    resource = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    metadata = serializers.JSONField(required=False, default=dict)
+
+class EngagementIngestSerializer(serializers.Serializer):
+    events = EngagementEventSerializer(many=True, allow_empty=False)
+    
+    def validate_events(self, value):
+        if len(value) > settings.ENGAGEMENT_INGEST_MAX_EVENTS:
+            raise serializers.ValidationError(
+                f"At most {settings.ENGAGEMENT_INGEST_MAX_EVENTS} events per request."
+            )
+        return value
+
 class PerformanceRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = PerformanceRecord
@@ -15,8 +33,41 @@ class PerformanceRecordSerializer(serializers.ModelSerializer):
 class AnalyticsReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = AnalyticsReport
-        fields = ['id', 'report_type', 'course', 'student', 'data', 'generated_at']
-        read_only_fields = ['generated_at']
+        fields = ['id', 'report_type', 'course', 'student', 'data', 'params',
+                  'expires_at', 'generated_at']
+        read_only_fields = ['params', 'expires_at', 'generated_at']
+
+class StudentRiskScoreSerializer(serializers.ModelSerializer):
+    student_name = serializers.CharField(source='student.user.get_full_name', read_only=True)
+    enrollment_number = serializers.CharField(source='student.enrollment_number', read_only=True)
+    course_code = serializers.CharField(source='course.code', read_only=True)
+    
+    class Meta:
+        model = StudentRiskScore
+        fields = ['id', 'student', 'student_name', 'enrollment_number', 'course', 'course_code',
+                  'score', 'risk_level', 'attendance_percentage', 'ia_percentage',
+                  'performance_average', 'performance_trend', 'computed_at']
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    # Continue from the watermark of the last completed export of the table
+    incremental = serializers.BooleanField(write_only=True, required=False, default=False)
+    
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'table', 'format', 'incremental', 'since_id', 'watermark', 'status',
+                  'row_count', 'error', 'requested_by', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = ['watermark', 'status', 'row_count', 'error', 'requested_by',
+                            'created_at', 'started_at', 'finished_at']
+    
+    def validate(self, data):
+        if data.get('incremental') and data.get('since_id') is not None:
+            raise serializers.ValidationError("Give either incremental or since_id, not both.")
+        return data
+    
+    def create(self, validated_data):
+        if validated_data.pop('incremental', False):
+            validated_data['since_id'], validated_data['recheck_ids'] = incremental_start(validated_data['table'])
+        return super().create(validated_data)
 
 class AttendanceAnalyticsSerializer(serializers.Serializer):
     course_id = serializers.IntegerField(required=False)
@@ -37,9 +88,29 @@ class EngagementAnalyticsSerializer(serializers.Serializer):
     action = serializers.CharField(required=False)
     start_date = serializers.DateTimeField(required=False)
     end_date = serializers.DateTimeField(required=False)
+    # Count distinct and top users exactly instead of estimating them from sketches
+    exact = serializers.BooleanField(required=False, default=False)
 
 class FeedbackAnalyticsSerializer(serializers.Serializer):
     course_id = serializers.IntegerField(required=False)
     faculty_id = serializers.IntegerField(required=False)
     start_date = serializers.DateField(required=False)
     end_date = serializers.DateField(required=False)
+
+class CohortAnalyticsSerializer(serializers.Serializer):
+    # Comma-separated dimensions, e.g. "batch,department"
+    group_by = serializers.CharField(required=False, default='department')
+    course_id = serializers.IntegerField(required=False)
+    batch = serializers.CharField(required=False)
+    department = serializers.CharField(required=False)
+    semester = serializers.IntegerField(required=False)
+    
+    def validate_group_by(self, value):
+        dimensions = [dimension.strip() for dimension in value.split(',') if dimension.strip()]
+        unknown = [dimension for dimension in dimensions if dimension not in COHORT_DIMENSIONS]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown dimensions: {', '.join(unknown)}. Use {', '.join(COHORT_DIMENSIONS)}."
+            )
+        # Keep the order given, without repeats
+        return list(dict.fromkeys(dimensions))
@@ -0,0 +1,62 @@
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+from .models import AnalyticsReport, EngagementRecord
+from academics.models import Course
+from attendance.models import AttendanceRecord
+from feedback.models import Feedback
+from users.models import Student, Faculty
+
+def build_admin_dashboard_snapshot():
+    """
+    Run the system-wide counts of the admin dashboard and store them as a
+    ``dashboard`` AnalyticsReport.
+
+    These are full-table scans over the largest tables, so this only runs in
+    the background (celery-beat or the admin refresh action), never inside a
+    dashboard request.
+    """
+    attendance = AttendanceRecord.objects.order_by().aggregate(
+        total=Count('id'),
+        present=Count('id', filter=Q(status__in=['present', 'late']))
+    )
+    feedback = Feedback.objects.order_by().aggregate(
+        total=Count('id'),
+        avg_rating=Avg('rating')
+    )
+    
+    data = {
+        'users': {
+            'students': Student.objects.count(),
+            'faculty': Faculty.objects.count()
+        },
+        'courses': Course.objects.count(),
+        'attendance': {
+            'percentage': (attendance['present'] / attendance['total'] * 100) if attendance['total'] > 0 else 0,
+            'total': attendance['total']
+        },
+        'feedback': {
+            'total': feedback['total'],
+            'avg_rating': feedback['avg_rating'] or 0
+        },
+        'engagement': {
+            'total': EngagementRecord.objects.count()
+        }
+    }
+    
+    # Keep a single snapshot row and overwrite it on every refresh
+    report = AnalyticsReport.objects.filter(report_type='dashboard', course=None, student=None).first()
+    if report is None:
+        report = AnalyticsReport(report_type='dashboard')
+    report.data = data
+    report.save()
+    return report
+
+def get_admin_dashboard_snapshot():
+    """Return the latest admin dashboard snapshot, or ``None`` if none was built yet."""
+    return AnalyticsReport.objects.filter(
+        report_type='dashboard', course=None, student=None
+    ).order_by('-generated_at').first()
+
+def snapshot_age(report):
+    """Age of a snapshot in seconds."""
+    return (timezone.now() - report.generated_at).total_seconds()
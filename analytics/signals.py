@@ -0,0 +1,139 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .cache import invalidate_reports
+from .cohorts import rebuild_cohort_cube, refresh_cohort_cells, student_cell_keys, student_course_ids
+from .models import CohortCell, PerformanceRecord
+from .tasks import refresh_course_cohort_cells, refresh_course_performance_digests
+from academics.models import Course, Enrollment
+from attendance.models import AttendanceRecord
+from feedback.models import Feedback
+from users.models import Student
+from nexalink.recompute import schedule_recompute
+
+# Engagement results are not invalidated per event: events arrive far too
+# often for that, so they simply expire after their (short) TTL.
+
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+def invalidate_attendance_reports(sender, instance, **kwargs):
+    """Drop cached attendance analytics that may include this record."""
+    transaction.on_commit(lambda: invalidate_reports('attendance', [instance.course_id]))
+
+@receiver(post_save, sender=PerformanceRecord)
+@receiver(post_delete, sender=PerformanceRecord)
+def invalidate_performance_reports(sender, instance, **kwargs):
+    """Drop cached performance analytics that may include this record."""
+    transaction.on_commit(lambda: invalidate_reports('performance', [instance.course_id]))
+
+@receiver(pre_save, sender=PerformanceRecord)
+def remember_performance_key(sender, instance, **kwargs):
+    """
+    Remember the digest key of an existing record before it changes.
+    """
+    instance._previous_digest_key = None
+    if instance.pk:
+        instance._previous_digest_key = PerformanceRecord.objects.filter(pk=instance.pk).values_list(
+            'course_id', 'score_type', 'date'
+        ).first()
+
+@receiver(post_save, sender=PerformanceRecord)
+@receiver(post_delete, sender=PerformanceRecord)
+def refresh_performance_digest(sender, instance, **kwargs):
+    """Schedule a rebuild of the score digests of the courses a record change affects."""
+    course_ids = {instance.course_id}
+    previous = getattr(instance, '_previous_digest_key', None)
+    if previous:
+        course_ids.add(previous[0])
+    for course_id in course_ids:
+        schedule_recompute(refresh_course_performance_digests, course_id)
+
+@receiver(post_save, sender=PerformanceRecord)
+@receiver(post_delete, sender=PerformanceRecord)
+def refresh_performance_cohort_cells(sender, instance, **kwargs):
+    """Schedule a rebuild of the cohort cells of the courses a record change affects."""
+    course_ids = {instance.course_id}
+    previous = getattr(instance, '_previous_digest_key', None)
+    if previous:
+        course_ids.add(previous[0])
+    for course_id in course_ids:
+        schedule_recompute(refresh_course_cohort_cells, course_id)
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def refresh_enrollment_cohort_cells(sender, instance, **kwargs):
+    """Recompute the cohort cells of the courses an enrollment moved between."""
+    pairs = {(instance.student_id, instance.course_id)}
+    previous_course_id = getattr(instance, '_previous_course_id', None)
+    if previous_course_id:
+        pairs.add((instance.student_id, previous_course_id))
+    refresh_cohort_cells(student_cell_keys(pairs))
+
+@receiver(m2m_changed, sender=Course.students.through)
+def refresh_m2m_cohort_cells(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Recompute the cohort cells of enrollments changed through course.students / student.courses.
+    """
+    if reverse and action == 'pre_clear':
+        instance._cohort_course_ids = list(instance.courses.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        if reverse:
+            pairs = {(instance.pk, course_id) for course_id in pk_set}
+        else:
+            pairs = {(student_id, instance.pk) for student_id in pk_set}
+        refresh_cohort_cells(student_cell_keys(pairs))
+    elif action == 'post_clear':
+        if reverse:
+            refresh_cohort_cells(student_cell_keys(
+                (instance.pk, course_id) for course_id in getattr(instance, '_cohort_course_ids', [])
+            ))
+        else:
+            rebuild_cohort_cube([instance.pk])
+
+@receiver(pre_save, sender=Student)
+def remember_student_cohort(sender, instance, **kwargs):
+    """
+    Remember the batch and department of an existing student before they change.
+    """
+    instance._previous_cohort = None
+    if instance.pk:
+        instance._previous_cohort = Student.objects.filter(pk=instance.pk).values_list(
+            'batch', 'department'
+        ).first()
+
+@receiver(post_save, sender=Student)
+def move_student_cohort(sender, instance, **kwargs):
+    """Recompute the cohort cells a student moved between, when the batch or department changed."""
+    previous = getattr(instance, '_previous_cohort', None)
+    if previous is None or previous == (instance.batch, instance.department):
+        return
+    keys = set()
+    for course_id in student_course_ids(instance.pk):
+        keys.add((course_id, *previous))
+        keys.add((course_id, instance.batch, instance.department))
+    refresh_cohort_cells(keys)
+
+@receiver(pre_delete, sender=Student)
+def remember_student_cohort_cells(sender, instance, **kwargs):
+    """Remember the cohort cells of a student before the student and their records are deleted."""
+    instance._cohort_cell_keys = {
+        (course_id, instance.batch, instance.department) for course_id in student_course_ids(instance.pk)
+    }
+
+@receiver(post_delete, sender=Student)
+def refresh_deleted_student_cohort_cells(sender, instance, **kwargs):
+    """Recompute the cohort cells a deleted student contributed to."""
+    refresh_cohort_cells(getattr(instance, '_cohort_cell_keys', set()))
+
+@receiver(post_save, sender=Course)
+def update_cohort_semester(sender, instance, **kwargs):
+    """Keep the semester copied into the cohort cells in step with the course."""
+    CohortCell.objects.filter(course_id=instance.pk).exclude(semester=instance.semester).update(
+        semester=instance.semester
+    )
+
+@receiver(post_save, sender=Feedback)
+@receiver(post_delete, sender=Feedback)
+def invalidate_feedback_reports(sender, instance, **kwargs):
+    """Drop cached feedback analytics that may include this feedback."""
+    transaction.on_commit(lambda: invalidate_reports('feedback', [instance.course_id]))
@@ -0,0 +1,86 @@
+from celery import shared_task
+from django.core.cache import cache
+from django.db import transaction
+from .buffer import flush_engagement_buffer, acquire_flush_lock, release_flush_lock
+from .cache import invalidate_reports, purge_expired_reports
+from .cohorts import rebuild_cohort_cube
+from .distributions import rebuild_performance_digests
+from .export import run_export_job
+from .models import ExportJob
+from .risk import refresh_risk_scores
+from .services import build_admin_dashboard_snapshot
+from nexalink.recompute import clear_recompute_pending
+
+DASHBOARD_REFRESH_PENDING_KEY = 'admin-dashboard-refresh-pending'
+ENGAGEMENT_FLUSH_PENDING_KEY = 'engagement-flush-pending'
+
+@shared_task
+def refresh_admin_dashboard():
+    """Rebuild the admin dashboard snapshot; scheduled by celery-beat."""
+    cache.delete(DASHBOARD_REFRESH_PENDING_KEY)
+    build_admin_dashboard_snapshot()
+
+def schedule_admin_dashboard_refresh():
+    """
+    Enqueue a snapshot refresh unless one is already queued.
+
+    Returns whether a new refresh was enqueued.
+    """
+    if cache.add(DASHBOARD_REFRESH_PENDING_KEY, True, timeout=300):
+        refresh_admin_dashboard.delay()
+        return True
+    return False
+
+@shared_task
+def purge_expired_analytics_reports():
+    """Delete expired cached analytics results; scheduled by celery-beat."""
+    return purge_expired_reports()
+
+@shared_task
+def flush_engagement_events():
+    """Insert the buffered engagement events; scheduled by celery-beat."""
+    cache.delete(ENGAGEMENT_FLUSH_PENDING_KEY)
+    token = acquire_flush_lock()
+    if token is None:
+        return 0
+    try:
+        return flush_engagement_buffer(lock_token=token)
+    finally:
+        release_flush_lock(token)
+
+def schedule_engagement_flush():
+    """
+    Enqueue a flush ahead of the beat schedule unless one is already queued.
+
+    Returns whether a new flush was enqueued.
+    """
+    if cache.add(ENGAGEMENT_FLUSH_PENDING_KEY, True, timeout=60):
+        flush_engagement_events.delay()
+        return True
+    return False
+
+@shared_task
+def refresh_course_performance_digests(course_id):
+    """Rebuild the performance score digests of a course."""
+    clear_recompute_pending(refresh_course_performance_digests, course_id)
+    count = rebuild_performance_digests([course_id])
+    # Results cached before the rebuild miss the writes that scheduled it
+    transaction.on_commit(lambda: invalidate_reports('performance', [course_id]))
+    return count
+
+@shared_task
+def refresh_course_cohort_cells(course_id):
+    """Recompute the cohort cells of a course."""
+    clear_recompute_pending(refresh_course_cohort_cells, course_id)
+    return rebuild_cohort_cube([course_id])
+
+@shared_task
+def refresh_student_risk_scores():
+    """Recompute the at-risk scores of every student; scheduled nightly by celery-beat."""
+    return refresh_risk_scores()
+
+@shared_task
+def export_fact_table(job_id):
+    """Run a fact table export requested through the export API."""
+    job = ExportJob.objects.get(pk=job_id)
+    return run_export_job(job).status
@@ -0,0 +1,129 @@
+import datetime
+from unittest import mock
+import numpy as np
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from academics.models import Department, Course, Enrollment
+from attendance.models import AttendancePercentage
+from analytics.distributions import (
+    PERCENTILES, PERCENTILE_RANK_TOLERANCE, performance_distributions, rebuild_performance_digests
+)
+from analytics.models import PerformanceRecord, PerformanceDigest
+from analytics.tasks import refresh_course_cohort_cells, refresh_course_performance_digests
+from users.models import User
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+@override_settings(CACHES=LOCAL_CACHE)
+class StudentDashboardQueryTests(TestCase):
+    """The student dashboard costs the same number of queries whatever the number of courses."""
+    
+    def setUp(self):
+        faculty = User.objects.create(email='faculty@test.invalid', role='faculty').faculty_profile
+        self.department = Department.objects.create(name='Testing', code='TST')
+        self.faculty = faculty
+    
+    def _student_with_courses(self, index, course_count):
+        student = User.objects.create(
+            email=f'student{index}@test.invalid', role='student', first_name='Test', last_name=str(index)
+        ).student_profile
+        for number in range(course_count):
+            course = Course.objects.create(
+                code=f'T{index}{number:02d}', name=f'Course {number}', department=self.department,
+                faculty=self.faculty, credits=3, semester=1
+            )
+            Enrollment.objects.create(student=student, course=course)
+            AttendancePercentage.objects.create(
+                student=student, course=course, present_count=3, late_count=1, absent_count=1, total_count=5,
+                percentage=80
+            )
+            PerformanceRecord.objects.bulk_create([
+                PerformanceRecord(student=student, course=course, score_type='quiz', score=score, max_score=10,
+                                  date=datetime.date(2025, 1, day))
+                for day, score in ((1, 6), (2, 8))
+            ])
+        return student
+    
+    def _dashboard(self, student):
+        client = APIClient()
+        client.force_authenticate(student.user)
+        return client.get('/api/v1/analytics/reports/dashboard/')
+    
+    def test_query_count_does_not_grow_with_courses(self):
+        one_course = self._student_with_courses(1, 1)
+        eight_courses = self._student_with_courses(2, 8)
+        
+        # Attendance counters, grouped performance, courses and recent activity
+        with self.assertNumQueries(4):
+            response = self._dashboard(one_course)
+        self.assertEqual(len(response.data['courses']), 1)
+        
+        with self.assertNumQueries(4):
+            response = self._dashboard(eight_courses)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['courses']), 8)
+        self.assertEqual(response.data['attendance']['total_classes'], 40)
+        self.assertEqual(response.data['attendance']['present'], 32)
+        self.assertAlmostEqual(float(response.data['performance']['average']), 70.0)
+        for course in response.data['courses']:
+            self.assertEqual(course['attendance_percentage'], 80)
+            self.assertAlmostEqual(float(course['performance_percentage']), 70.0)
+
+@override_settings(CACHES=LOCAL_CACHE)
+class PerformanceDigestTests(TestCase):
+    """Digest percentiles stay within the documented rank tolerance of the exact ones."""
+    
+    def setUp(self):
+        faculty = User.objects.create(email='faculty@test.invalid', role='faculty').faculty_profile
+        department = Department.objects.create(name='Testing', code='TST')
+        self.course = Course.objects.create(
+            code='T001', name='Course', department=department, faculty=faculty, credits=3, semester=1
+        )
+        self.students = [
+            User.objects.create(email=f'student{index}@test.invalid', role='student').student_profile
+            for index in range(20)
+        ]
+    
+    def test_percentiles_match_numpy(self):
+        generator = np.random.default_rng(7)
+        # Skewed scores spread over several dates, so several digests are merged
+        scores = np.round(np.clip(generator.beta(5, 2, 5000) * 50, 0, 50), 2)
+        PerformanceRecord.objects.bulk_create([
+            PerformanceRecord(student=self.students[index % 20], course=self.course, score_type='quiz',
+                              score=score, max_score=50, date=datetime.date(2025, 1, 1 + index % 10))
+            for index, score in enumerate(scores)
+        ])
+        rebuild_performance_digests([self.course.id])
+        
+        summary = performance_distributions(course_id=self.course.id)['overall']
+        normalized = scores / 50 * 100
+        self.assertEqual(summary['total'], len(scores))
+        self.assertAlmostEqual(summary['avg_score'], normalized.mean())
+        for name, q in PERCENTILES:
+            low = np.percentile(normalized, max(q - PERCENTILE_RANK_TOLERANCE, 0) * 100)
+            high = np.percentile(normalized, min(q + PERCENTILE_RANK_TOLERANCE, 1) * 100)
+            self.assertGreaterEqual(summary[name], low - 1e-9, name)
+            self.assertLessEqual(summary[name], high + 1e-9, name)
+    
+    def test_record_writes_schedule_one_rebuild(self):
+        with mock.patch.object(refresh_course_performance_digests, 'apply_async') as apply_async, \
+                mock.patch.object(refresh_course_cohort_cells, 'apply_async') as cohort_apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for index, student in enumerate(self.students):
+                    PerformanceRecord.objects.create(student=student, course=self.course, score_type='quiz',
+                                                     score=index, max_score=20, date=datetime.date(2025, 1, 1))
+        apply_async.assert_called_once()
+        cohort_apply_async.assert_called_once()
+        self.assertEqual(PerformanceDigest.objects.count(), 0)
+        
+        # A result cached before the rebuild is dropped once it commits
+        client = APIClient()
+        client.force_authenticate(User.objects.get(email='faculty@test.invalid'))
+        url = '/api/v1/analytics/reports/performance_analytics/'
+        self.assertEqual(client.get(url, {'course_id': self.course.id}).data['overall']['total'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_course_performance_digests(self.course.id)
+        self.assertEqual(PerformanceDigest.objects.get().count, 20)
+        response = client.get(url, {'course_id': self.course.id})
+        self.assertFalse(response.data['cached'])
+        self.assertEqual(response.data['overall']['total'], 20)
@@ -1,11 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EngagementRecordViewSet, PerformanceRecordViewSet, AnalyticsReportViewSet
+from .views import (
+    EngagementRecordViewSet, PerformanceRecordViewSet, AnalyticsReportViewSet, StudentRiskScoreViewSet,
+    ExportJobViewSet
+)
 
 router = DefaultRouter()
 router.register(r'engagement', EngagementRecordViewSet)
 router.register(r'performance', PerformanceRecordViewSet)
 router.register(r'reports', AnalyticsReportViewSet)
+router.register(r'risk-scores', StudentRiskScoreViewSet)
+router.register(r'exports', ExportJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
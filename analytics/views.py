@@ -1,19 +1,46 @@
-from django.db.models import Avg, Count, Sum, F, Q, Case, When, Value, IntegerField
+import os
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Sum, F, Q, OuterRef
+from django.http import FileResponse
 from django.utils import timezone
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, mixins, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import EngagementRecord, PerformanceRecord, AnalyticsReport
+from django_filters.rest_framework import DjangoFilterBackend
+from .models import EngagementRecord, PerformanceRecord, AnalyticsReport, StudentRiskScore, ExportJob
 from .serializers import (
-    EngagementRecordSerializer, PerformanceRecordSerializer, AnalyticsReportSerializer,
+    EngagementRecordSerializer, EngagementIngestSerializer, PerformanceRecordSerializer,
+    AnalyticsReportSerializer, StudentRiskScoreSerializer, ExportJobSerializer,
     AttendanceAnalyticsSerializer, PerformanceAnalyticsSerializer,
-    EngagementAnalyticsSerializer, FeedbackAnalyticsSerializer
+    EngagementAnalyticsSerializer, FeedbackAnalyticsSerializer, CohortAnalyticsSerializer
 )
+from .buffer import BufferFull, get_engagement_buffer, engagement_event, defer_engagement_users
+from .rollups import (
+    engagement_breakdown, raw_engagement_breakdown, engagement_user_summary,
+    increment_engagement_rollups, add_engagement_users, rollup_counts
+)
+from .cohorts import cohort_rollup
+from .distributions import performance_distributions
+from .grouping import grouped_status_counts
+from .parallel import QueryTimeout, fetch, run_parallel
+from .cache import report_cache_key, report_scope, get_cached_report, store_report, report_response_data
+from .services import get_admin_dashboard_snapshot, snapshot_age
+from .tasks import schedule_admin_dashboard_refresh, schedule_engagement_flush, export_fact_table
+from users.models import User, Student
 from users.permissions import IsAdminUser, IsFacultyUser, IsStudentUser
-from attendance.models import AttendanceRecord
+from academics.cache import faculty_teaches, get_faculty_course_ids
+from academics.models import Course
+from attendance.counters import window_counts, window_counts_by, counts_by_date
+from attendance.models import (
+    AttendanceRecord, AttendancePercentage, AttendanceDailyCounter, CourseAttendanceDailyCounter
+)
 from feedback.models import Feedback
+from nexalink.fieldsets import FieldsetMixin
+from nexalink.pagination import KeysetPagination
 
-class EngagementRecordViewSet(viewsets.ModelViewSet):
+class EngagementRecordViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing engagement records."""
     queryset = EngagementRecord.objects.all()
     serializer_class = EngagementRecordSerializer
@@ -24,26 +51,85 @@ class EngagementRecordViewSet(viewsets.ModelViewSet):
         """
         if self.action in ['list', 'retrieve']:
             permission_classes = [IsAdminUser]
-        elif self.action in ['create']:
+        elif self.action in ['create', 'ingest']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
     
+    def _get_user_type(self, user):
+        if user.role == 'student':
+            return 'student'
+        elif user.role == 'faculty':
+            return 'faculty'
+        return 'admin'
+    
+    @transaction.atomic
     def perform_create(self, serializer):
-        """Set the user and user_type fields based on the current user."""
+        """
+        Set the user and user_type fields based on the current user.
+
+        Every event of a day shares its user sketch rows, so the record is
+        added to them by the next buffer flush instead of locking them here.
+        """
         user = self.request.user
+        record = serializer.save(user=user, user_type=self._get_user_type(user))
+        increment_engagement_rollups(rollup_counts([record]))
+        transaction.on_commit(lambda: defer_engagement_users(record))
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """Move the event between rollup buckets if its type or action changed."""
+        counts = rollup_counts([serializer.instance], sign=-1)
+        record = serializer.save()
+        counts.update(rollup_counts([record]))
+        increment_engagement_rollups(counts)
+        add_engagement_users([record])
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        increment_engagement_rollups(rollup_counts([instance], sign=-1))
+        instance.delete()
+    
+    @action(detail=False, methods=['post'])
+    def ingest(self, request):
+        """
+        Accept a batch of activity events for the current user.
+
+        The events are appended to the engagement buffer and inserted later
+        in bulk, so this answers 202 without touching the database. When the
+        buffer is full it answers 503 with ``Retry-After``.
+        """
+        serializer = EngagementIngestSerializer(data=request.data)
         
-        if user.role == 'student':
-            user_type = 'student'
-        elif user.role == 'faculty':
-            user_type = 'faculty'
-        else:
-            user_type = 'admin'
+        if serializer.is_valid():
+            user = request.user
+            user_type = self._get_user_type(user)
+            timestamp = timezone.now()
+            events = [
+                engagement_event(user, user_type, timestamp=timestamp, **event)
+                for event in serializer.validated_data['events']
+            ]
+            
+            buffer = get_engagement_buffer()
+            try:
+                buffer.push(events)
+            except BufferFull:
+                return Response(
+                    {"detail": "Engagement buffer is full, retry later."},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(settings.ENGAGEMENT_FLUSH_SECONDS)}
+                )
+            
+            # Flush ahead of the beat schedule during bursts
+            if len(buffer) >= settings.ENGAGEMENT_FLUSH_BATCH_SIZE:
+                schedule_engagement_flush()
+            
+            return Response({"accepted": len(events)}, status=status.HTTP_202_ACCEPTED)
         
-        serializer.save(user=user, user_type=user_type)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class PerformanceRecordViewSet(viewsets.ModelViewSet):
+class PerformanceRecordViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing performance records."""
     queryset = PerformanceRecord.objects.all()
     serializer_class = PerformanceRecordSerializer
@@ -58,7 +144,7 @@ class PerformanceRecordViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_performance(self, request):
         """Get performance records for the current student."""
         if request.user.role != 'student':
@@ -68,7 +154,7 @@ class PerformanceRecordViewSet(viewsets.ModelViewSet):
             )
         
         student = request.user.student_profile
-        records = PerformanceRecord.objects.filter(student=student)
+        records = self.get_queryset().filter(student=student)
         
         # Filter by course if provided
         course_id = request.query_params.get('course_id')
@@ -90,24 +176,95 @@ class PerformanceRecordViewSet(viewsets.ModelViewSet):
         if end_date:
             records = records.filter(date__lte=end_date)
         
-        serializer = self.get_serializer(records, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(records.order_by('-date', '-id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class AnalyticsReportViewSet(viewsets.ModelViewSet):
+class StudentRiskScoreViewSet(FieldsetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Ranked at-risk students, highest score first.
+
+    Faculty see the students of the courses they teach, admins everyone.
+    The scores are computed nightly by the risk batch job (analytics.risk);
+    filter with ``course``, ``risk_level`` and ``score__gte``.
+    """
+    queryset = StudentRiskScore.objects.select_related('student__user', 'course')
+    serializer_class = StudentRiskScoreSerializer
+    permission_classes = [IsAdminUser | IsFacultyUser]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'course': ['exact'],
+        'risk_level': ['exact'],
+        'score': ['gte'],
+    }
+    ordering_fields = ['score', 'attendance_percentage', 'ia_percentage', 'performance_average']
+    ordering = ['-score', 'id']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.role == 'faculty':
+            queryset = queryset.filter(course_id__in=get_faculty_course_ids(self.request.user.faculty_profile.id))
+        return queryset
+
+class ExportJobViewSet(FieldsetMixin, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                       mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Admin-only exports of the fact tables to Parquet or Arrow files.
+
+    Creating a job runs it in the background; poll it until ``status`` is
+    ``completed`` and fetch the file from its ``download`` action.
+    """
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAdminUser]
+    
+    def perform_create(self, serializer):
+        job = serializer.save(requested_by=self.request.user)
+        transaction.on_commit(lambda: export_fact_table.delay(job.id))
+    
+    def perform_destroy(self, instance):
+        instance.artifact.delete(save=False)
+        instance.delete()
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the exported file."""
+        job = self.get_object()
+        if job.status != 'completed' or not job.artifact:
+            return Response(
+                {"detail": "The export has not completed."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return FileResponse(
+            job.artifact.open('rb'), as_attachment=True, filename=os.path.basename(job.artifact.name)
+        )
+
+class AnalyticsReportViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing analytics reports."""
     queryset = AnalyticsReport.objects.all()
     serializer_class = AnalyticsReportSerializer
     
+    def get_queryset(self):
+        # Cached analytics results hold data scoped to the caller they were
+        # computed for, they are only served by the analytics actions
+        return super().get_queryset().filter(cache_key__isnull=True)
+    
     def get_permissions(self):
         """
         Instantiates and returns the list of permissions that this view requires.
         """
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'refresh_dashboard']:
             permission_classes = [IsAdminUser]
         else:
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
-    
+
+    def _query_timeout_response(self):
+        return Response(
+            {"detail": "Analytics took too long to compute, retry later."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
     @action(detail=False, methods=['get'])
     def attendance_analytics(self, request):
         """Get attendance analytics."""
@@ -128,12 +285,18 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             
             if course_id and request.user.role == 'faculty':
                 # Check if the faculty teaches this course
-                if not request.user.faculty_profile.courses.filter(id=course_id).exists():
+                if not faculty_teaches(request.user.faculty_profile.id, course_id):
                     return Response(
                         {"detail": "You can only view attendance analytics for courses you teach."},
                         status=status.HTTP_403_FORBIDDEN
                     )
             
+            # Serve the result from the report cache when possible
+            cache_key = report_cache_key('attendance', serializer.validated_data, report_scope(request.user))
+            report = get_cached_report(cache_key)
+            if report is not None:
+                return Response(report_response_data(report, cached=True))
+            
             # Base query
             query = AttendanceRecord.objects.all()
             
@@ -150,13 +313,27 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             if end_date:
                 query = query.filter(date__lte=end_date)
             
-            # Calculate overall statistics
-            overall_stats = query.aggregate(
-                total=Count('id'),
-                present=Count(Case(When(status='present', then=1), output_field=IntegerField())),
-                absent=Count(Case(When(status='absent', then=1), output_field=IntegerField())),
-                late=Count(Case(When(status='late', then=1), output_field=IntegerField()))
-            )
+            include_students = not student_id and (request.user.role == 'faculty' or request.user.role == 'admin')
+            if course_id and not student_id:
+                # A course's figures come from its daily counters without reading records
+                course_counters = CourseAttendanceDailyCounter.objects.filter(course_id=course_id)
+                overall_stats = window_counts(course_counters, start_date, end_date)
+                groups = {'date': counts_by_date(course_counters, start_date, end_date)}
+                if include_students:
+                    by_student = window_counts_by(
+                        Student.objects.filter(attendance_percentages__course_id=course_id),
+                        AttendanceDailyCounter.objects.filter(course_id=course_id, student_id=OuterRef('pk')),
+                        start_date, end_date
+                    )
+                    groups['student_id'] = {key: counts for key, counts in by_student.items() if counts['total']}
+            else:
+                # Count every requested grouping in one pass over the records
+                dimensions = ['date']
+                if not course_id:
+                    dimensions.append('course_id')
+                if include_students:
+                    dimensions.append('student_id')
+                overall_stats, groups = grouped_status_counts(query, dimensions, ['present', 'absent', 'late'])
             
             # Calculate percentages
             if overall_stats['total'] > 0:
@@ -169,36 +346,35 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
                 overall_stats['late_percentage'] = 0
             
             # Get attendance by date
-            attendance_by_date = query.values('date').annotate(
-                total=Count('id'),
-                present=Count(Case(When(status='present', then=1), output_field=IntegerField())),
-                absent=Count(Case(When(status='absent', then=1), output_field=IntegerField())),
-                late=Count(Case(When(status='late', then=1), output_field=IntegerField()))
-            ).order_by('date')
+            attendance_by_date = [
+                {'date': date, **counts} for date, counts in sorted(groups['date'].items())
+            ]
             
             # Get attendance by course (if not filtered by course)
             attendance_by_course = []
-            if not course_id:
-                attendance_by_course = query.values('course__code', 'course__name').annotate(
-                    total=Count('id'),
-                    present=Count(Case(When(status='present', then=1), output_field=IntegerField())),
-                    absent=Count(Case(When(status='absent', then=1), output_field=IntegerField())),
-                    late=Count(Case(When(status='late', then=1), output_field=IntegerField()))
-                ).order_by('course__code')
+            if 'course_id' in groups:
+                courses = Course.objects.filter(id__in=groups['course_id'].keys()).values('id', 'code', 'name')
+                attendance_by_course = [
+                    {'course__code': course['code'], 'course__name': course['name'],
+                     **groups['course_id'][course['id']]}
+                    for course in sorted(courses, key=lambda course: course['code'])
+                ]
             
             # Get attendance by student (if not filtered by student)
             attendance_by_student = []
-            if not student_id and (request.user.role == 'faculty' or request.user.role == 'admin'):
-                attendance_by_student = query.values(
-                    'student__user__first_name', 
-                    'student__user__last_name', 
-                    'student__enrollment_number'
-                ).annotate(
-                    total=Count('id'),
-                    present=Count(Case(When(status='present', then=1), output_field=IntegerField())),
-                    absent=Count(Case(When(status='absent', then=1), output_field=IntegerField())),
-                    late=Count(Case(When(status='late', then=1), output_field=IntegerField()))
-                ).order_by('student__user__first_name')
+            if 'student_id' in groups:
+                students = Student.objects.filter(id__in=groups['student_id'].keys()).values(
+                    'id', 'user__first_name', 'user__last_name', 'enrollment_number'
+                )
+                attendance_by_student = [
+                    {
+                        'student__user__first_name': student['user__first_name'],
+                        'student__user__last_name': student['user__last_name'],
+                        'student__enrollment_number': student['enrollment_number'],
+                        **groups['student_id'][student['id']]
+                    }
+                    for student in sorted(students, key=lambda student: student['user__first_name'])
+                ]
             
             # Prepare response
             response_data = {
@@ -208,7 +384,11 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
                 'by_student': attendance_by_student
             }
             
-            return Response(response_data)
+            report = store_report(
+                cache_key, 'attendance', serializer.validated_data, response_data,
+                course_id=course_id, student_id=student_id
+            )
+            return Response(report_response_data(report, cached=False))
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -233,12 +413,18 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             
             if course_id and request.user.role == 'faculty':
                 # Check if the faculty teaches this course
-                if not request.user.faculty_profile.courses.filter(id=course_id).exists():
+                if not faculty_teaches(request.user.faculty_profile.id, course_id):
                     return Response(
                         {"detail": "You can only view performance analytics for courses you teach."},
                         status=status.HTTP_403_FORBIDDEN
                     )
             
+            # Serve the result from the report cache when possible
+            cache_key = report_cache_key('performance', serializer.validated_data, report_scope(request.user))
+            report = get_cached_report(cache_key)
+            if report is not None:
+                return Response(report_response_data(report, cached=True))
+            
             # Base query
             query = PerformanceRecord.objects.all()
             
@@ -258,33 +444,31 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             if end_date:
                 query = query.filter(date__lte=end_date)
             
-            # Calculate overall statistics
-            overall_stats = query.aggregate(
-                total=Count('id'),
-                avg_score=Avg(F('score') / F('max_score') * 100),
-                min_score=Avg(F('score') / F('max_score') * 100),
-                max_score=Avg(F('score') / F('max_score') * 100)
-            )
+            # Score distributions from the per-course digests
+            distributions = performance_distributions(course_id, student_id, score_type, start_date, end_date)
+            overall_stats = distributions['overall']
             
             # Get performance by score type
-            performance_by_type = query.values('score_type').annotate(
-                total=Count('id'),
-                avg_score=Avg(F('score') / F('max_score') * 100)
-            ).order_by('score_type')
+            performance_by_type = [
+                {'score_type': key, **summary}
+                for key, summary in sorted(distributions['by_type'].items())
+            ]
             
             # Get performance by date
-            performance_by_date = query.values('date').annotate(
-                total=Count('id'),
-                avg_score=Avg(F('score') / F('max_score') * 100)
-            ).order_by('date')
+            performance_by_date = [
+                {'date': key, **summary}
+                for key, summary in sorted(distributions['by_date'].items())
+            ]
             
             # Get performance by course (if not filtered by course)
             performance_by_course = []
             if not course_id:
-                performance_by_course = query.values('course__code', 'course__name').annotate(
-                    total=Count('id'),
-                    avg_score=Avg(F('score') / F('max_score') * 100)
-                ).order_by('course__code')
+                courses = Course.objects.filter(id__in=distributions['by_course'].keys()).values('id', 'code', 'name')
+                performance_by_course = [
+                    {'course__code': course['code'], 'course__name': course['name'],
+                     **distributions['by_course'][course['id']]}
+                    for course in sorted(courses, key=lambda course: course['code'])
+                ]
             
             # Get performance by student (if not filtered by student)
             performance_by_student = []
@@ -307,7 +491,11 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
                 'by_student': performance_by_student
             }
             
-            return Response(response_data)
+            report = store_report(
+                cache_key, 'performance', serializer.validated_data, response_data,
+                course_id=course_id, student_id=student_id
+            )
+            return Response(report_response_data(report, cached=False))
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -322,6 +510,7 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             action = serializer.validated_data.get('action')
             start_date = serializer.validated_data.get('start_date')
             end_date = serializer.validated_data.get('end_date')
+            exact = serializer.validated_data.get('exact')
             
             # Check permissions
             if user_id and request.user.id != user_id and request.user.role != 'admin':
@@ -330,6 +519,12 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
+            # Serve the result from the report cache when possible
+            cache_key = report_cache_key('engagement', serializer.validated_data, report_scope(request.user))
+            report = get_cached_report(cache_key)
+            if report is not None:
+                return Response(report_response_data(report, cached=True))
+            
             # Base query
             query = EngagementRecord.objects.all()
             
@@ -349,43 +544,85 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             if end_date:
                 query = query.filter(timestamp__lte=end_date)
             
+            # Count events per hour, weekday, user type and action; the hourly
+            # rollups have no per-user dimension, so only user queries scan events
+            if user_id:
+                tasks = {'counts': lambda: raw_engagement_breakdown(query)}
+            else:
+                tasks = {'counts': lambda: engagement_breakdown(user_type, action, start_date, end_date)}
+            
+            # Distinct and most active users are estimated from the daily
+            # sketches unless exact figures are requested
+            unique_users_exact = bool(user_id or exact)
+            if unique_users_exact:
+                tasks['unique_users'] = lambda: query.values('user').distinct().count()
+                if request.user.role == 'admin':
+                    tasks['top_users'] = fetch(query.values('user__email', 'user_type').annotate(
+                        count=Count('id')
+                    ).order_by('-count')[:10])
+            else:
+                tasks['user_summary'] = lambda: engagement_user_summary(user_type, action, start_date, end_date)
+            
+            # The breakdown and the user figures run side by side
+            try:
+                results = run_parallel(tasks)
+            except QueryTimeout:
+                return self._query_timeout_response()
+            counts = results['counts']
+            
+            by_action = Counter()
+            by_user_type = Counter()
+            by_hour = Counter()
+            by_day = Counter()
+            for (hour, weekday, row_user_type, row_action), count in counts.items():
+                by_action[row_action] += count
+                by_user_type[row_user_type] += count
+                by_hour[hour] += count
+                # Day of week numbered from 0 = Sunday, as Postgres' EXTRACT(dow)
+                by_day[weekday - 1] += count
+            
+            if unique_users_exact:
+                unique_users = results['unique_users']
+            else:
+                unique_users, ranked_users = results['user_summary']
+            
             # Calculate overall statistics
             overall_stats = {
-                'total_records': query.count(),
-                'unique_users': query.values('user').distinct().count(),
-                'unique_actions': query.values('action').distinct().count()
+                'total_records': sum(by_action.values()),
+                'unique_users': unique_users,
+                'unique_users_exact': unique_users_exact,
+                'unique_actions': len(by_action)
             }
             
             # Get engagement by action
-            engagement_by_action = query.values('action').annotate(
-                count=Count('id')
-            ).order_by('-count')
+            engagement_by_action = [
+                {'action': key, 'count': count}
+                for key, count in sorted(by_action.items(), key=lambda item: (-item[1], item[0]))
+            ]
             
             # Get engagement by user type
-            engagement_by_user_type = query.values('user_type').annotate(
-                count=Count('id')
-            ).order_by('user_type')
+            engagement_by_user_type = [
+                {'user_type': key, 'count': by_user_type[key]} for key in sorted(by_user_type)
+            ]
             
             # Get engagement by time (hourly)
-            engagement_by_hour = query.extra(
-                select={'hour': "EXTRACT(hour FROM timestamp)"}
-            ).values('hour').annotate(
-                count=Count('id')
-            ).order_by('hour')
+            engagement_by_hour = [{'hour': key, 'count': by_hour[key]} for key in sorted(by_hour)]
             
             # Get engagement by day of week
-            engagement_by_day = query.extra(
-                select={'day': "EXTRACT(dow FROM timestamp)"}
-            ).values('day').annotate(
-                count=Count('id')
-            ).order_by('day')
+            engagement_by_day = [{'day': key, 'count': by_day[key]} for key in sorted(by_day)]
             
             # Get top users by engagement
             top_users = []
-            if request.user.role == 'admin':
-                top_users = query.values('user__email', 'user_type').annotate(
-                    count=Count('id')
-                ).order_by('-count')[:10]
+            if request.user.role == 'admin' and unique_users_exact:
+                top_users = results['top_users']
+            elif request.user.role == 'admin':
+                emails = dict(
+                    User.objects.filter(id__in=[entry[0] for entry in ranked_users]).values_list('id', 'email')
+                )
+                top_users = [
+                    {'user__email': emails.get(ranked_user_id), 'user_type': ranked_user_type, 'count': count}
+                    for ranked_user_id, ranked_user_type, count in ranked_users
+                ]
             
             # Prepare response
             response_data = {
@@ -397,7 +634,10 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
                 'top_users': top_users
             }
             
-            return Response(response_data)
+            report = store_report(
+                cache_key, 'engagement', serializer.validated_data, response_data
+            )
+            return Response(report_response_data(report, cached=False))
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -419,6 +659,12 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
+            # Serve the result from the report cache when possible
+            cache_key = report_cache_key('feedback', serializer.validated_data, report_scope(request.user))
+            report = get_cached_report(cache_key)
+            if report is not None:
+                return Response(report_response_data(report, cached=True))
+            
             # Base query
             query = Feedback.objects.all()
             
@@ -435,60 +681,121 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             if end_date:
                 query = query.filter(timestamp__date__lte=end_date)
             
-            # Calculate overall statistics
-            overall_stats = {
-                'total_feedback': query.count(),
-                'avg_rating': query.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0,
-                'pending_count': query.filter(status='pending').count(),
-                'responded_count': query.filter(status='responded').count(),
-                'resolved_count': query.filter(status='resolved').count()
+            # The aggregates are independent of each other, so they run side
+            # by side on the analytics query pool
+            tasks = {
+                'overall': lambda: query.aggregate(
+                    total_feedback=Count('id'),
+                    avg_rating=Avg('rating'),
+                    pending_count=Count('id', filter=Q(status='pending')),
+                    responded_count=Count('id', filter=Q(status='responded')),
+                    resolved_count=Count('id', filter=Q(status='resolved'))
+                ),
+                # Get feedback by sentiment
+                'by_sentiment': fetch(query.values('sentiment').annotate(
+                    count=Count('id')
+                ).order_by('sentiment')),
+                # Get feedback by status
+                'by_status': fetch(query.values('status').annotate(
+                    count=Count('id')
+                ).order_by('status')),
+                # Get feedback by rating
+                'by_rating': fetch(query.values('rating').annotate(
+                    count=Count('id')
+                ).order_by('rating'))
             }
             
-            # Get feedback by sentiment
-            feedback_by_sentiment = query.values('sentiment').annotate(
-                count=Count('id')
-            ).order_by('sentiment')
-            
             # Get feedback by course
-            feedback_by_course = []
             if not course_id:
-                feedback_by_course = query.values('course__code', 'course__name').annotate(
+                tasks['by_course'] = fetch(query.values('course__code', 'course__name').annotate(
                     count=Count('id'),
                     avg_rating=Avg('rating')
-                ).order_by('course__code')
+                ).order_by('course__code'))
             
             # Get feedback by faculty
-            feedback_by_faculty = []
             if not faculty_id and request.user.role == 'admin':
-                feedback_by_faculty = query.values(
+                tasks['by_faculty'] = fetch(query.values(
                     'faculty__user__first_name', 
                     'faculty__user__last_name'
                 ).annotate(
                     count=Count('id'),
                     avg_rating=Avg('rating')
-                ).order_by('faculty__user__first_name')
+                ).order_by('faculty__user__first_name'))
             
-            # Get feedback by status
-            feedback_by_status = query.values('status').annotate(
-                count=Count('id')
-            ).order_by('status')
+            try:
+                results = run_parallel(tasks)
+            except QueryTimeout:
+                return self._query_timeout_response()
             
-            # Get feedback by rating
-            feedback_by_rating = query.values('rating').annotate(
-                count=Count('id')
-            ).order_by('rating')
+            overall_stats = results['overall']
+            overall_stats['avg_rating'] = overall_stats['avg_rating'] or 0
             
             # Prepare response
             response_data = {
                 'overall': overall_stats,
-                'by_sentiment': feedback_by_sentiment,
-                'by_course': feedback_by_course,
-                'by_faculty': feedback_by_faculty,
-                'by_status': feedback_by_status,
-                'by_rating': feedback_by_rating
+                'by_sentiment': results['by_sentiment'],
+                'by_course': results.get('by_course', []),
+                'by_faculty': results.get('by_faculty', []),
+                'by_status': results['by_status'],
+                'by_rating': results['by_rating']
             }
             
-            return Response(response_data)
+            report = store_report(
+                cache_key, 'feedback', serializer.validated_data, response_data, course_id=course_id
+            )
+            return Response(report_response_data(report, cached=False))
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'])
+    def cohort_analytics(self, request):
+        """Compare attendance and performance across courses, batches, departments and semesters."""
+        serializer = CohortAnalyticsSerializer(data=request.query_params)
+        
+        if serializer.is_valid():
+            group_by = serializer.validated_data['group_by']
+            course_id = serializer.validated_data.get('course_id')
+            
+            # Check permissions
+            if request.user.role == 'student':
+                return Response(
+                    {"detail": "Only faculty and admins can view cohort analytics."},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            
+            course_ids = None
+            if request.user.role == 'faculty':
+                # Faculty compare cohorts within the courses they teach
+                course_ids = get_faculty_course_ids(request.user.faculty_profile.id)
+                if course_id and course_id not in course_ids:
+                    return Response(
+                        {"detail": "You can only view cohort analytics for courses you teach."},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+            if course_id:
+                course_ids = [course_id]
+            
+            # Sliced and rolled up from the cohort cube, without reading the records
+            overall, groups = cohort_rollup(
+                group_by,
+                course_ids=course_ids,
+                batch=serializer.validated_data.get('batch'),
+                department=serializer.validated_data.get('department'),
+                semester=serializer.validated_data.get('semester')
+            )
+            
+            if 'course' in group_by:
+                codes = dict(Course.objects.filter(
+                    id__in={group['course'] for group in groups}
+                ).values_list('id', 'code'))
+                for group in groups:
+                    group['course__code'] = codes.get(group['course'])
+            
+            return Response({
+                'group_by': group_by,
+                'overall': overall,
+                'groups': groups
+            })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -501,32 +808,48 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             # Student dashboard
             student = user.student_profile
             
-            # Get attendance data
-            attendance_records = AttendanceRecord.objects.filter(student=student)
-            total_attendance = attendance_records.count()
-            present_count = attendance_records.filter(status__in=['present', 'late']).count()
+            # Attendance per course from the cached counters, performance with
+            # one GROUP BY query
+            attendance_by_course = {
+                row['course_id']: {'total': row['total_count'], 'present': row['present_count'] + row['late_count']}
+                for row in AttendancePercentage.objects.filter(student=student).values(
+                    'course_id', 'total_count', 'present_count', 'late_count'
+                )
+            }
+            performance_by_course = {
+                row['course_id']: row
+                for row in PerformanceRecord.objects.filter(student=student).order_by().values(
+                    'course_id'
+                ).annotate(
+                    total=Count('id'),
+                    score_sum=Sum(F('score') / F('max_score') * 100)
+                )
+            }
+            
+            # Overall figures are the sums over every course with records
+            total_attendance = sum(row['total'] for row in attendance_by_course.values())
+            present_count = sum(row['present'] for row in attendance_by_course.values())
             attendance_percentage = (present_count / total_attendance * 100) if total_attendance > 0 else 0
             
-            # Get performance data
-            performance_records = PerformanceRecord.objects.filter(student=student)
-            avg_performance = performance_records.aggregate(
-                avg=Avg(F('score') / F('max_score') * 100)
-            )['avg'] or 0
+            performance_total = sum(row['total'] for row in performance_by_course.values())
+            performance_sum = sum(row['score_sum'] or 0 for row in performance_by_course.values())
+            avg_performance = (performance_sum / performance_total) if performance_total > 0 else 0
             
             # Get course data
             courses = student.courses.all()
             course_data = []
             
             for course in courses:
-                course_attendance = AttendanceRecord.objects.filter(student=student, course=course)
-                course_attendance_total = course_attendance.count()
-                course_attendance_present = course_attendance.filter(status__in=['present', 'late']).count()
+                course_attendance = attendance_by_course.get(course.id, {'total': 0, 'present': 0})
+                course_attendance_total = course_attendance['total']
+                course_attendance_present = course_attendance['present']
                 course_attendance_percentage = (course_attendance_present / course_attendance_total * 100) if course_attendance_total > 0 else 0
                 
-                course_performance = PerformanceRecord.objects.filter(student=student, course=course)
-                course_avg_performance = course_performance.aggregate(
-                    avg=Avg(F('score') / F('max_score') * 100)
-                )['avg'] or 0
+                course_performance = performance_by_course.get(course.id)
+                course_avg_performance = (
+                    course_performance['score_sum'] / course_performance['total']
+                    if course_performance and course_performance['score_sum'] is not None else 0
+                )
                 
                 course_data.append({
                     'id': course.id,
@@ -572,10 +895,15 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             courses = faculty.courses.all()
             course_data = []
             
+            # Attendance of every course from the last row of its daily counters
+            attendance_by_course = window_counts_by(
+                courses, CourseAttendanceDailyCounter.objects.filter(course_id=OuterRef('pk'))
+            )
+            
             for course in courses:
-                course_attendance = AttendanceRecord.objects.filter(course=course)
-                course_attendance_total = course_attendance.count()
-                course_attendance_present = course_attendance.filter(status__in=['present', 'late']).count()
+                course_attendance = attendance_by_course[course.id]
+                course_attendance_total = course_attendance['total']
+                course_attendance_present = course_attendance['present'] + course_attendance['late']
                 course_attendance_percentage = (course_attendance_present / course_attendance_total * 100) if course_attendance_total > 0 else 0
                 
                 course_students = course.students.count()
@@ -618,25 +946,14 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             return Response(response_data)
         
         else:  # Admin dashboard
-            # Get system-wide statistics
-            total_students = Student.objects.count()
-            total_faculty = faculty = user.faculty_profile.objects.count()
-            total_courses = Course.objects.count()
-            
-            # Get attendance statistics
-            attendance_records = AttendanceRecord.objects.all()
-            total_attendance = attendance_records.count()
-            present_count = attendance_records.filter(status__in=['present', 'late']).count()
-            attendance_percentage = (present_count / total_attendance * 100) if total_attendance > 0 else 0
-            
-            # Get feedback statistics
-            feedback = Feedback.objects.all()
-            total_feedback = feedback.count()
-            avg_rating = feedback.aggregate(avg=Avg('rating'))['avg'] or 0
-            
-            # Get engagement statistics
-            engagement = EngagementRecord.objects.all()
-            total_engagement = engagement.count()
+            # System-wide counts come from the snapshot refreshed by celery-beat
+            snapshot = get_admin_dashboard_snapshot()
+            if snapshot is None:
+                schedule_admin_dashboard_refresh()
+                return Response(
+                    {"detail": "The dashboard snapshot is being generated.", "snapshot_pending": True},
+                    status=status.HTTP_202_ACCEPTED
+                )
             
             # Get recent activities
             recent_activities = EngagementRecord.objects.order_by('-timestamp')[:10]
@@ -651,24 +968,20 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
                 })
             
             # Prepare response
-            response_data = {
-                'users': {
-                    'students': total_students,
-                    'faculty': total_faculty
-                },
-                'courses': total_courses,
-                'attendance': {
-                    'percentage': attendance_percentage,
-                    'total': total_attendance
-                },
-                'feedback': {
-                    'total': total_feedback,
-                    'avg_rating': avg_rating
-                },
-                'engagement': {
-                    'total': total_engagement
-                },
-                'recent_activities': activities
+            response_data = dict(snapshot.data)
+            response_data['recent_activities'] = activities
+            response_data['snapshot'] = {
+                'generated_at': snapshot.generated_at,
+                'age_seconds': snapshot_age(snapshot)
             }
             
             return Response(response_data)
+    
+    @action(detail=False, methods=['post'])
+    def refresh_dashboard(self, request):
+        """Schedule a rebuild of the admin dashboard snapshot."""
+        scheduled = schedule_admin_dashboard_refresh()
+        return Response(
+            {"detail": "Dashboard refresh scheduled." if scheduled else "Dashboard refresh already pending."},
+            status=status.HTTP_202_ACCEPTED
+        )
@@ -0,0 +1,273 @@
+"""
+Prefix sums of the attendance records by day.
+
+``AttendanceDailyCounter`` (per course and student) and
+``CourseAttendanceDailyCounter`` (per course) store running totals: the row
+of a day holds the counts of every record up to and including that day. The
+counts of a window ``start_date .. end_date`` are the last row on or before
+``end_date`` minus the last row before ``start_date``, i.e. two index lookups
+instead of a scan of the records in the window.
+
+Changes to the counters of a course are serialized by a lock on the course
+row, taken in the transaction that applies them.
+"""
+from collections import Counter, defaultdict
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import AttendanceRecord, AttendanceDailyCounter, CourseAttendanceDailyCounter
+from academics.models import Course
+from users.models import Student
+
+COUNTER_FIELDS = {
+    'present': 'present_count',
+    'late': 'late_count',
+    'absent': 'absent_count',
+}
+
+REBUILD_BATCH_SIZE = 2000
+
+def _counts(row=None, before=None):
+    """``{'total', 'present', 'absent', 'late'}`` of a counter row minus an earlier one."""
+    counts = {}
+    for status in ('present', 'absent', 'late'):
+        field = COUNTER_FIELDS[status]
+        counts[status] = (row or {}).get(field, 0) - (before or {}).get(field, 0)
+    return {'total': sum(counts.values()), **counts}
+
+def _latest(counters, date=None, inclusive=True):
+    """The counts of the last row of ``counters`` on (or before) ``date``."""
+    if date is not None:
+        counters = counters.filter(date__lte=date) if inclusive else counters.filter(date__lt=date)
+    return counters.order_by('-date').values(*COUNTER_FIELDS.values()).first()
+
+def window_counts(counters, start_date=None, end_date=None):
+    """Counts of one key's records between two dates (both optional, inclusive)."""
+    before = _latest(counters, start_date, inclusive=False) if start_date else None
+    return _counts(_latest(counters, end_date), before)
+
+def window_counts_by(members, counters, start_date=None, end_date=None):
+    """
+    Counts per key for many keys in one query.
+
+    ``members`` is a queryset with one row per key (e.g. courses) and
+    ``counters`` the counter rows of one key, correlated to it with
+    ``OuterRef``. Every member gets one index lookup per bound. Returns
+    ``{member pk: counts}`` including members without records.
+    """
+    def latest(prefix, **date_filter):
+        rows = counters.filter(**date_filter).order_by('-date')
+        return {
+            f'{prefix}_{field}': Coalesce(Subquery(rows.values(field)[:1]), Value(0))
+            for field in COUNTER_FIELDS.values()
+        }
+
+    annotations = latest('end', **({'date__lte': end_date} if end_date else {}))
+    if start_date:
+        annotations.update(latest('start', date__lt=start_date))
+
+    result = {}
+    for row in members.order_by().annotate(**annotations).values('pk', *annotations):
+        end = {field: row[f'end_{field}'] for field in COUNTER_FIELDS.values()}
+        start = {field: row.get(f'start_{field}', 0) for field in COUNTER_FIELDS.values()}
+        result[row['pk']] = _counts(end, start)
+    return result
+
+def attendance_counts(course_id=None, student_id=None, start_date=None, end_date=None):
+    """
+    Counts of the records of a course and/or student between two dates.
+
+    With a course this takes two lookups. Without one the windows of every
+    course (of the student) are added up, still without reading records.
+    """
+    if course_id and student_id:
+        counters = AttendanceDailyCounter.objects.filter(course_id=course_id, student_id=student_id)
+        return window_counts(counters, start_date, end_date)
+    if course_id:
+        counters = CourseAttendanceDailyCounter.objects.filter(course_id=course_id)
+        return window_counts(counters, start_date, end_date)
+
+    if student_id:
+        # Every (student, course) pair with records has an AttendancePercentage row
+        members = Course.objects.filter(attendance_percentages__student_id=student_id)
+        counters = AttendanceDailyCounter.objects.filter(student_id=student_id, course_id=OuterRef('pk'))
+    else:
+        members = Course.objects.all()
+        counters = CourseAttendanceDailyCounter.objects.filter(course_id=OuterRef('pk'))
+
+    totals = Counter()
+    for counts in window_counts_by(members, counters, start_date, end_date).values():
+        totals.update(counts)
+    return {field: totals[field] for field in ('total', 'present', 'absent', 'late')}
+
+def counts_by_date(counters, start_date=None, end_date=None):
+    """
+    Counts per day from the rows of one or more keys.
+
+    ``counters`` may span several keys (e.g. every course); each row is
+    compared with the previous row of the same key. Days without a change
+    are left out, as a GROUP BY over the records would.
+    """
+    key_fields = ['course_id'] + (['student_id'] if counters.model is AttendanceDailyCounter else [])
+    previous = {}
+    if start_date:
+        # Baselines: the last row of every key before the window
+        for row in counters.filter(date__lt=start_date).order_by(*key_fields, 'date').values(
+            *key_fields, *COUNTER_FIELDS.values()
+        ).iterator():
+            previous[tuple(row[field] for field in key_fields)] = row
+        counters = counters.filter(date__gte=start_date)
+    if end_date:
+        counters = counters.filter(date__lte=end_date)
+
+    by_date = defaultdict(Counter)
+    for row in counters.order_by(*key_fields, 'date').values(
+        *key_fields, 'date', *COUNTER_FIELDS.values()
+    ).iterator():
+        key = tuple(row[field] for field in key_fields)
+        by_date[row['date']].update(_counts(row, previous.get(key)))
+        previous[key] = row
+
+    return {
+        date: {field: counts[field] for field in ('total', 'present', 'absent', 'late')}
+        for date, counts in by_date.items() if counts['total']
+    }
+
+def _apply(model, member_model, member_field, deltas):
+    """
+    Add ``{(*group, member_id, date): Counter}`` deltas to the counter rows.
+
+    ``group`` holds the values of the key fields other than ``member_field``
+    (the course of a student counter). Missing rows on the changed day are
+    first created from the last row before it; then the delta is added to
+    that row and every later row of the key.
+    """
+    group_fields = ['course_id'] if member_field == 'student_id' else []
+
+    # Members per (group, date), and per (group, date, delta) for the updates
+    members = defaultdict(set)
+    updates = defaultdict(list)
+    for (*group, member_id, date), delta in deltas.items():
+        members[(tuple(group), date)].add(member_id)
+        vector = tuple(delta[field] for field in COUNTER_FIELDS.values())
+        updates[(tuple(group), date, vector)].append(member_id)
+
+    for (group, date), member_ids in members.items():
+        scope = dict(zip(group_fields, group))
+        existing = set(model.objects.filter(
+            date=date, **scope, **{f'{member_field}__in': member_ids}
+        ).values_list(member_field, flat=True))
+        missing = member_ids - existing
+        if not missing:
+            continue
+
+        before = model.objects.filter(**scope, **{member_field: OuterRef('pk'), 'date__lt': date})
+        starts = window_counts_by(member_model.objects.filter(pk__in=missing), before)
+        model.objects.bulk_create([
+            model(
+                date=date, **scope, **{member_field: member_id},
+                **{field: starts[member_id][status] for status, field in COUNTER_FIELDS.items()}
+            )
+            for member_id in missing
+        ], ignore_conflicts=True)
+
+    for (group, date, vector), member_ids in updates.items():
+        model.objects.filter(
+            date__gte=date, **dict(zip(group_fields, group)), **{f'{member_field}__in': member_ids}
+        ).update(**{
+            field: F(field) + change for field, change in zip(COUNTER_FIELDS.values(), vector) if change
+        })
+
+def apply_daily_counter_changes(changes):
+    """
+    Adjust the daily counters by a set of record changes.
+
+    ``changes`` is an iterable of ``(student_id, course_id, date, old_status,
+    new_status)`` tuples as taken by ``apply_attendance_changes``. The cost
+    grows with the number of changed keys and of counter rows after the
+    changed day, which is none for attendance marked today.
+    """
+    student_deltas = defaultdict(Counter)
+    course_deltas = defaultdict(Counter)
+    for student_id, course_id, date, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            if status:
+                student_deltas[(course_id, student_id, date)][COUNTER_FIELDS[status]] += sign
+                course_deltas[(course_id, date)][COUNTER_FIELDS[status]] += sign
+
+    student_deltas = {key: delta for key, delta in student_deltas.items() if any(delta.values())}
+    course_deltas = {key: delta for key, delta in course_deltas.items() if any(delta.values())}
+    if not student_deltas:
+        return
+
+    with transaction.atomic():
+        # A missing day row is created from the previous row of its key, so a
+        # concurrent change of that row must commit first or its delta is
+        # lost; every counter key belongs to a course, lock those in order.
+        # NO KEY UPDATE still lets other transactions insert records.
+        list(Course.objects.select_for_update(no_key=connection.features.has_select_for_no_key_update).filter(
+            pk__in={course_id for course_id, _ in course_deltas}
+        ).order_by('pk').values_list('pk', flat=True))
+        _apply(AttendanceDailyCounter, Student, 'student_id', student_deltas)
+        _apply(CourseAttendanceDailyCounter, Course, 'course_id', course_deltas)
+
+def rebuild_daily_counters(course_ids=None):
+    """
+    Recompute the daily counters from the raw records.
+
+    One ordered pass over the records accumulates the running totals of
+    every (course, student) and course. Returns the number of
+    ``(student counter rows, course counter rows)`` written.
+    """
+    records = AttendanceRecord.objects.all()
+    if course_ids is not None:
+        records = records.filter(course_id__in=course_ids)
+
+    student_rows = []
+    course_totals = defaultdict(lambda: defaultdict(Counter))
+    key = None
+    running = Counter()
+    with transaction.atomic():
+        counters = AttendanceDailyCounter.objects.all()
+        course_counters = CourseAttendanceDailyCounter.objects.all()
+        if course_ids is not None:
+            counters = counters.filter(course_id__in=course_ids)
+            course_counters = course_counters.filter(course_id__in=course_ids)
+        counters.delete()
+        course_counters.delete()
+
+        written = 0
+        # (student, course, date) is unique, so every record is one counter row
+        for course_id, student_id, date, status in records.order_by(
+            'course_id', 'student_id', 'date'
+        ).values_list('course_id', 'student_id', 'date', 'status').iterator():
+            if key != (course_id, student_id):
+                key = (course_id, student_id)
+                running = Counter()
+            running[COUNTER_FIELDS[status]] += 1
+            course_totals[course_id][date][COUNTER_FIELDS[status]] += 1
+            student_rows.append(AttendanceDailyCounter(
+                course_id=course_id, student_id=student_id, date=date,
+                **{field: running[field] for field in COUNTER_FIELDS.values()}
+            ))
+            if len(student_rows) >= REBUILD_BATCH_SIZE:
+                AttendanceDailyCounter.objects.bulk_create(student_rows)
+                written += len(student_rows)
+                student_rows = []
+        AttendanceDailyCounter.objects.bulk_create(student_rows)
+        written += len(student_rows)
+
+        course_rows = []
+        for course_id, days in course_totals.items():
+            running = Counter()
+            for date in sorted(days):
+                running.update(days[date])
+                course_rows.append(CourseAttendanceDailyCounter(
+                    course_id=course_id, date=date,
+                    **{field: running[field] for field in COUNTER_FIELDS.values()}
+                ))
+        CourseAttendanceDailyCounter.objects.bulk_create(course_rows, batch_size=REBUILD_BATCH_SIZE)
+
+    return written, len(course_rows)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from attendance.counters import rebuild_daily_counters
+
+class Command(BaseCommand):
+    help = 'Recompute the daily attendance counters (running totals) from the attendance records.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='course_ids',
+            help='Only rebuild this course (can be given several times).'
+        )
+    
+    def handle(self, *args, **options):
+        student_rows, course_rows = rebuild_daily_counters(options['course_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {student_rows} student and {course_rows} course daily counter rows.'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from attendance.services import rebuild_attendance_percentages
+
+class Command(BaseCommand):
+    help = 'Recount the cached attendance percentage counters from the attendance records.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='course_ids',
+            help='Only rebuild this course (can be given several times).'
+        )
+    
+    def handle(self, *args, **options):
+        count = rebuild_attendance_percentages(options['course_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} attendance percentage rows.'))
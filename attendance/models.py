@@ -1,3 +1,4 @@
+from decimal import Decimal, ROUND_HALF_UP
 from django.db import models
 from academics.models import Course
 from users.models import Student, Faculty
@@ -21,7 +22,12 @@ class AttendanceRecord(models.Model):
     
     class Meta:
         unique_together = ('student', 'course', 'date')
-        ordering = ['-date', 'student__user__first_name']
+        # Newest first; the id breaks ties, so pages can be keyed on (date, id) without a join
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['student', '-date', '-id']),
+            models.Index(fields=['course', '-date', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.course} - {self.date} - {self.status}"
@@ -32,6 +38,10 @@ class AttendancePercentage(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_percentages')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='attendance_percentages')
     percentage = models.DecimalField(max_digits=5, decimal_places=2)
+    present_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -39,3 +49,50 @@ class AttendancePercentage(models.Model):
     
     def __str__(self):
         return f"{self.student} - {self.course} - {self.percentage}%"
+    
+    def update_percentage(self):
+        """Recompute the total and the percentage from the status counters."""
+        self.total_count = self.present_count + self.late_count + self.absent_count
+        if self.total_count > 0:
+            attended = Decimal(self.present_count + self.late_count)
+            # Round half up, as Postgres does when a float is stored in a numeric column
+            self.percentage = (attended / self.total_count * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        else:
+            self.percentage = Decimal('0.00')
+
+class AttendanceDailyCounter(models.Model):
+    """
+    Running attendance counts of a student in a course.
+
+    Each row holds the counts of all the student's records in the course up
+    to and including ``date``, so the counts of any date range are the
+    difference of two rows.
+    """
+    
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_daily_counters')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='attendance_daily_counters')
+    date = models.DateField()
+    present_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('course', 'student', 'date')
+    
+    def __str__(self):
+        return f"{self.student} - {self.course} - up to {self.date}"
+
+class CourseAttendanceDailyCounter(models.Model):
+    """Running attendance counts of a whole course, like ``AttendanceDailyCounter``."""
+    
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='course_attendance_daily_counters')
+    date = models.DateField()
+    present_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('course', 'date')
+    
+    def __str__(self):
+        return f"{self.course} - up to {self.date}"
@@ -1,12 +1,12 @@
 from rest_framework import serializers
 from .models import AttendanceRecord, AttendancePercentage
-from academics.serializers import CourseSerializer
-from users.serializers import StudentSerializer, FacultySerializer
+from academics.serializers import CourseSummarySerializer
+from users.serializers import StudentSummarySerializer, FacultySummarySerializer
 
 class AttendanceRecordSerializer(serializers.ModelSerializer):
-    student_details = StudentSerializer(source='student', read_only=True)
-    course_details = CourseSerializer(source='course', read_only=True)
-    marked_by_details = FacultySerializer(source='marked_by', read_only=True)
+    student_details = StudentSummarySerializer(source='student', read_only=True)
+    course_details = CourseSummarySerializer(source='course', read_only=True)
+    marked_by_details = FacultySummarySerializer(source='marked_by', read_only=True)
     
     class Meta:
         model = AttendanceRecord
@@ -15,13 +15,14 @@ class AttendanceRecordSerializer(serializers.ModelSerializer):
                   'marked_at', 'remarks']
 
 class AttendancePercentageSerializer(serializers.ModelSerializer):
-    student_details = StudentSerializer(source='student', read_only=True)
-    course_details = CourseSerializer(source='course', read_only=True)
+    student_details = StudentSummarySerializer(source='student', read_only=True)
+    course_details = CourseSummarySerializer(source='course', read_only=True)
     
     class Meta:
         model = AttendancePercentage
         fields = ['id', 'student', 'student_details', 'course', 'course_details', 
-                  'percentage', 'last_updated']
+                  'percentage', 'present_count', 'late_count', 'absent_count',
+                  'total_count', 'last_updated']
 
 class BulkAttendanceSerializer(serializers.Serializer):
     course_id = serializers.IntegerField()
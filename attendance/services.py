@@ -0,0 +1,259 @@
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import AttendanceRecord, AttendancePercentage
+from .counters import COUNTER_FIELDS, apply_daily_counter_changes
+from academics.cache import get_course_student_ids
+from analytics.cache import invalidate_reports
+from analytics.cohorts import rebuild_cohort_cube, refresh_cohort_cells, student_cell_keys
+from users.models import Student
+
+def bulk_upsert_attendance(course, date, attendance_data, marked_by=None):
+    """
+    Insert or update a whole roll call for one course and date.
+
+    The roster is loaded once, every row is validated in memory and the valid
+    rows are written with a single ``INSERT ... ON CONFLICT`` on the
+    ``(student, course, date)`` unique key. The cached attendance percentages
+    are adjusted by the status changes of this roll call only. Regardless of
+    roster size this runs at most 7 queries:
+
+    1. the enrolled student ids of the course (skipped when the roster is
+       cached),
+    2. the existence check for student ids that are not on the roster
+       (only when there are any),
+    3. the previous statuses of the affected rows, locked for update,
+    4. the upsert of the valid rows,
+    5. the affected ``AttendancePercentage`` rows, locked for update,
+    6. the update of the existing percentage rows,
+    7. the insert of the missing percentage rows.
+
+    Steps 3 to 7 only run when there are valid rows. Backends that cap the
+    number of bind parameters per statement (SQLite) split steps 4, 6 and 7
+    into batches. The daily counters and the cohort cells of the changed
+    rows are updated on top of that (see ``apply_attendance_changes``).
+
+    Returns a tuple ``(records, errors)`` where ``errors`` uses the same
+    per-row format as the original bulk endpoint.
+    """
+    enrolled_ids = get_course_student_ids(course.id)
+
+    student_ids = []
+    for record in attendance_data:
+        try:
+            student_ids.append(int(record['student_id']))
+        except (TypeError, ValueError):
+            student_ids.append(None)
+
+    # Tell unknown students apart from students that are not enrolled
+    unknown_ids = {
+        student_id for student_id in student_ids
+        if student_id is not None and student_id not in enrolled_ids
+    }
+    existing_ids = set()
+    if unknown_ids:
+        existing_ids = set(
+            Student.objects.filter(id__in=unknown_ids).values_list('id', flat=True)
+        )
+
+    # Validate every row in memory, keeping the errors in request order
+    rows = {}
+    errors = []
+    for student_id, record in zip(student_ids, attendance_data):
+        if student_id in enrolled_ids:
+            # Later rows for the same student win, as with sequential update_or_create
+            rows[student_id] = record
+        elif student_id in existing_ids:
+            errors.append({
+                "student_id": record['student_id'],
+                "error": "Student is not enrolled in this course."
+            })
+        else:
+            errors.append({
+                "student_id": record['student_id'],
+                "error": "Student not found."
+            })
+
+    records = [
+        AttendanceRecord(
+            student_id=student_id,
+            course=course,
+            date=date,
+            status=record['status'],
+            remarks=record.get('remarks', ''),
+            marked_by=marked_by
+        )
+        for student_id, record in rows.items()
+    ]
+
+    if records:
+        with transaction.atomic():
+            previous = dict(
+                AttendanceRecord.objects.select_for_update()
+                .filter(course=course, date=date, student_id__in=rows.keys())
+                .values_list('student_id', 'status')
+            )
+            AttendanceRecord.objects.bulk_create(
+                records,
+                update_conflicts=True,
+                unique_fields=['student', 'course', 'date'],
+                update_fields=['status', 'remarks', 'marked_by']
+            )
+            apply_attendance_changes(
+                (record.student_id, course.id, date, previous.get(record.student_id), record.status)
+                for record in records
+            )
+            # bulk_create does not send post_save, so drop cached analytics here
+            transaction.on_commit(lambda: invalidate_reports('attendance', [course.id]))
+
+    return records, errors
+
+def apply_attendance_changes(changes):
+    """
+    Adjust the cached ``AttendancePercentage`` counters and the daily
+    counters by a set of changes, and refresh the affected cohort cells.
+
+    ``changes`` is an iterable of ``(student_id, course_id, date, old_status,
+    new_status)`` tuples, where ``old_status`` is ``None`` for inserted records
+    and ``new_status`` is ``None`` for deleted ones, applied after the records
+    were written. Only the affected (student, course) rows are read and
+    written, so the cost grows with the number of changed records instead of
+    the attendance history. A row that holds no counts yet (created before
+    the counters existed, or missing) is recounted from the records instead,
+    so the counters are right before ``rebuild_attendance_percentages`` ran.
+    """
+    changes = list(changes)
+    apply_daily_counter_changes(changes)
+    
+    deltas = defaultdict(Counter)
+    for student_id, course_id, date, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        if old_status:
+            deltas[(student_id, course_id)][old_status] -= 1
+        if new_status:
+            deltas[(student_id, course_id)][new_status] += 1
+
+    if not deltas:
+        return
+
+    students_by_course = defaultdict(set)
+    for student_id, course_id in deltas:
+        students_by_course[course_id].add(student_id)
+
+    lookup = Q()
+    for course_id, course_student_ids in students_by_course.items():
+        lookup |= Q(course_id=course_id, student_id__in=course_student_ids)
+
+    with transaction.atomic():
+        existing = {
+            (percentage.student_id, percentage.course_id): percentage
+            for percentage in AttendancePercentage.objects.select_for_update().filter(lookup)
+        }
+        recounts = _recount(
+            key for key in deltas if key not in existing or not existing[key].total_count
+        )
+
+        now = timezone.now()
+        to_update = []
+        to_create = []
+        for key, delta in deltas.items():
+            percentage = existing.get(key)
+            if percentage is None:
+                percentage = AttendancePercentage(student_id=key[0], course_id=key[1])
+                to_create.append(percentage)
+            else:
+                to_update.append(percentage)
+
+            if key in recounts:
+                for status, field in COUNTER_FIELDS.items():
+                    setattr(percentage, field, recounts[key][status])
+            else:
+                for status, count in delta.items():
+                    field = COUNTER_FIELDS[status]
+                    setattr(percentage, field, max(getattr(percentage, field) + count, 0))
+            percentage.update_percentage()
+            percentage.last_updated = now
+
+        if to_update:
+            AttendancePercentage.objects.bulk_update(
+                to_update,
+                list(COUNTER_FIELDS.values()) + ['total_count', 'percentage', 'last_updated']
+            )
+        if to_create:
+            AttendancePercentage.objects.bulk_create(
+                to_create,
+                update_conflicts=True,
+                unique_fields=['student', 'course'],
+                update_fields=list(COUNTER_FIELDS.values()) + ['total_count', 'percentage', 'last_updated']
+            )
+        refresh_cohort_cells(student_cell_keys(deltas))
+
+def _recount(keys):
+    """Status counts of the records of some ``(student_id, course_id)`` keys."""
+    keys = set(keys)
+    if not keys:
+        return {}
+    students_by_course = defaultdict(set)
+    for student_id, course_id in keys:
+        students_by_course[course_id].add(student_id)
+    lookup = Q()
+    for course_id, course_student_ids in students_by_course.items():
+        lookup |= Q(course_id=course_id, student_id__in=course_student_ids)
+    counts = {key: Counter() for key in keys}
+    for row in AttendanceRecord.objects.filter(lookup).order_by().values(
+        'student_id', 'course_id', 'status'
+    ).annotate(count=Count('id')):
+        counts[(row['student_id'], row['course_id'])][row['status']] = row['count']
+    return counts
+
+def rebuild_attendance_percentages(course_ids=None):
+    """
+    Recount the cached ``AttendancePercentage`` counters from the raw records.
+
+    This is the full recompute behind the delta maintenance, used to backfill
+    the counters or to repair drift. It runs one grouped COUNT over the
+    attendance records, one reset and one upsert, then rebuilds the cohort
+    cells of the same courses. Returns the number of rows written.
+    """
+    query = AttendanceRecord.objects.all()
+    if course_ids is not None:
+        query = query.filter(course_id__in=course_ids)
+
+    counts = query.order_by().values('student_id', 'course_id').annotate(
+        present=Count('id', filter=Q(status='present')),
+        late=Count('id', filter=Q(status='late')),
+        absent=Count('id', filter=Q(status='absent'))
+    )
+
+    percentages = []
+    for row in counts:
+        percentage = AttendancePercentage(
+            student_id=row['student_id'],
+            course_id=row['course_id'],
+            present_count=row['present'],
+            late_count=row['late'],
+            absent_count=row['absent']
+        )
+        percentage.update_percentage()
+        percentages.append(percentage)
+
+    with transaction.atomic():
+        # Reset everything in scope so pairs without records drop to zero
+        stale = AttendancePercentage.objects.all()
+        if course_ids is not None:
+            stale = stale.filter(course_id__in=course_ids)
+        stale.update(
+            present_count=0, late_count=0, absent_count=0, total_count=0,
+            percentage=0, last_updated=timezone.now()
+        )
+        AttendancePercentage.objects.bulk_create(
+            percentages,
+            update_conflicts=True,
+            unique_fields=['student', 'course'],
+            update_fields=list(COUNTER_FIELDS.values()) + ['total_count', 'percentage', 'last_updated']
+        )
+        rebuild_cohort_cube(course_ids)
+
+    return len(percentages)
@@ -1,4 +1,4 @@
-from django.db.models import Count, Case, When, IntegerField
+from django.db import transaction
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -8,13 +8,20 @@ from .serializers import (
     AttendanceRecordSerializer, AttendancePercentageSerializer,
     BulkAttendanceSerializer, AttendanceStatisticsSerializer
 )
+from .services import bulk_upsert_attendance, apply_attendance_changes
+from .counters import attendance_counts
 from academics.models import Course
-from users.models import Student, Faculty, User
+from academics.cache import faculty_teaches
+from users.models import Faculty
 from users.permissions import IsAdminUser, IsFacultyUser, IsStudentUser
+from nexalink.fieldsets import FieldsetMixin
+from nexalink.encoders import EncodedListMixin
+from nexalink.pagination import KeysetPagination
+from nexalink.streaming import STREAM_FORMATS, streaming_response
 
-class AttendanceRecordViewSet(viewsets.ModelViewSet):
+class AttendanceRecordViewSet(FieldsetMixin, EncodedListMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing attendance records."""
-    queryset = AttendanceRecord.objects.all()
+    queryset = AttendanceRecord.objects.select_related('student__user', 'course', 'marked_by__user')
     serializer_class = AttendanceRecordSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['student', 'course', 'date', 'status']
@@ -27,11 +34,42 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
     
+    @transaction.atomic
     def perform_create(self, serializer):
-        if self.request.user.role == User.Role.FACULTY:
-            serializer.save(marked_by=self.request.user.faculty_profile)
+        if self.request.user.role == 'faculty':
+            attendance = serializer.save(marked_by=self.request.user.faculty_profile)
         else:
-            serializer.save()
+            attendance = serializer.save()
+        
+        apply_attendance_changes([
+            (attendance.student_id, attendance.course_id, attendance.date, None, attendance.status)
+        ])
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        old_key = (instance.student_id, instance.course_id, instance.date)
+        old_status = instance.status
+        attendance = serializer.save()
+        new_key = (attendance.student_id, attendance.course_id, attendance.date)
+        
+        # Moving a record to another student, course or date is a delete plus an insert
+        if old_key != new_key:
+            apply_attendance_changes([
+                (*old_key, old_status, None),
+                (*new_key, None, attendance.status)
+            ])
+        else:
+            apply_attendance_changes([
+                (*new_key, old_status, attendance.status)
+            ])
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        apply_attendance_changes([
+            (instance.student_id, instance.course_id, instance.date, instance.status, None)
+        ])
     
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
@@ -47,45 +85,14 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             except Course.DoesNotExist:
                 return Response({"detail": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
             
-            if request.user.role == User.Role.FACULTY and request.user.faculty_profile != course.faculty:
+            if request.user.role == 'faculty' and not faculty_teaches(request.user.faculty_profile.id, course.id):
                 return Response(
                     {"detail": "You are not authorized to mark attendance for this course."},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            created_records = []
-            errors = []
-            
-            for record in attendance_data:
-                try:
-                    student = Student.objects.get(id=record['student_id'])
-                    if not student.courses.filter(id=course.id).exists():
-                        errors.append({
-                            "student_id": record['student_id'],
-                            "error": "Student is not enrolled in this course."
-                        })
-                        continue
-                    
-                    attendance, created = AttendanceRecord.objects.update_or_create(
-                        student=student,
-                        course=course,
-                        date=date,
-                        defaults={
-                            'status': record['status'],
-                            'remarks': record.get('remarks', ''),
-                            'marked_by': request.user.faculty_profile if request.user.role == User.Role.FACULTY else None
-                        }
-                    )
-                    
-                    created_records.append(attendance)
-                    
-                except Student.DoesNotExist:
-                    errors.append({
-                        "student_id": record['student_id'],
-                        "error": "Student not found."
-                    })
-            
-            self._update_attendance_percentages(course)
+            marked_by = request.user.faculty_profile if request.user.role == 'faculty' else None
+            created_records, errors = bulk_upsert_attendance(course, date, attendance_data, marked_by)
             
             return Response({
                 "created_count": len(created_records),
@@ -94,9 +101,9 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_attendance(self, request):
-        if request.user.role != User.Role.STUDENT:
+        if request.user.role != 'student':
             return Response(
                 {"detail": "Only students can access their attendance."},
                 status=status.HTTP_403_FORBIDDEN
@@ -107,11 +114,11 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         if course_id:
             try:
                 course = Course.objects.get(id=course_id)
-                attendance = AttendanceRecord.objects.filter(student=student, course=course)
+                attendance = self.get_queryset().filter(student=student, course=course)
             except Course.DoesNotExist:
                 return Response({"detail": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
         else:
-            attendance = AttendanceRecord.objects.filter(student=student)
+            attendance = self.get_queryset().filter(student=student)
         
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
@@ -121,12 +128,13 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         if end_date:
             attendance = attendance.filter(date__lte=end_date)
         
-        serializer = self.get_serializer(attendance, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(attendance.order_by('-date', '-id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def course_attendance(self, request):
-        if request.user.role not in [User.Role.FACULTY, User.Role.ADMIN]:
+        if request.user.role not in ['faculty', 'admin']:
             return Response(
                 {"detail": "Only faculty and admin can access course attendance."},
                 status=status.HTTP_403_FORBIDDEN
@@ -136,9 +144,16 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         if not course_id:
             return Response({"detail": "Course ID is required."}, status=status.HTTP_400_BAD_REQUEST)
         
+        stream_format = request.query_params.get('stream')
+        if stream_format and stream_format not in STREAM_FORMATS:
+            return Response(
+                {"detail": f"Unknown stream format, use one of: {', '.join(STREAM_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
             course = Course.objects.get(id=course_id)
-            if request.user.role == User.Role.FACULTY and request.user.faculty_profile != course.faculty:
+            if request.user.role == 'faculty' and not faculty_teaches(request.user.faculty_profile.id, course.id):
                 return Response(
                     {"detail": "You are not authorized to view attendance for this course."},
                     status=status.HTTP_403_FORBIDDEN
@@ -146,12 +161,18 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             
             date = request.query_params.get('date')
             if date:
-                attendance = AttendanceRecord.objects.filter(course=course, date=date)
+                attendance = self.get_queryset().filter(course=course, date=date)
             else:
-                attendance = AttendanceRecord.objects.filter(course=course)
+                attendance = self.get_queryset().filter(course=course)
             
-            serializer = self.get_serializer(attendance, many=True)
-            return Response(serializer.data)
+            if stream_format:
+                return streaming_response(
+                    attendance.order_by('-date', '-id'), self.get_serializer(), stream_format, f'{course.code}-attendance'
+                )
+            
+            page = self.paginate_queryset(attendance.order_by('-date', '-id'))
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
 
         except Course.DoesNotExist:
             return Response({"detail": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
@@ -166,22 +187,8 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             start_date = serializer.validated_data.get('start_date')
             end_date = serializer.validated_data.get('end_date')
             
-            query = AttendanceRecord.objects.all()
-            if course_id:
-                query = query.filter(course_id=course_id)
-            if student_id:
-                query = query.filter(student_id=student_id)
-            if start_date:
-                query = query.filter(date__gte=start_date)
-            if end_date:
-                query = query.filter(date__lte=end_date)
-            
-            stats = query.aggregate(
-                total=Count('id'),
-                present=Count(Case(When(status='present', then=1), output_field=IntegerField())),
-                absent=Count(Case(When(status='absent', then=1), output_field=IntegerField())),
-                late=Count(Case(When(status='late', then=1), output_field=IntegerField()))
-            )
+            # Read the counts off the daily counters instead of counting the records
+            stats = attendance_counts(course_id, student_id, start_date, end_date)
             
             if stats['total'] > 0:
                 stats['present_percentage'] = (stats['present'] / stats['total']) * 100
@@ -195,48 +202,33 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             return Response(stats)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-    def _update_attendance_percentages(self, course):
-        students = course.students.all()
-        for student in students:
-            total_records = AttendanceRecord.objects.filter(student=student, course=course).count()
-            if total_records > 0:
-                present_records = AttendanceRecord.objects.filter(
-                    student=student, course=course,
-                    status__in=['present', 'late']
-                ).count()
-                percentage = (present_records / total_records) * 100
-                AttendancePercentage.objects.update_or_create(
-                    student=student,
-                    course=course,
-                    defaults={'percentage': percentage}
-                )
 
 
-class AttendancePercentageViewSet(viewsets.ReadOnlyModelViewSet):
+class AttendancePercentageViewSet(FieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing attendance percentages."""
-    queryset = AttendancePercentage.objects.all()
+    queryset = AttendancePercentage.objects.select_related('student__user', 'course')
     serializer_class = AttendancePercentageSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['student', 'course']
     ordering_fields = ['percentage', 'last_updated']
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_percentages(self, request):
-        if request.user.role != User.Role.STUDENT:
+        if request.user.role != 'student':
             return Response(
                 {"detail": "Only students can access their attendance percentages."},
                 status=status.HTTP_403_FORBIDDEN
             )
         
         student = request.user.student_profile
-        percentages = AttendancePercentage.objects.filter(student=student)
-        serializer = self.get_serializer(percentages, many=True)
-        return Response(serializer.data)
+        percentages = self.get_queryset().filter(student=student)
+        page = self.paginate_queryset(percentages.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def course_percentages(self, request):
-        if request.user.role not in [User.Role.FACULTY, User.Role.ADMIN]:
+        if request.user.role not in ['faculty', 'admin']:
             return Response(
                 {"detail": "Only faculty and admin can access course attendance percentages."},
                 status=status.HTTP_403_FORBIDDEN
@@ -248,15 +240,16 @@ class AttendancePercentageViewSet(viewsets.ReadOnlyModelViewSet):
         
         try:
             course = Course.objects.get(id=course_id)
-            if request.user.role == User.Role.FACULTY and request.user.faculty_profile != course.faculty:
+            if request.user.role == 'faculty' and not faculty_teaches(request.user.faculty_profile.id, course.id):
                 return Response(
                     {"detail": "You are not authorized to view attendance for this course."},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            percentages = AttendancePercentage.objects.filter(course=course)
-            serializer = self.get_serializer(percentages, many=True)
-            return Response(serializer.data)
+            percentages = self.get_queryset().filter(course=course)
+            page = self.paginate_queryset(percentages.order_by('id'))
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
 
         except Course.DoesNotExist:
             return Response({"detail": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
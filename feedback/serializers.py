@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import Feedback, FeedbackReply, FeedbackQuestion, QuestionResponse
-from academics.serializers import CourseSerializer
-from users.serializers import StudentSerializer, FacultySerializer
+from academics.serializers import CourseSummarySerializer
+from users.serializers import StudentSummarySerializer, FacultySummarySerializer
 
 class QuestionResponseSerializer(serializers.ModelSerializer):
     question_text = serializers.CharField(source='question.question', read_only=True)
@@ -22,9 +22,9 @@ class FeedbackReplySerializer(serializers.ModelSerializer):
         read_only_fields = ['timestamp', 'sentiment']
 
 class FeedbackSerializer(serializers.ModelSerializer):
-    student_details = StudentSerializer(source='student', read_only=True)
-    course_details = CourseSerializer(source='course', read_only=True)
-    faculty_details = FacultySerializer(source='faculty', read_only=True)
+    student_details = StudentSummarySerializer(source='student', read_only=True)
+    course_details = CourseSummarySerializer(source='course', read_only=True)
+    faculty_details = FacultySummarySerializer(source='faculty', read_only=True)
     replies = FeedbackReplySerializer(many=True, read_only=True)
     question_responses = QuestionResponseSerializer(many=True, read_only=True)
     
@@ -8,10 +8,15 @@ from .serializers import (
     FeedbackReplyCreateSerializer, FeedbackQuestionSerializer, QuestionResponseSerializer
 )
 from users.permissions import IsAdminUser, IsFacultyUser, IsStudentUser
+from nexalink.fieldsets import FieldsetMixin
+from nexalink.encoders import EncodedListMixin
+from nexalink.pagination import KeysetPagination
 
-class FeedbackViewSet(viewsets.ModelViewSet):
+class FeedbackViewSet(FieldsetMixin, EncodedListMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing feedback."""
-    queryset = Feedback.objects.all()
+    queryset = Feedback.objects.select_related('student__user', 'course', 'faculty__user').prefetch_related(
+        'replies', 'question_responses__question'
+    )
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['student', 'course', 'faculty', 'status', 'sentiment']
     search_fields = ['subject', 'content', 'keywords']
@@ -41,7 +46,7 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         else:
             serializer.save()
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_feedback(self, request):
         """Get feedback submitted by the current student."""
         if request.user.role != 'student':
@@ -51,7 +56,7 @@ class FeedbackViewSet(viewsets.ModelViewSet):
             )
         
         student = request.user.student_profile
-        feedback = Feedback.objects.filter(student=student)
+        feedback = self.get_queryset().filter(student=student)
         
         # Filter by course if provided
         course_id = request.query_params.get('course_id')
@@ -63,10 +68,12 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         if status_param:
             feedback = feedback.filter(status=status_param)
         
-        serializer = self.get_serializer(feedback, many=True)
-        return Response(serializer.data)
+        # Newest first: ids follow the submission time and are covered by the primary key index
+        page = self.paginate_queryset(feedback.order_by('-id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def received_feedback(self, request):
         """Get feedback received by the current faculty."""
         if request.user.role != 'faculty':
@@ -76,7 +83,7 @@ class FeedbackViewSet(viewsets.ModelViewSet):
             )
         
         faculty = request.user.faculty_profile
-        feedback = Feedback.objects.filter(faculty=faculty)
+        feedback = self.get_queryset().filter(faculty=faculty)
         
         # Filter by course if provided
         course_id = request.query_params.get('course_id')
@@ -88,10 +95,11 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         if status_param:
             feedback = feedback.filter(status=status_param)
         
-        serializer = self.get_serializer(feedback, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(feedback.order_by('-id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class FeedbackReplyViewSet(viewsets.ModelViewSet):
+class FeedbackReplyViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing feedback replies."""
     queryset = FeedbackReply.objects.all()
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -131,7 +139,7 @@ class FeedbackReplyViewSet(viewsets.ModelViewSet):
         
         serializer.save(author_type=author_type, author_id=author_id)
 
-class FeedbackQuestionViewSet(viewsets.ModelViewSet):
+class FeedbackQuestionViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing feedback questions."""
     queryset = FeedbackQuestion.objects.all()
     serializer_class = FeedbackQuestionSerializer
@@ -149,7 +157,7 @@ class FeedbackQuestionViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def course_questions(self, request):
         """Get feedback questions for a specific course."""
         course_id = request.query_params.get('course_id')
@@ -159,13 +167,14 @@ class FeedbackQuestionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        questions = FeedbackQuestion.objects.filter(course_id=course_id, is_active=True)
-        serializer = self.get_serializer(questions, many=True)
-        return Response(serializer.data)
+        questions = self.get_queryset().filter(course_id=course_id, is_active=True)
+        page = self.paginate_queryset(questions.order_by('order'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class QuestionResponseViewSet(viewsets.ModelViewSet):
+class QuestionResponseViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing question responses."""
-    queryset = QuestionResponse.objects.all()
+    queryset = QuestionResponse.objects.select_related('question')
     serializer_class = QuestionResponseSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['feedback', 'question']
@@ -0,0 +1,99 @@
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from academics.models import Department, Course, Enrollment
+from ia_marks.models import IAComponent, IAMark, IATotal
+from ia_marks.services import update_ia_totals
+from users.models import User, Student
+
+class Rollback(Exception):
+    pass
+
+def legacy_update_ia_totals(course):
+    """The per-student loop that ``update_ia_totals`` replaced, kept as the baseline."""
+    students = course.students.all()
+    components = IAComponent.objects.filter(course=course)
+    total_weightage = components.aggregate(total=Sum('weightage'))['total'] or 0
+    
+    for student in students:
+        marks = IAMark.objects.filter(student=student, component__course=course)
+        
+        if marks.exists():
+            weighted_total = 0
+            for mark in marks:
+                weighted_total += (mark.marks / mark.component.max_marks) * mark.component.weightage
+            
+            percentage = (weighted_total / total_weightage) * 100 if total_weightage > 0 else 0
+            
+            IATotal.objects.update_or_create(
+                student=student,
+                course=course,
+                defaults={
+                    'total_marks': weighted_total,
+                    'out_of': total_weightage,
+                    'percentage': percentage
+                }
+            )
+
+class Command(BaseCommand):
+    help = 'Time the IA total recompute of a synthetic course, before and after vectorization.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500)
+        parser.add_argument('--components', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=3)
+    
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                course = self._create_course(options['students'], options['components'])
+                
+                for name, recompute in (('before', legacy_update_ia_totals), ('after', update_ia_totals)):
+                    timings = []
+                    for _ in range(options['repeat']):
+                        IATotal.objects.filter(course=course).delete()
+                        start = time.perf_counter()
+                        recompute(course)
+                        timings.append(time.perf_counter() - start)
+                    self.stdout.write(
+                        f"{name:>6}: best {min(timings) * 1000:9.1f} ms over {options['repeat']} runs "
+                        f"({options['students']} students x {options['components']} components)"
+                    )
+                
+                raise Rollback
+        except Rollback:
+            pass
+    
+    def _create_course(self, student_count, component_count):
+        tag = f'BENCH{random.randint(0, 99999):05d}'
+        department = Department.objects.create(name='Benchmark', code=tag[:10])
+        course = Course.objects.create(
+            code=tag[:10], name='IA benchmark', department=department, credits=4, semester=1
+        )
+        
+        users = User.objects.bulk_create([
+            User(email=f'{tag.lower()}-{i}@bench.invalid', first_name='Bench', last_name=str(i))
+            for i in range(student_count)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=user, enrollment_number=f'{tag}{i:05d}', batch='2025', department='Benchmark', semester=1)
+            for i, user in enumerate(users)
+        ])
+        Enrollment.objects.bulk_create([Enrollment(student=student, course=course) for student in students])
+        
+        components = IAComponent.objects.bulk_create([
+            IAComponent(course=course, name=f'Component {i}', max_marks=Decimal('50'),
+                        weightage=Decimal('12.50'), order=i)
+            for i in range(component_count)
+        ])
+        IAMark.objects.bulk_create([
+            IAMark(student=student, component=component, marks=Decimal(random.randint(0, 5000)) / 100)
+            for student in students
+            for component in components
+        ])
+        
+        return course
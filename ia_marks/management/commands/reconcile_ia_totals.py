@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from academics.models import Course
+from ia_marks.services import reconcile_ia_totals
+
+class Command(BaseCommand):
+    help = 'Verify the cached IA totals of every course against a full recompute and optionally repair them.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='course_ids',
+            help='Only check this course (can be given several times).'
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Recompute the courses that drifted and delete orphaned totals.'
+        )
+    
+    def handle(self, *args, **options):
+        courses = Course.objects.filter(ia_components__isnull=False).distinct().order_by('id')
+        if options['course_ids']:
+            courses = courses.filter(id__in=options['course_ids'])
+        
+        drifted = 0
+        for course in courses.iterator():
+            result = reconcile_ia_totals(course, fix=options['fix'])
+            if any(result.values()):
+                drifted += 1
+                self.stdout.write(
+                    f"{course.code}: {result['missing']} missing, {result['stale']} stale, "
+                    f"{result['orphaned']} orphaned" + (" (repaired)" if options['fix'] else "")
+                )
+        
+        if drifted:
+            message = f'{drifted} course(s) had drifted IA totals.'
+            self.stdout.write(self.style.SUCCESS(message) if options['fix'] else self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('All IA totals are consistent.'))
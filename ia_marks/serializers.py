@@ -1,40 +1,43 @@
 from rest_framework import serializers
 from .models import IAComponent, IAMark, IATotal
-from academics.serializers import CourseSerializer
-from users.serializers import StudentSerializer, FacultySerializer
+from academics.models import Course
+from academics.serializers import CourseSummarySerializer
+from users.serializers import StudentSummarySerializer, FacultySummarySerializer
 
 class IAComponentSerializer(serializers.ModelSerializer):
     class Meta:
         model = IAComponent
         fields = ['id', 'course', 'name', 'description', 'max_marks', 'weightage', 'order']
 
+class IAMarkCourseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Course
+        fields = ['id', 'code', 'name']
+
+class IAMarkComponentSerializer(serializers.ModelSerializer):
+    # Numbers rather than strings, as these details have always been rendered
+    max_marks = serializers.DecimalField(max_digits=5, decimal_places=2, coerce_to_string=False)
+    weightage = serializers.DecimalField(max_digits=5, decimal_places=2, coerce_to_string=False)
+    course = IAMarkCourseSerializer()
+    
+    class Meta:
+        model = IAComponent
+        fields = ['id', 'name', 'max_marks', 'weightage', 'course']
+
 class IAMarkSerializer(serializers.ModelSerializer):
-    student_details = StudentSerializer(source='student', read_only=True)
-    component_details = serializers.SerializerMethodField()
-    marked_by_details = FacultySerializer(source='marked_by', read_only=True)
+    student_details = StudentSummarySerializer(source='student', read_only=True)
+    component_details = IAMarkComponentSerializer(source='component', read_only=True)
+    marked_by_details = FacultySummarySerializer(source='marked_by', read_only=True)
     
     class Meta:
         model = IAMark
         fields = ['id', 'student', 'student_details', 'component', 'component_details', 
                   'marks', 'remarks', 'marked_by', 'marked_by_details', 'marked_at']
         read_only_fields = ['marked_at']
-    
-    def get_component_details(self, obj):
-        return {
-            'id': obj.component.id,
-            'name': obj.component.name,
-            'max_marks': obj.component.max_marks,
-            'weightage': obj.component.weightage,
-            'course': {
-                'id': obj.component.course.id,
-                'code': obj.component.course.code,
-                'name': obj.component.course.name
-            }
-        }
 
 class IATotalSerializer(serializers.ModelSerializer):
-    student_details = StudentSerializer(source='student', read_only=True)
-    course_details = CourseSerializer(source='course', read_only=True)
+    student_details = StudentSummarySerializer(source='student', read_only=True)
+    course_details = CourseSummarySerializer(source='course', read_only=True)
     
     class Meta:
         model = IATotal
@@ -0,0 +1,204 @@
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+from django.db import transaction
+from .models import IAComponent, IAMark, IATotal
+from academics.cache import get_course_student_ids, is_student_enrolled
+
+TWO_PLACES = Decimal('0.01')
+
+def _to_decimal(value):
+    # Snap away float noise first so exact half-cent ties round half up, as
+    # Postgres numeric columns do for the unrounded values the old loop stored
+    return Decimal(f'{value:.6f}').quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+def compute_ia_totals(course):
+    """
+    Compute the weighted IA totals of a whole class at once.
+
+    The marks of the course are loaded as one students x components matrix
+    (missing marks are NaN) and every component is scaled by
+    ``weightage / max_marks``, so the weighted totals and percentages of all
+    students come out of a couple of vectorized operations. This takes at most
+    three queries whatever the class size.
+
+    Returns ``(student_ids, weighted_totals, total_weightage, percentages)``
+    for the enrolled students that have at least one mark.
+    """
+    components = list(
+        IAComponent.objects.filter(course=course).values_list('id', 'max_marks', 'weightage')
+    )
+    student_ids = np.array(
+        sorted(get_course_student_ids(course.id)),
+        dtype=np.int64
+    )
+    marks = list(
+        IAMark.objects.filter(component__course=course).values_list('student_id', 'component_id', 'marks')
+    )
+
+    empty = np.empty(0)
+    if not components or not len(student_ids) or not marks:
+        return student_ids[:0], empty, Decimal('0'), empty
+
+    component_ids = np.array([component[0] for component in components], dtype=np.int64)
+    max_marks = np.array([float(component[1]) for component in components])
+    weightage = np.array([float(component[2]) for component in components])
+    total_weightage = sum((component[2] for component in components), Decimal('0'))
+
+    # Place every mark in the matrix, dropping students that are not enrolled
+    mark_students = np.array([mark[0] for mark in marks], dtype=np.int64)
+    mark_components = np.array([mark[1] for mark in marks], dtype=np.int64)
+    mark_values = np.array([float(mark[2]) for mark in marks])
+
+    rows = np.searchsorted(student_ids, mark_students)
+    rows = np.minimum(rows, len(student_ids) - 1)
+    enrolled = student_ids[rows] == mark_students
+    component_order = np.argsort(component_ids)
+    columns = component_order[np.searchsorted(component_ids[component_order], mark_components)]
+
+    matrix = np.full((len(student_ids), len(component_ids)), np.nan)
+    matrix[rows[enrolled], columns[enrolled]] = mark_values[enrolled]
+
+    scale = np.divide(weightage, max_marks, out=np.zeros_like(weightage), where=max_marks > 0)
+    has_marks = ~np.isnan(matrix).all(axis=1)
+    weighted_totals = np.nansum(matrix * scale, axis=1)[has_marks]
+
+    if total_weightage > 0:
+        percentages = weighted_totals / float(total_weightage) * 100
+    else:
+        percentages = np.zeros_like(weighted_totals)
+
+    return student_ids[has_marks], weighted_totals, total_weightage, percentages
+
+def update_ia_totals(course):
+    """
+    Recompute and store the IA totals of every student in a course.
+
+    The totals come from :func:`compute_ia_totals` and are written back with a
+    single upsert on the ``(student, course)`` unique key.
+    """
+    student_ids, weighted_totals, total_weightage, percentages = compute_ia_totals(course)
+
+    totals = [
+        IATotal(
+            student_id=int(student_id),
+            course=course,
+            total_marks=_to_decimal(weighted_total),
+            out_of=total_weightage,
+            percentage=_to_decimal(percentage)
+        )
+        for student_id, weighted_total, percentage in zip(student_ids, weighted_totals, percentages)
+    ]
+
+    if totals:
+        with transaction.atomic():
+            IATotal.objects.bulk_create(
+                totals,
+                update_conflicts=True,
+                unique_fields=['student', 'course'],
+                update_fields=['total_marks', 'out_of', 'percentage', 'last_updated']
+            )
+
+    return len(totals)
+
+def _contribution(marks, component):
+    """Weighted contribution of one mark to the IA total."""
+    if marks is None or not component.max_marks:
+        return Decimal('0')
+    return Decimal(marks) / component.max_marks * component.weightage
+
+def update_student_ia_total(student_id, course_id):
+    """
+    Recompute one student's IA total from all of their marks in the course.
+    
+    The percentage is derived from the exact weighted total, and both are only
+    rounded when stored. A student without marks left has no total, like in
+    :func:`compute_ia_totals`.
+    """
+    marks = list(IAMark.objects.filter(
+        student_id=student_id, component__course_id=course_id
+    ).select_related('component'))
+    if not marks:
+        IATotal.objects.filter(student_id=student_id, course_id=course_id).delete()
+        return
+    
+    total_weightage = sum(
+        IAComponent.objects.filter(course_id=course_id).values_list('weightage', flat=True),
+        Decimal('0')
+    )
+    
+    weighted_total = sum((_contribution(mark.marks, mark.component) for mark in marks), Decimal('0'))
+    percentage = weighted_total / total_weightage * 100 if total_weightage > 0 else Decimal('0')
+    
+    IATotal.objects.update_or_create(
+        student_id=student_id,
+        course_id=course_id,
+        defaults={
+            'total_marks': weighted_total.quantize(TWO_PLACES, rounding=ROUND_HALF_UP),
+            'out_of': total_weightage,
+            'percentage': percentage.quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+        }
+    )
+
+def apply_ia_mark_change(student_id, course_id):
+    """
+    Update one student's cached IA total after one of their marks in the
+    course was created, changed or deleted.
+    
+    Called once the mark is written. Only that student's marks in the course
+    are read, so the rest of the class is not touched, and the total is
+    recomputed from them rather than adjusted by a rounded difference, so
+    rounding errors do not build up over edits. The cached row is locked first:
+    concurrent changes for the same student are applied one after the other,
+    each reading the marks committed before it. Students that are not enrolled
+    in the course are skipped like in :func:`compute_ia_totals`.
+    """
+    if not is_student_enrolled(student_id, course_id):
+        return
+    
+    with transaction.atomic():
+        list(IATotal.objects.select_for_update().filter(
+            student_id=student_id, course_id=course_id
+        ).values_list('id', flat=True))
+        update_student_ia_total(student_id, course_id)
+
+def reconcile_ia_totals(course, fix=False, tolerance=TWO_PLACES):
+    """
+    Compare the cached IA totals of a course with a full recompute.
+
+    Returns a dict with the number of ``missing`` rows, ``stale`` rows (total,
+    out_of or percentage off by more than ``tolerance``) and ``orphaned`` rows
+    (students that are no longer enrolled or have no marks). With ``fix`` the
+    course is recomputed and the orphaned rows are deleted.
+    """
+    student_ids, weighted_totals, total_weightage, percentages = compute_ia_totals(course)
+    expected = {
+        int(student_id): (_to_decimal(weighted_total), total_weightage, _to_decimal(percentage))
+        for student_id, weighted_total, percentage in zip(student_ids, weighted_totals, percentages)
+    }
+    stored = {
+        row[0]: row[1:]
+        for row in IATotal.objects.filter(course=course).values_list(
+            'student_id', 'total_marks', 'out_of', 'percentage'
+        )
+    }
+    
+    missing = [student_id for student_id in expected if student_id not in stored]
+    orphaned = [student_id for student_id in stored if student_id not in expected]
+    stale = [
+        student_id for student_id, values in expected.items()
+        if student_id in stored and any(
+            abs(value - stored_value) > tolerance
+            for value, stored_value in zip(values, stored[student_id])
+        )
+    ]
+    
+    if fix and (missing or stale or orphaned):
+        with transaction.atomic():
+            update_ia_totals(course)
+            IATotal.objects.filter(course=course, student_id__in=orphaned).delete()
+    
+    return {
+        'missing': len(missing),
+        'stale': len(stale),
+        'orphaned': len(orphaned)
+    }
@@ -0,0 +1,15 @@
+from celery import shared_task
+from academics.models import Course
+from nexalink.recompute import recompute_running
+from .services import update_ia_totals
+
+@shared_task
+def recompute_ia_totals(course_id):
+    """Recompute the cached IA totals of a course."""
+    with recompute_running(recompute_ia_totals, course_id):
+        try:
+            course = Course.objects.get(id=course_id)
+        except Course.DoesNotExist:
+            return
+        
+        update_ia_totals(course)
@@ -1,4 +1,5 @@
-from django.db.models import Sum, F, ExpressionWrapper, DecimalField
+from django.db import transaction
+from django.db.models import F, ExpressionWrapper, DecimalField
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -7,11 +8,19 @@ from .models import IAComponent, IAMark, IATotal
 from .serializers import (
     IAComponentSerializer, IAMarkSerializer, IATotalSerializer, BulkIAMarkSerializer
 )
+from .services import apply_ia_mark_change
+from .tasks import recompute_ia_totals
 from academics.models import Course
+from academics.cache import get_course_student_ids, faculty_teaches
 from users.models import Student
 from users.permissions import IsAdminUser, IsFacultyUser, IsStudentUser
+from nexalink.recompute import schedule_recompute, is_recompute_pending
+from nexalink.fieldsets import FieldsetMixin
+from nexalink.encoders import EncodedListMixin
+from nexalink.pagination import KeysetPagination
+from nexalink.streaming import STREAM_FORMATS, streaming_response
 
-class IAComponentViewSet(viewsets.ModelViewSet):
+class IAComponentViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing IA components."""
     queryset = IAComponent.objects.all()
     serializer_class = IAComponentSerializer
@@ -29,7 +38,25 @@ class IAComponentViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
     
-    @action(detail=False, methods=['get'])
+    # Changing the components changes every student's total, so the whole
+    # course is recomputed in the background
+    def perform_create(self, serializer):
+        component = serializer.save()
+        schedule_recompute(recompute_ia_totals, component.course_id)
+    
+    def perform_update(self, serializer):
+        old_course_id = serializer.instance.course_id
+        component = serializer.save()
+        schedule_recompute(recompute_ia_totals, component.course_id)
+        if old_course_id != component.course_id:
+            schedule_recompute(recompute_ia_totals, old_course_id)
+    
+    def perform_destroy(self, instance):
+        course_id = instance.course_id
+        instance.delete()
+        schedule_recompute(recompute_ia_totals, course_id)
+    
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def course_components(self, request):
         """Get IA components for a specific course."""
         course_id = request.query_params.get('course_id')
@@ -39,13 +66,14 @@ class IAComponentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        components = IAComponent.objects.filter(course_id=course_id).order_by('order')
-        serializer = self.get_serializer(components, many=True)
-        return Response(serializer.data)
+        components = self.get_queryset().filter(course_id=course_id).order_by('order')
+        page = self.paginate_queryset(components)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class IAMarkViewSet(viewsets.ModelViewSet):
+class IAMarkViewSet(FieldsetMixin, EncodedListMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing IA marks."""
-    queryset = IAMark.objects.all()
+    queryset = IAMark.objects.select_related('student__user', 'component__course', 'marked_by__user')
     serializer_class = IAMarkSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['student', 'component', 'component__course']
@@ -61,12 +89,35 @@ class IAMarkViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
     
+    @transaction.atomic
     def perform_create(self, serializer):
         """Set the marked_by field to the current faculty user."""
         if self.request.user.role == 'faculty':
-            serializer.save(marked_by=self.request.user.faculty_profile)
+            ia_mark = serializer.save(marked_by=self.request.user.faculty_profile)
         else:
-            serializer.save()
+            ia_mark = serializer.save()
+        
+        apply_ia_mark_change(ia_mark.student_id, ia_mark.component.course_id)
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """Update the IA total of the student whose mark changed."""
+        instance = serializer.instance
+        old_key = (instance.student_id, instance.component.course_id)
+        ia_mark = serializer.save()
+        new_key = (ia_mark.student_id, ia_mark.component.course_id)
+        
+        # Moving a mark to another student or course changes both totals
+        if old_key != new_key:
+            apply_ia_mark_change(*old_key)
+        apply_ia_mark_change(*new_key)
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Remove this mark from the student's IA total."""
+        student_id, course_id = instance.student_id, instance.component.course_id
+        instance.delete()
+        apply_ia_mark_change(student_id, course_id)
     
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
@@ -87,7 +138,7 @@ class IAMarkViewSet(viewsets.ModelViewSet):
             
             # Check if the user is the faculty assigned to this course or an admin
             if request.user.role == 'faculty':
-                if request.user.faculty_profile != component.course.faculty:
+                if not faculty_teaches(request.user.faculty_profile.id, component.course_id):
                     return Response(
                         {"detail": "You are not authorized to mark IA for this course."},
                         status=status.HTTP_403_FORBIDDEN
@@ -97,12 +148,23 @@ class IAMarkViewSet(viewsets.ModelViewSet):
             created_marks = []
             errors = []
             
+            enrolled_ids = get_course_student_ids(component.course_id)
+            
             for record in marks_data:
                 try:
-                    student = Student.objects.get(id=record['student_id'])
-                    
+                    student_id = int(record['student_id'])
+                except (TypeError, ValueError):
+                    errors.append({
+                        "student_id": record['student_id'],
+                        "error": "Invalid student ID."
+                    })
+                    continue
+                
+                try:
                     # Check if student is enrolled in the course
-                    if not student.courses.filter(id=component.course.id).exists():
+                    if student_id not in enrolled_ids:
+                        if not Student.objects.filter(id=student_id).exists():
+                            raise Student.DoesNotExist
                         errors.append({
                             "student_id": record['student_id'],
                             "error": "Student is not enrolled in this course."
@@ -110,7 +172,14 @@ class IAMarkViewSet(viewsets.ModelViewSet):
                         continue
                     
                     # Validate marks
-                    marks = float(record['marks'])
+                    try:
+                        marks = float(record['marks'])
+                    except (TypeError, ValueError):
+                        errors.append({
+                            "student_id": record['student_id'],
+                            "error": "Marks must be a number."
+                        })
+                        continue
                     if marks < 0 or marks > float(component.max_marks):
                         errors.append({
                             "student_id": record['student_id'],
@@ -120,7 +189,7 @@ class IAMarkViewSet(viewsets.ModelViewSet):
                     
                     # Create or update IA mark
                     ia_mark, created = IAMark.objects.update_or_create(
-                        student=student,
+                        student_id=student_id,
                         component=component,
                         defaults={
                             'marks': marks,
@@ -137,17 +206,18 @@ class IAMarkViewSet(viewsets.ModelViewSet):
                         "error": "Student not found."
                     })
             
-            # Update IA totals
-            self._update_ia_totals(component.course)
+            # Update IA totals in the background, once per burst of uploads
+            schedule_recompute(recompute_ia_totals, component.course_id)
             
             return Response({
                 "created_count": len(created_marks),
-                "errors": errors
+                "errors": errors,
+                "recompute_pending": is_recompute_pending(recompute_ia_totals, component.course_id)
             })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_marks(self, request):
         """Get IA marks for the current student."""
         if request.user.role != 'student':
@@ -161,14 +231,15 @@ class IAMarkViewSet(viewsets.ModelViewSet):
         # Filter by course if provided
         course_id = request.query_params.get('course_id')
         if course_id:
-            marks = IAMark.objects.filter(student=student, component__course_id=course_id)
+            marks = self.get_queryset().filter(student=student, component__course_id=course_id)
         else:
-            marks = IAMark.objects.filter(student=student)
+            marks = self.get_queryset().filter(student=student)
         
-        serializer = self.get_serializer(marks, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(marks.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def course_marks(self, request):
         """Get IA marks for a specific course."""
         if request.user.role not in ['faculty', 'admin']:
@@ -184,11 +255,18 @@ class IAMarkViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        stream_format = request.query_params.get('stream')
+        if stream_format and stream_format not in STREAM_FORMATS:
+            return Response(
+                {"detail": f"Unknown stream format, use one of: {', '.join(STREAM_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
             course = Course.objects.get(id=course_id)
             
             # Check if the user is the faculty assigned to this course or an admin
-            if request.user.role == 'faculty' and request.user.faculty_profile != course.faculty:
+            if request.user.role == 'faculty' and not faculty_teaches(request.user.faculty_profile.id, course.id):
                 return Response(
                     {"detail": "You are not authorized to view IA marks for this course."},
                     status=status.HTTP_403_FORBIDDEN
@@ -197,58 +275,32 @@ class IAMarkViewSet(viewsets.ModelViewSet):
             # Filter by component if provided
             component_id = request.query_params.get('component_id')
             if component_id:
-                marks = IAMark.objects.filter(component__course=course, component_id=component_id)
+                marks = self.get_queryset().filter(component__course=course, component_id=component_id)
             else:
-                marks = IAMark.objects.filter(component__course=course)
+                marks = self.get_queryset().filter(component__course=course)
             
-            serializer = self.get_serializer(marks, many=True)
-            return Response(serializer.data)
+            if stream_format:
+                return streaming_response(marks.order_by('id'), self.get_serializer(), stream_format, f'{course.code}-ia-marks')
+            
+            page = self.paginate_queryset(marks.order_by('id'))
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
             
         except Course.DoesNotExist:
             return Response(
                 {"detail": "Course not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
-    
-    def _update_ia_totals(self, course):
-        """Update IA totals for all students in a course."""
-        students = course.students.all()
-        components = IAComponent.objects.filter(course=course)
-        total_weightage = components.aggregate(total=Sum('weightage'))['total'] or 0
-        
-        for student in students:
-            # Get all marks for this student in this course
-            marks = IAMark.objects.filter(student=student, component__course=course)
-            
-            if marks.exists():
-                # Calculate weighted total
-                weighted_total = 0
-                for mark in marks:
-                    weighted_total += (mark.marks / mark.component.max_marks) * mark.component.weightage
-                
-                # Calculate percentage
-                percentage = (weighted_total / total_weightage) * 100 if total_weightage > 0 else 0
-                
-                # Update or create IA total
-                IATotal.objects.update_or_create(
-                    student=student,
-                    course=course,
-                    defaults={
-                        'total_marks': weighted_total,
-                        'out_of': total_weightage,
-                        'percentage': percentage
-                    }
-                )
 
-class IATotalViewSet(viewsets.ReadOnlyModelViewSet):
+class IATotalViewSet(FieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing IA totals."""
-    queryset = IATotal.objects.all()
+    queryset = IATotal.objects.select_related('student__user', 'course')
     serializer_class = IATotalSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['student', 'course']
     ordering_fields = ['percentage', 'last_updated']
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_totals(self, request):
         """Get IA totals for the current student."""
         if request.user.role != 'student':
@@ -262,14 +314,38 @@ class IATotalViewSet(viewsets.ReadOnlyModelViewSet):
         # Filter by course if provided
         course_id = request.query_params.get('course_id')
         if course_id:
-            totals = IATotal.objects.filter(student=student, course_id=course_id)
+            totals = self.get_queryset().filter(student=student, course_id=course_id)
         else:
-            totals = IATotal.objects.filter(student=student)
+            totals = self.get_queryset().filter(student=student)
         
-        serializer = self.get_serializer(totals, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(totals.order_by('id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    def recompute_status(self, request):
+        """Report whether the IA totals of a course are still being recomputed."""
+        course_id = request.query_params.get('course_id')
+        if not course_id:
+            return Response(
+                {"detail": "Course ID is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            course_id = int(course_id)
+        except ValueError:
+            return Response(
+                {"detail": "Invalid course ID."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            "course_id": course_id,
+            "recompute_pending": is_recompute_pending(recompute_ia_totals, course_id)
+        })
+    
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def course_totals(self, request):
         """Get IA totals for a specific course."""
         if request.user.role not in ['faculty', 'admin']:
@@ -285,19 +361,30 @@ class IATotalViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        stream_format = request.query_params.get('stream')
+        if stream_format and stream_format not in STREAM_FORMATS:
+            return Response(
+                {"detail": f"Unknown stream format, use one of: {', '.join(STREAM_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
             course = Course.objects.get(id=course_id)
             
             # Check if the user is the faculty assigned to this course or an admin
-            if request.user.role == 'faculty' and request.user.faculty_profile != course.faculty:
+            if request.user.role == 'faculty' and not faculty_teaches(request.user.faculty_profile.id, course.id):
                 return Response(
                     {"detail": "You are not authorized to view IA totals for this course."},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            totals = IATotal.objects.filter(course=course)
-            serializer = self.get_serializer(totals, many=True)
-            return Response(serializer.data)
+            totals = self.get_queryset().filter(course=course)
+            if stream_format:
+                return streaming_response(totals.order_by('id'), self.get_serializer(), stream_format, f'{course.code}-ia-totals')
+            
+            page = self.paginate_queryset(totals.order_by('id'))
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
             
         except Course.DoesNotExist:
             return Response(
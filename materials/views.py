@@ -5,10 +5,14 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Material, MaterialVersion
 from .serializers import MaterialSerializer, MaterialVersionSerializer
 from users.permissions import IsAdminUser, IsFacultyUser, IsStudentUser
+from nexalink.fieldsets import FieldsetMixin
+from nexalink.pagination import KeysetPagination
 
-class MaterialViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing study materials."""
-    queryset = Material.objects.all()
+    queryset = Material.objects.select_related('course', 'module', 'topic', 'uploaded_by__user').prefetch_related(
+        'module__topics', 'versions__uploaded_by__user'
+    )
     serializer_class = MaterialSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['course', 'module', 'topic', 'file_type', 'uploaded_by', 'is_active']
@@ -71,10 +75,12 @@ class MaterialViewSet(viewsets.ModelViewSet):
         
         material.save()
         
+        # Drop the prefetched versions, which miss the one just added
+        material._prefetched_objects_cache = {}
         serializer = self.get_serializer(material)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_materials(self, request):
         """Get materials for the current user based on role."""
         user = request.user
@@ -83,14 +89,14 @@ class MaterialViewSet(viewsets.ModelViewSet):
             # Get materials for courses the student is enrolled in
             student = user.student_profile
             courses = student.courses.all()
-            materials = Material.objects.filter(course__in=courses, is_active=True)
+            materials = self.get_queryset().filter(course__in=courses, is_active=True)
         elif user.role == 'faculty':
             # Get materials uploaded by the faculty
             faculty = user.faculty_profile
-            materials = Material.objects.filter(uploaded_by=faculty)
+            materials = self.get_queryset().filter(uploaded_by=faculty)
         else:
             # Admin can see all materials
-            materials = Material.objects.all()
+            materials = self.get_queryset()
         
         # Apply filters
         course_id = request.query_params.get('course_id')
@@ -109,18 +115,20 @@ class MaterialViewSet(viewsets.ModelViewSet):
         if file_type:
             materials = materials.filter(file_type=file_type)
         
-        serializer = self.get_serializer(materials, many=True)
-        return Response(serializer.data)
+        # Newest first: ids follow the upload time and are covered by the primary key index
+        page = self.paginate_queryset(materials.order_by('-id'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class MaterialVersionViewSet(viewsets.ReadOnlyModelViewSet):
+class MaterialVersionViewSet(FieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing material versions."""
-    queryset = MaterialVersion.objects.all()
+    queryset = MaterialVersion.objects.select_related('uploaded_by__user')
     serializer_class = MaterialVersionSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['material', 'version', 'uploaded_by']
     ordering_fields = ['version', 'uploaded_at']
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def material_history(self, request):
         """Get version history for a specific material."""
         material_id = request.query_params.get('material_id')
@@ -130,6 +138,7 @@ class MaterialVersionViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        versions = MaterialVersion.objects.filter(material_id=material_id)
-        serializer = self.get_serializer(versions, many=True)
-        return Response(serializer.data)
+        versions = self.get_queryset().filter(material_id=material_id)
+        page = self.paginate_queryset(versions.order_by('-version'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
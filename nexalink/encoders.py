@@ -0,0 +1,244 @@
+"""
+Compiled row encoders for hot read endpoints.
+
+``compile_encoder`` turns a (shaped) model serializer into a ``RowEncoder``:
+the columns it reads, as ``values_list`` lookups, and a getter per field
+that builds the output from a row tuple. Encoding a page then needs neither
+model instances nor serializer field resolution. Values go through the
+field's own ``to_representation`` (skipped where it returns the value
+unchanged), so the output is the same as the serializer's.
+
+Supported fields are model columns, dotted sources along non-null foreign
+keys, primary key related fields, nested serializers of forward relations,
+and nested lists of reverse foreign keys at the top level (one query per
+list per page). A source that is a method or property is supported when the
+serializer lists the columns it reads in ``Meta.encoder_sources``; it is
+then called on an object that only carries those columns. For anything else
+``compile_encoder`` returns ``None`` and the serializer is used.
+"""
+import inspect
+from collections import defaultdict
+from operator import itemgetter
+from types import FunctionType, SimpleNamespace
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# to_representation methods that return a column value of these types unchanged
+PLAIN_REPRESENTATIONS = {
+    serializers.ReadOnlyField.to_representation: None,
+    serializers.IntegerField.to_representation: {
+        'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+        'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+    },
+    serializers.CharField.to_representation: {'CharField', 'TextField', 'EmailField', 'SlugField'},
+    serializers.ChoiceField.to_representation: {'CharField', 'TextField'},
+    serializers.BooleanField.to_representation: {'BooleanField'},
+}
+
+class Unsupported(Exception):
+    """A field the encoder cannot compile."""
+
+class RowEncoder:
+    """Columns of one model and the getters that encode its rows."""
+    
+    def __init__(self, model):
+        self.model = model
+        self.columns = []
+        self.getters = []
+        # (field name, parent pk index, child encoder, child foreign key index, foreign key name)
+        self.lists = []
+    
+    def column(self, lookup):
+        """Index of ``lookup`` in the row tuples, adding it to the columns when needed."""
+        if lookup not in self.columns:
+            self.columns.append(lookup)
+        return self.columns.index(lookup)
+    
+    def values(self, queryset):
+        """The rows of ``queryset`` as tuples of the encoder's columns."""
+        return queryset.prefetch_related(None).values_list(*self.columns)
+    
+    def encode(self, rows):
+        """Encode a list of rows returned by ``values``."""
+        getters = self.getters
+        data = [{name: get(row) for name, get in getters} for row in rows]
+        for name, pk_index, child, fk_index, fk_name in self.lists:
+            parent_ids = {row[pk_index] for row in rows}
+            children = defaultdict(list)
+            if parent_ids:
+                child_rows = list(child.values(child.model._default_manager.filter(**{f'{fk_name}__in': parent_ids})))
+                for child_row, item in zip(child_rows, child.encode(child_rows)):
+                    children[child_row[fk_index]].append(item)
+            for row, item in zip(rows, data):
+                item[name] = children.get(row[pk_index], [])
+        return data
+
+def _lookup(path, name):
+    return f'{path}__{name}' if path else name
+
+def _datetime(field, index):
+    # The time zone is the one active when compiling, instead of being looked up for every value
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    to_representation = field.to_representation
+    
+    def get(row):
+        value = row[index]
+        if value is None:
+            return None
+        if field_timezone is None or not timezone.is_aware(value):
+            return to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return get
+
+def _leaf(field, model_field, index):
+    representation = type(field).to_representation
+    if representation in PLAIN_REPRESENTATIONS:
+        types = PLAIN_REPRESENTATIONS[representation]
+        if types is None or model_field.get_internal_type() in types:
+            return itemgetter(index)
+    iso_8601 = str(getattr(field, 'format', api_settings.DATETIME_FORMAT)).lower() == ISO_8601
+    if (representation is serializers.DateTimeField.to_representation and iso_8601
+            and type(field).enforce_timezone is serializers.DateTimeField.enforce_timezone):
+        return _datetime(field, index)
+    
+    to_representation = field.to_representation
+    
+    def get(row):
+        value = row[index]
+        return None if value is None else to_representation(value)
+    return get
+
+def _method(encoder, serializer, field, owner, path, attr):
+    names = getattr(getattr(serializer, 'Meta', None), 'encoder_sources', {}).get(field.field_name)
+    member = inspect.getattr_static(owner, attr, None)
+    function = member.fget if isinstance(member, property) else member
+    if names is None or not isinstance(function, FunctionType):
+        raise Unsupported(field.field_name)
+    
+    columns = [(name, encoder.column(_lookup(path, name))) for name in names]
+    to_representation = field.to_representation
+    
+    def get(row):
+        value = function(SimpleNamespace(**{name: row[index] for name, index in columns}))
+        return None if value is None else to_representation(value)
+    return get
+
+def _nested(encoder, serializer, model, path):
+    getters = _compile_fields(encoder, serializer, model, path)
+    index = encoder.column(path)
+    
+    def get(row):
+        if row[index] is None:
+            return None
+        return {name: getter(row) for name, getter in getters}
+    return get
+
+def _list(encoder, field, model):
+    if len(field.source_attrs) != 1 or type(field).to_representation is not serializers.ListSerializer.to_representation:
+        raise Unsupported(field.field_name)
+    try:
+        model_field = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        raise Unsupported(field.field_name)
+    if not model_field.one_to_many:
+        raise Unsupported(field.field_name)
+    
+    child = _compile(field.child, model_field.related_model)
+    fk_name = model_field.field.name
+    encoder.lists.append((
+        field.field_name, encoder.column(model._meta.pk.name), child, child.column(fk_name), fk_name
+    ))
+    # Filled in by RowEncoder.encode
+    return lambda row: None
+
+def _compile_field(encoder, serializer, field, model, path):
+    if isinstance(field, serializers.ListSerializer):
+        if path:
+            raise Unsupported(field.field_name)
+        return _list(encoder, field, model)
+    if isinstance(field, (serializers.SerializerMethodField, serializers.FileField, serializers.ManyRelatedField)):
+        raise Unsupported(field.field_name)
+    if field.source == '*':
+        raise Unsupported(field.field_name)
+    
+    nested = field if isinstance(field, serializers.Serializer) else None
+    current = model
+    attrs = field.source_attrs
+    for index, attr in enumerate(attrs):
+        last = index == len(attrs) - 1
+        try:
+            model_field = current._meta.get_field(attr)
+        except FieldDoesNotExist:
+            if not last or nested is not None:
+                raise Unsupported(field.field_name)
+            return _method(encoder, serializer, field, current, path, attr)
+        
+        lookup = _lookup(path, attr)
+        if not model_field.concrete or model_field.many_to_many:
+            raise Unsupported(field.field_name)
+        if not model_field.is_relation:
+            if not last or nested is not None:
+                raise Unsupported(field.field_name)
+            return _leaf(field, model_field, encoder.column(lookup))
+        
+        if last:
+            if nested is not None:
+                return _nested(encoder, nested, model_field.related_model, lookup)
+            pk_only = type(field).to_representation is serializers.PrimaryKeyRelatedField.to_representation
+            if pk_only and field.pk_field is None:
+                return itemgetter(encoder.column(lookup))
+            raise Unsupported(field.field_name)
+        # A null relation halfway makes the serializer skip the field
+        if model_field.null:
+            raise Unsupported(field.field_name)
+        path, current = lookup, model_field.related_model
+
+def _compile_fields(encoder, serializer, model, path):
+    if type(serializer).to_representation is not serializers.Serializer.to_representation:
+        raise Unsupported(type(serializer).__name__)
+    return [
+        (field.field_name, _compile_field(encoder, serializer, field, model, path))
+        for field in serializer.fields.values() if not field.write_only
+    ]
+
+def _compile(serializer, model):
+    encoder = RowEncoder(model)
+    encoder.getters = _compile_fields(encoder, serializer, model, '')
+    return encoder
+
+def compile_encoder(serializer, model=None):
+    """
+    Compile the (shaped) ``serializer``, or the child of a list serializer,
+    into a ``RowEncoder`` for ``model`` (by default the serializer's).
+    Returns ``None`` when a field cannot be compiled.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    serializer_model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if serializer_model is None or (model is not None and not issubclass(model, serializer_model)):
+        return None
+    try:
+        return _compile(serializer, model or serializer_model)
+    except Unsupported:
+        return None
+
+class EncodedListMixin:
+    """
+    Viewset mixin that renders ``list`` with a compiled row encoder, for hot
+    read endpoints. Falls back to the serializer when it does not compile.
+    """
+    
+    def list(self, request, *args, **kwargs):
+        encoder = compile_encoder(self.get_serializer())
+        if encoder is None:
+            return super().list(request, *args, **kwargs)
+        
+        rows = encoder.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(encoder.encode(page))
+        return Response(encoder.encode(list(rows)))
@@ -0,0 +1,227 @@
+"""
+Sparse fieldsets and opt-in expansion for the API.
+
+``?fields=id,title,course_details.code`` limits a response to some fields;
+a dotted name selects fields of a nested object or list. ``?expand=modules``
+adds fields that a serializer only renders on request, declared in its
+``Meta.expandable_fields`` as ``{name: (serializer class, kwargs)}``; naming
+such a field in ``fields`` expands it as well. Unknown names are ignored.
+Both parameters only apply to reads.
+
+``FieldsetMixin`` shapes the serializers of a viewset and derives the
+queryset of a read from the shape: ``select_related`` for nested objects and
+dotted sources, a ``Prefetch`` with its own derived queryset for nested
+lists, and ``only()`` for the columns that are rendered. Relations and
+columns that are not rendered are never loaded. A ``SerializerMethodField``
+or a source that is not a model field (a property or method) loads every
+column of its model, since what it reads cannot be known.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+# Marks a model whose columns are all needed
+ALL_COLUMNS = None
+
+def parse_fieldset(value):
+    """
+    Parse ``"a,b.c,b.d"`` into ``{'a': {}, 'b': {'c': {}, 'd': {}}}``.
+
+    An empty dict stands for the whole field. Returns ``None`` when there
+    is no value.
+    """
+    if not value:
+        return None
+    tree = {}
+    for name in value.split(','):
+        node = tree
+        for part in name.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+def _serializer_of(field):
+    """The serializer behind a field, if it renders a nested object or list."""
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.Serializer) else None
+
+def shape_serializer(serializer, fields=None, expand=None):
+    """
+    Add the requested expansions to ``serializer`` and drop the fields that
+    were not requested, recursively. ``fields`` and ``expand`` are trees as
+    returned by ``parse_fieldset``.
+    """
+    serializer = _serializer_of(serializer)
+    if serializer is None:
+        return
+
+    expandable = getattr(getattr(serializer, 'Meta', None), 'expandable_fields', {})
+    for name in set(expand or {}) | set(fields or {}):
+        if name in expandable and name not in serializer.fields:
+            field_class, kwargs = expandable[name]
+            serializer.fields[name] = field_class(**kwargs)
+
+    if fields is not None:
+        for name in list(serializer.fields):
+            if name not in fields:
+                serializer.fields.pop(name)
+
+    for name, field in serializer.fields.items():
+        shape_serializer(field, (fields or {}).get(name) or None, (expand or {}).get(name))
+
+class _Plan:
+    """The relations and columns a serializer reads from one model."""
+    
+    def __init__(self, model):
+        self.model = model
+        self.select = set()
+        self.prefetch = []
+        # Columns per select_related path ('' is the model itself)
+        self.columns = {'': {model._meta.pk.name}}
+        self.models = {'': model}
+    
+    def need_all(self, path):
+        self.columns[path] = ALL_COLUMNS
+    
+    def need(self, path, name):
+        if self.columns.get(path, set()) is not ALL_COLUMNS:
+            self.columns.setdefault(path, set()).add(name)
+    
+    def join(self, path, model_field):
+        """Follow a to-one relation from ``path``; returns the path of the related model."""
+        related_path = f'{path}__{model_field.name}' if path else model_field.name
+        if model_field.concrete:
+            self.need(path, model_field.name)
+        self.select.add(related_path)
+        related_model = model_field.related_model
+        self.models[related_path] = related_model
+        self.need(related_path, related_model._meta.pk.name)
+        return related_path
+    
+    def only(self):
+        names = []
+        for path, columns in self.columns.items():
+            model = self.models[path]
+            if columns is ALL_COLUMNS:
+                columns = [field.name for field in model._meta.concrete_fields]
+            names.extend(f'{path}__{name}' if path else name for name in columns)
+        return names
+
+def _plan_fields(plan, serializer, path):
+    model = plan.models[path]
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            plan.need_all(path)
+            continue
+
+        nested = _serializer_of(field)
+        current_path, current_model = path, model
+        attrs = field.source_attrs
+        for index, attr in enumerate(attrs):
+            last = index == len(attrs) - 1
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # A property, method or annotation
+                plan.need_all(current_path)
+                break
+
+            if model_field.many_to_many or model_field.one_to_many:
+                if last:
+                    _plan_prefetch(plan, nested, current_path, model_field)
+                else:
+                    plan.need_all(current_path)
+                break
+
+            if not model_field.is_relation:
+                plan.need(current_path, model_field.name)
+                break
+
+            if last and nested is None:
+                # A primary key field only reads the foreign key column
+                pk_only = isinstance(field, serializers.RelatedField) and field.use_pk_only_optimization()
+                if pk_only and model_field.concrete:
+                    plan.need(current_path, model_field.name)
+                else:
+                    current_path = plan.join(current_path, model_field)
+                    plan.need_all(current_path)
+                break
+
+            current_path = plan.join(current_path, model_field)
+            current_model = model_field.related_model
+            if last:
+                _plan_fields(plan, nested, current_path)
+
+def _plan_prefetch(plan, nested, path, model_field):
+    lookup = f'{path}__{model_field.name}' if path else model_field.name
+    related_model = model_field.related_model
+    if nested is None:
+        plan.prefetch.append(lookup)
+        return
+    # Prefetched rows of a reverse foreign key are matched to their parent by its column
+    required = [model_field.field.name] if model_field.one_to_many else []
+    queryset = optimize_queryset(related_model._default_manager.all(), nested, required)
+    plan.prefetch.append(Prefetch(lookup, queryset=queryset))
+
+def optimize_queryset(queryset, serializer, required=()):
+    """
+    Replace the relations loaded by ``queryset`` with the ones the (shaped)
+    ``serializer`` renders, and load only the columns it reads plus the
+    ``required`` ones.
+    """
+    serializer = _serializer_of(serializer)
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None or not issubclass(queryset.model, model):
+        return queryset
+
+    plan = _Plan(queryset.model)
+    _plan_fields(plan, serializer, '')
+    for name in required:
+        plan.need('', name)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    if plan.prefetch:
+        queryset = queryset.prefetch_related(*plan.prefetch)
+    return queryset.only(*plan.only())
+
+class FieldsetMixin:
+    """
+    Viewset mixin for ``?fields=`` and ``?expand=`` on reads.
+    
+    Serializers returned by ``get_serializer`` are shaped by the query
+    parameters, and ``get_queryset`` loads what that shape renders. Custom
+    actions get both as long as they start from ``self.get_queryset()``.
+    Columns read outside the serializer, such as by object permissions,
+    belong in ``fieldset_required``.
+    """
+    fieldset_required = ()
+    
+    def _fieldset_params(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None, None
+        return (
+            parse_fieldset(request.query_params.get('fields')),
+            parse_fieldset(request.query_params.get('expand'))
+        )
+    
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields, expand = self._fieldset_params()
+        if fields is not None or expand is not None:
+            shape_serializer(serializer, fields, expand)
+        return serializer
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = getattr(self, 'request', None)
+        if request is not None and request.method in SAFE_METHODS:
+            queryset = optimize_queryset(
+                queryset, self.get_serializer(), self.fieldset_required
+            )
+        return queryset
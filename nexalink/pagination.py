@@ -0,0 +1,159 @@
+"""
+Keyset (cursor) pagination for list actions.
+
+A page is the ``page_size`` rows that follow the last row of the previous
+page in the queryset's ordering, selected with a ``WHERE`` on the ordering
+columns instead of an ``OFFSET``. With an index on the ordering, a deep page
+costs the same as the first one, and no ``COUNT(*)`` is run. The response is
+``{"next": url, "previous": url, "results": [...]}``; ``next`` and
+``previous`` carry an opaque ``cursor`` parameter.
+
+The ordering is the one of the paginated queryset (``order_by``), and must
+consist of non-null columns of the model itself. The primary key is appended
+as a tie-breaker when it is missing, so that every position is unique.
+"""
+import base64
+import json
+from collections import OrderedDict
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+class KeysetPagination(BasePagination):
+    """Paginate a list action by the ordering of its queryset."""
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self._get_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+        
+        if reverse:
+            queryset = queryset.order_by(*[self._invert(name) for name in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        queryset = self._load_ordering_columns(queryset)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+        
+        # One more row than the page tells whether there is a page after it
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+    
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+    
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+    
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+    
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+    
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+    
+    def encode_cursor(self, row, reverse):
+        fields = [self._field(name) for name in self.ordering]
+        cursor = {'p': [field.value_to_string(row) for field in fields], 'r': reverse}
+        token = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+    
+    def decode_cursor(self, request):
+        """The ``(position, reverse)`` of the cursor parameter, ``(None, False)`` for the first page."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode()))
+            values = cursor['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [self._field(name).to_python(value) for name, value in zip(self.ordering, values)]
+            return position, bool(cursor['r'])
+        except (ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+    
+    def _get_ordering(self, queryset):
+        self.model = queryset.model
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        pk_name = queryset.model._meta.pk.name
+        for name in ordering:
+            if not isinstance(name, str) or '__' in name or name.lstrip('-') in ('?', 'pk'):
+                raise ImproperlyConfigured(
+                    f'{type(self).__name__} needs an ordering on columns of {queryset.model.__name__}, got {ordering}.'
+                )
+        if not any(name.lstrip('-') == pk_name for name in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        return ordering
+    
+    def _field(self, name):
+        return self.model._meta.get_field(name.lstrip('-'))
+    
+    @staticmethod
+    def _invert(name):
+        return name[1:] if name.startswith('-') else f'-{name}'
+    
+    def _after(self, position, reverse):
+        """``Q`` of the rows after ``position`` in the (possibly inverted) ordering."""
+        after = Q()
+        equal = {}
+        for name, value in zip(self.ordering, position):
+            descending = name.startswith('-') != reverse
+            column = name.lstrip('-')
+            after |= Q(**equal, **{f'{column}__{"lt" if descending else "gt"}': value})
+            equal[column] = value
+        # A bound on the first column alone lets the database range-scan its index
+        first = self.ordering[0]
+        bound = 'lte' if first.startswith('-') != reverse else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': position[0]}) & after
+    
+    def _load_ordering_columns(self, queryset):
+        """Make sure deferred loading (``only``/``defer``) keeps the columns the cursor is built from."""
+        names = {name.lstrip('-') for name in self.ordering}
+        existing, defer = queryset.query.deferred_loading
+        if defer and existing & names:
+            return queryset.defer(None).defer(*(existing - names))
+        if not defer and existing:
+            return queryset.only(*existing, *names)
+        return queryset
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+def _pending_key(task, course_id):
+    return f'recompute-pending:{task.name}:{course_id}'
+
+def _running_key(task, course_id):
+    return f'recompute-running:{task.name}:{course_id}'
+
+def schedule_recompute(task, course_id):
+    """
+    Enqueue ``task(course_id)`` once per debounce window.
+
+    The first call for a course marks the recompute as pending and enqueues
+    the task with a countdown of ``RECOMPUTE_DEBOUNCE_SECONDS``. Further calls
+    for the same course are dropped while the job is pending, so a burst of
+    writes collapses into a single recompute that sees all of them. The task
+    clears the flag when it starts (see ``recompute_running``), which means
+    writes that land while it is running schedule a fresh job.
+
+    Both happen once the transaction commits: a rolled back write neither
+    enqueues a job nor leaves a pending flag that would drop later writes.
+    """
+    transaction.on_commit(lambda: _enqueue_once(task, course_id))
+
+def _enqueue_once(task, course_id):
+    timeout = settings.RECOMPUTE_DEBOUNCE_SECONDS + settings.RECOMPUTE_PENDING_TIMEOUT
+    if cache.add(_pending_key(task, course_id), True, timeout=timeout):
+        task.apply_async(args=[course_id], countdown=settings.RECOMPUTE_DEBOUNCE_SECONDS)
+
+def is_recompute_pending(task, course_id):
+    """Return whether a recompute of ``task`` for the course is queued or running."""
+    return bool(cache.get(_pending_key(task, course_id)) or cache.get(_running_key(task, course_id)))
+
+def clear_recompute_pending(task, course_id):
+    """Mark the recompute as started, so later writes schedule a fresh job."""
+    cache.delete(_pending_key(task, course_id))
+
+@contextmanager
+def recompute_running(task, course_id):
+    """
+    Wrap the body of a recompute task: the pending flag is cleared when it
+    starts, and the recompute still counts as pending until it finishes.
+    """
+    key = _running_key(task, course_id)
+    # A count, since a job scheduled while this one runs may overlap it
+    cache.add(key, 0, timeout=settings.RECOMPUTE_PENDING_TIMEOUT)
+    cache.incr(key)
+    clear_recompute_pending(task, course_id)
+    try:
+        yield
+    finally:
+        try:
+            cache.decr(key)
+        except ValueError:
+            # Expired while running
+            pass
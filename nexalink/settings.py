@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
 import dj_database_url
 from dotenv import load_dotenv
 
@@ -223,6 +224,60 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Derived tables recomputed in the background: writes for the same course
+# within the debounce window collapse into one job
+RECOMPUTE_DEBOUNCE_SECONDS = int(os.environ.get('RECOMPUTE_DEBOUNCE_SECONDS', 10))
+RECOMPUTE_PENDING_TIMEOUT = int(os.environ.get('RECOMPUTE_PENDING_TIMEOUT', 300))
+
+# Buffered engagement ingestion (see analytics/buffer.py). With an empty URL
+# events are buffered in-process, which is only suitable for development.
+ENGAGEMENT_BUFFER_URL = os.environ.get(
+    'ENGAGEMENT_BUFFER_URL',
+    os.environ.get('REDIS_URL', 'redis://localhost:6379/2')
+)
+ENGAGEMENT_BUFFER_MAX_LENGTH = int(os.environ.get('ENGAGEMENT_BUFFER_MAX_LENGTH', 200000))
+ENGAGEMENT_INGEST_MAX_EVENTS = 500
+ENGAGEMENT_FLUSH_BATCH_SIZE = int(os.environ.get('ENGAGEMENT_FLUSH_BATCH_SIZE', 2000))
+ENGAGEMENT_FLUSH_SECONDS = int(os.environ.get('ENGAGEMENT_FLUSH_SECONDS', 5))
+# Flushes of a chunk before it is moved to the dead-letter list
+ENGAGEMENT_FLUSH_MAX_ATTEMPTS = int(os.environ.get('ENGAGEMENT_FLUSH_MAX_ATTEMPTS', 5))
+
+# Periodic jobs run by the celery-beat service
+CELERY_BEAT_SCHEDULE = {
+    'refresh-admin-dashboard': {
+        'task': 'analytics.tasks.refresh_admin_dashboard',
+        'schedule': timedelta(minutes=int(os.environ.get('ADMIN_DASHBOARD_REFRESH_MINUTES', 5))),
+    },
+    'purge-expired-analytics-reports': {
+        'task': 'analytics.tasks.purge_expired_analytics_reports',
+        'schedule': timedelta(hours=1),
+    },
+    'flush-engagement-events': {
+        'task': 'analytics.tasks.flush_engagement_events',
+        'schedule': timedelta(seconds=ENGAGEMENT_FLUSH_SECONDS),
+    },
+    'refresh-student-risk-scores': {
+        'task': 'analytics.tasks.refresh_student_risk_scores',
+        'schedule': crontab(hour=int(os.environ.get('RISK_SCORE_HOUR', 2)), minute=0),
+    },
+}
+
+# Lifetime in seconds of cached analytics results per report type. Attendance,
+# performance and feedback results are also invalidated when their rows change;
+# engagement results only expire.
+ANALYTICS_CACHE_TTLS = {
+    'attendance': 15 * 60,
+    'performance': 15 * 60,
+    'engagement': 60,
+    'feedback': 15 * 60,
+}
+
+# Threads per process that run the independent queries of an analytics
+# request side by side (each holds its own database connection), and the
+# seconds a request waits for them before answering 503
+ANALYTICS_QUERY_WORKERS = int(os.environ.get('ANALYTICS_QUERY_WORKERS', 4))
+ANALYTICS_QUERY_TIMEOUT = int(os.environ.get('ANALYTICS_QUERY_TIMEOUT', 30))
+
 # Cache settings
 CACHES = {
     'default': {
@@ -21,6 +21,26 @@ class FacultySerializer(serializers.ModelSerializer):
         model = Faculty
         fields = ['employee_id', 'department', 'designation', 'specialization']
 
+class StudentSummarySerializer(serializers.ModelSerializer):
+    """Compact student for lists and nested objects; select_related('student__user')."""
+    name = serializers.CharField(source='user.get_full_name', read_only=True)
+    
+    class Meta:
+        model = Student
+        fields = ['id', 'enrollment_number', 'name', 'batch', 'department', 'semester']
+        # Columns of the user read by get_full_name, for nexalink.encoders
+        encoder_sources = {'name': ('first_name', 'last_name')}
+
+class FacultySummarySerializer(serializers.ModelSerializer):
+    """Compact faculty member for lists and nested objects; select_related('faculty__user')."""
+    name = serializers.CharField(source='user.get_full_name', read_only=True)
+    
+    class Meta:
+        model = Faculty
+        fields = ['id', 'employee_id', 'name', 'department', 'designation']
+        # Columns of the user read by get_full_name, for nexalink.encoders
+        encoder_sources = {'name': ('first_name', 'last_name')}
+
 class AdminSerializer(serializers.ModelSerializer):
     class Meta:
         model = Admin
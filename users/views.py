@@ -9,6 +9,7 @@ from .serializers import (
     ChangePasswordSerializer, ProfilePictureSerializer, UserPreferenceSerializer
 )
 from .permissions import IsAdminUser, IsFacultyUser, IsStudentUser, IsOwnerOrAdmin
+from nexalink.fieldsets import FieldsetMixin
 
 User = get_user_model()
 
@@ -16,9 +17,9 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     """Custom token view that returns user details with tokens."""
     serializer_class = CustomTokenObtainPairSerializer
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing user instances."""
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('student_profile', 'faculty_profile', 'admin_profile', 'preferences')
     serializer_class = UserSerializer
     
     def get_permissions(self):
@@ -78,13 +79,16 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class UserPreferenceViewSet(viewsets.ModelViewSet):
+class UserPreferenceViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing user preferences."""
+    queryset = UserPreference.objects.all()
     serializer_class = UserPreferenceSerializer
     permission_classes = [IsOwnerOrAdmin]
+    # IsOwnerOrAdmin compares the owner on retrieve
+    fieldset_required = ('user',)
     
     def get_queryset(self):
-        return UserPreference.objects.filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
     
     @action(detail=False, methods=['get'])
     def my_preferences(self, request):